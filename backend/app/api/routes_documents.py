@@ -1,130 +1,126 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, BackgroundTasks, Form
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Form
 from typing import List, Optional
 from ..db.mongo import mongo_db
-from ..models.schema import DocumentInDB, QuestionInDB, Source, Difficulty, MCQItem
-from ..services.parser import process_document_and_chunk
-from ..services.mcq_generator import mcq_generator_service, LLMGenerationError
+from ..models.schema import DocumentInDB, Difficulty, JobInDB, JobStatus
+from ..services.parser import iter_document_text, DocumentProcessingError, SUPPORTED_EXTENSIONS, SEGMENT_KIND_BY_EXTENSION
+from ..services.chunker import semantic_chunk_stream
+from ..services.document_generation import store_document_chunks
+from ..services.jobs import job_queue, JOB_TYPE_GENERATE_DOCUMENT_MCQS
 import os
+import asyncio
+import tempfile
 from bson import ObjectId
 from datetime import datetime
+from ..config import settings
 
 router = APIRouter()
 
 UPLOAD_DIR = "uploaded_documents"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-async def generate_mcqs_from_document_background(
-    doc_id: str,
-    text_content: str,
-    num_questions_per_chunk: int,
-    difficulty: Difficulty,
-    category: Optional[str]
-):
+async def save_upload_to_temp_file(file: UploadFile, max_bytes: int) -> tuple:
+    """
+    Streams an upload to a uniquely named file in UPLOAD_DIR, UPLOAD_READ_CHUNK_BYTES at a time,
+    with the blocking writes done in a thread. Uploads larger than `max_bytes` are rejected with
+    413 as soon as the limit is crossed. Returns (file_path, bytes_written).
+    """
+    suffix = os.path.splitext(file.filename)[1].lower()
+    fd, file_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=suffix)
+    bytes_written = 0
     try:
-        print(f"Background MCQ generation started for document ID: {doc_id}")
-        chunk_size = 2000
-        overlap = 200
-        
-        chunks = []
-        start = 0
-        while start < len(text_content):
-            end = start + chunk_size
-            chunk = text_content[start:end]
-            chunks.append(chunk)
-            start += chunk_size - overlap
-            if start >= len(text_content):
-                break
-
-        if not chunks:
-            print(f"No valid text chunks found for document {doc_id}.")
-            return
-
-        all_generated_questions = []
-        for i, chunk in enumerate(chunks):
-            if not chunk.strip():
-                continue
-            print(f"Processing chunk {i+1}/{len(chunks)} for document {doc_id}...")
-            try:
-                generated_mcq_items_for_chunk: List[MCQItem] = await mcq_generator_service.generate_mcq_from_text(
-                    topic=chunk,
-                    num_questions=num_questions_per_chunk,
-                    difficulty=difficulty,
-                    category=category
-                )
-                for mcq_item in generated_mcq_items_for_chunk:
-                    try:
-                        correct_answer_index = mcq_item.options.index(mcq_item.correct_answer)
-                    except ValueError:
-                        print(f"Warning: Correct answer '{mcq_item.correct_answer}' not found in options for question: '{mcq_item.question}' from doc {doc_id}. Skipping this question.")
-                        continue
-
-                    question = QuestionInDB(
-                        question_text=mcq_item.question,
-                        options=mcq_item.options,
-                        correct_answer_index=correct_answer_index,
-                        explanation=f"The correct answer is {mcq_item.correct_answer}.",
-                        difficulty=difficulty,
-                        categories=[category] if category else [],
-                        source=Source.DOCUMENT_UPLOAD,
-                        generated_from_doc_id=ObjectId(doc_id)
-                    )
-                    all_generated_questions.append(question.model_dump(by_alias=True, exclude_none=True))
-            except LLMGenerationError as e:
-                print(f"LLM generation error for chunk {i+1} of doc {doc_id}: {e}")
-            except Exception as e:
-                print(f"Unexpected error processing chunk {i+1} of doc {doc_id}: {e}")
-
-        if all_generated_questions:
-            await mongo_db.db.questions.insert_many(all_generated_questions)
-            print(f"Successfully generated and saved {len(all_generated_questions)} MCQs for document {doc_id}")
-        else:
-            print(f"No MCQs generated from document {doc_id} after processing all chunks.")
-
-    except Exception as e:
-        print(f"Critical error in background MCQ generation for document {doc_id}: {e}")
-    finally:
-        pass
-
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                data = await file.read(settings.UPLOAD_READ_CHUNK_BYTES)
+                if not data:
+                    break
+                bytes_written += len(data)
+                if bytes_written > max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds the maximum upload size of {max_bytes} bytes.")
+                await asyncio.to_thread(buffer.write, data)
+    except BaseException:
+        os.remove(file_path)
+        raise
+    return file_path, bytes_written
+
+async def _discard_upload(doc_id: str, document_inserted: bool, job_id: Optional[str]):
+    """
+    Removes what a failed upload stored: its chunks, its document entry and its job. A job that
+    a worker already claimed finds no chunks and generates nothing.
+    """
+    steps = [("chunks", mongo_db.db.document_chunks.delete_many({"doc_id": ObjectId(doc_id)}))]
+    if document_inserted:
+        steps.append(("document", mongo_db.db.documents.delete_one({"_id": ObjectId(doc_id)})))
+    if job_id is not None:
+        steps.append(("job", job_queue.cancel(ObjectId(job_id), "Document upload failed before the job was recorded.")))
+    for name, step in steps:
+        try:
+            await step
+        except Exception as e:
+            print(f"Could not clean up the {name} of failed upload {doc_id}: {e}")
 
 @router.post("/upload", response_model=DocumentInDB, status_code=status.HTTP_201_CREATED)
 async def upload_document_and_generate_mcqs(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(..., description="The document file to upload (PDF, TXT, DOCX)."),
     num_questions_per_chunk: int = Form(2, ge=1, le=5, description="Number of MCQs to attempt generating per text chunk."),
     difficulty: Difficulty = Form(Difficulty.MEDIUM, description="Desired difficulty for generated MCQs."),
-    category: Optional[str] = Form(None, description="Optional category for generated MCQs.")
+    category: Optional[str] = Form(None, description="Optional category for generated MCQs."),
+    use_cache: bool = Form(True, description="Serve identical chunks from the LLM response cache.")
 ):
-    allowed_extensions = ('.pdf', '.txt', '.docx')
+    allowed_extensions = SUPPORTED_EXTENSIONS
     if not file.filename.lower().endswith(allowed_extensions):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported file type. Only {', '.join(allowed_extensions)} are allowed.")
 
-    file_path = os.path.join(UPLOAD_DIR, file.filename)
-    try:
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+    if file.size is not None and file.size > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File exceeds the maximum upload size of {settings.MAX_UPLOAD_BYTES} bytes.")
 
-        text_content = await process_document_and_chunk(file_path)
-
-        if not text_content.strip() or "Unsupported file type" in text_content or "not installed" in text_content:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not extract meaningful text from the document. Please ensure it's a valid {', '.join(allowed_extensions)} and contains readable text. Error: {text_content}")
+    file_path = None
+    doc_id = None
+    document_inserted, job_id, uploaded = False, None, False
+    try:
+        file_path, file_size = await save_upload_to_temp_file(file, settings.MAX_UPLOAD_BYTES)
 
         document_db_entry = DocumentInDB(
             filename=file.filename,
-            file_size=file.size,
-            upload_date=datetime.utcnow()
+            file_size=file_size,
+            upload_date=datetime.utcnow(),
+            status=JobStatus.QUEUED
+        )
+        doc_id = str(document_db_entry.id)
+
+        # Text is extracted off the event loop and chunked lazily; chunks are stored in Mongo and
+        # the generation work is handed to the job workers, so it survives API restarts and can
+        # be spread across worker processes/machines.
+        chunks = semantic_chunk_stream(
+            iter_document_text(file_path),
+            token_budget=settings.CHUNK_TOKEN_BUDGET,
+            min_chunk_tokens=settings.CHUNK_MIN_TOKENS,
+            segment_kind=SEGMENT_KIND_BY_EXTENSION[os.path.splitext(file_path)[1].lower()]
         )
+        # From here on, any failure discards what was stored (see the finally block)
+        try:
+            stored_chunks = await store_document_chunks(doc_id, chunks)
+        except DocumentProcessingError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not extract meaningful text from the document. Please ensure it's a valid {', '.join(allowed_extensions)} and contains readable text. Error: {e}")
+        if stored_chunks == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not extract meaningful text from the document. Please ensure it's a valid {', '.join(allowed_extensions)} and contains readable text. Error: No readable text content found in the document.")
+
         result = await mongo_db.db.documents.insert_one(document_db_entry.model_dump(by_alias=True, exclude_none=True))
+        document_inserted = True
         document_db_entry.id = str(result.inserted_id)
 
-        background_tasks.add_task(
-            generate_mcqs_from_document_background,
-            doc_id=document_db_entry.id,
-            text_content=text_content,
-            num_questions_per_chunk=num_questions_per_chunk,
-            difficulty=difficulty,
-            category=category
+        job_id = await job_queue.enqueue(
+            JOB_TYPE_GENERATE_DOCUMENT_MCQS,
+            payload={
+                "doc_id": document_db_entry.id,
+                "num_questions_per_chunk": num_questions_per_chunk,
+                "difficulty": difficulty.value,
+                "category": category,
+                "use_cache": use_cache
+            }
         )
+        await mongo_db.db.documents.update_one({"_id": result.inserted_id}, {"$set": {"job_id": ObjectId(job_id)}})
+        document_db_entry.job_id = job_id
+        uploaded = True
 
         return document_db_entry
 
@@ -134,13 +130,27 @@ async def upload_document_and_generate_mcqs(
         print(f"Error during document upload or initial processing: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"File upload or processing failed: {e}")
     finally:
-        if os.path.exists(file_path):
+        if file_path and os.path.exists(file_path):
             os.remove(file_path)
+        if doc_id is not None and not uploaded:
+            await _discard_upload(doc_id, document_inserted, job_id)
 
 @router.get("/uploaded", response_model=List[DocumentInDB])
 async def get_uploaded_documents():
-    results_cursor = mongo_db.db.documents.find({})
+    results_cursor = mongo_db.db.documents.find({}).sort("upload_date", -1)
     documents = []
     for doc in await results_cursor.to_list(length=None):
         documents.append(DocumentInDB.model_validate(doc))
     return documents
+
+@router.get("/jobs/{job_id}", response_model=JobInDB)
+async def get_job_status(job_id: str):
+    try:
+        object_id = ObjectId(job_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid job ID format.")
+
+    job_doc = await job_queue.get(object_id)
+    if job_doc:
+        return JobInDB.model_validate(job_doc)
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found.")
@@ -1,26 +1,34 @@
 from fastapi import APIRouter, Query, HTTPException, status
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
 from typing import List, Optional
 from ..db.mongo import mongo_db
-from ..models.schema import QuestionInDB, Difficulty
+from ..config import settings
+from ..utils.export_utils import EXPORT_EXCLUDED_FIELDS, stream_json_array, stream_ndjson, stream_csv, stream_moodle_xml, render_pdf_export, stream_file, remove_file
+from ..models.schema import Difficulty
 from bson import ObjectId
-import io
-import json
+import importlib.util
 
-# For PDF export (uncomment and install reportlab if you want backend PDF)
-# from reportlab.lib.pagesizes import letter
-# from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-# from reportlab.lib.styles import getSampleStyleSheet
-# from reportlab.lib.units import inch
+# PDF export needs reportlab: pip install reportlab
+
+class _TempFileResponse(StreamingResponse):
+    """
+    Streams a temporary file that the background task deletes. Servers on ASGI spec 2.4 raise
+    ClientDisconnect on a disconnect, which skips the background task, so it runs here as well.
+    """
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        except ClientDisconnect:
+            if self.background is not None:
+                await self.background()
+            raise
 
 router = APIRouter()
 
-@router.get("/json", response_class=JSONResponse)
-async def export_questions_json(
-    question_ids: Optional[List[str]] = Query(None, description="List of specific question IDs to export."),
-    difficulty: Optional[Difficulty] = Query(None, description="Filter questions by difficulty level."),
-    category: Optional[str] = Query(None, description="Filter questions by category.")
-):
+def _build_export_query(question_ids: Optional[List[str]], difficulty: Optional[Difficulty], category: Optional[str]) -> dict:
+    """Builds the Mongo filter shared by all export formats."""
     query = {}
     if question_ids:
         try:
@@ -32,82 +40,99 @@ async def export_questions_json(
         query["difficulty"] = difficulty.value
     if category:
         query["categories"] = category
+    return query
 
-    questions_cursor = mongo_db.db.questions.find(query)
-    questions_to_export = []
-    for doc in await questions_cursor.to_list(length=None):
-        doc["_id"] = str(doc["_id"])
-        if "generated_from_doc_id" in doc and doc["generated_from_doc_id"]:
-             doc["generated_from_doc_id"] = str(doc["generated_from_doc_id"])
-        questions_to_export.append(doc)
-
-    if not questions_to_export:
+async def _ensure_questions_exist(query: dict):
+    # Checked up front: once streaming has started the status code can no longer change.
+    if await mongo_db.db.questions.find_one(query, {"_id": 1}) is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No questions found for the specified export criteria.")
 
-    return JSONResponse(
-        content=questions_to_export,
+@router.get("/json", response_class=StreamingResponse)
+async def export_questions_json(
+    question_ids: Optional[List[str]] = Query(None, description="List of specific question IDs to export."),
+    difficulty: Optional[Difficulty] = Query(None, description="Filter questions by difficulty level."),
+    category: Optional[str] = Query(None, description="Filter questions by category.")
+):
+    """Streams the matching questions as a JSON array, serialized in batches of EXPORT_BATCH_SIZE."""
+    query = _build_export_query(question_ids, difficulty, category)
+    await _ensure_questions_exist(query)
+
+    return StreamingResponse(
+        stream_json_array(mongo_db.db.questions.find(query, EXPORT_EXCLUDED_FIELDS), settings.EXPORT_BATCH_SIZE),
         media_type="application/json",
         headers={"Content-Disposition": "attachment; filename=mcq_questions.json"}
     )
 
-# Uncomment and install 'reportlab' if you want to enable backend PDF generation
-# @router.get("/pdf", response_class=StreamingResponse)
-# async def export_questions_pdf(
-#     question_ids: Optional[List[str]] = Query(None, description="List of specific question IDs to export."),
-#     difficulty: Optional[Difficulty] = Query(None, description="Filter questions by difficulty level."),
-#     category: Optional[str] = Query(None, description="Filter questions by category.")
-# ):
-#     query = {}
-#     if question_ids:
-#         try:
-#             obj_ids = [ObjectId(qid) for qid in question_ids]
-#             query["_id"] = {"$in": obj_ids}
-#         except Exception:
-#             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid question ID format in list.")
-#     if difficulty:
-#         query["difficulty"] = difficulty.value
-#     if category:
-#         query["categories"] = category
-
-#     questions_cursor = mongo_db.db.questions.find(query)
-#     questions_data = []
-#     for doc in await questions_cursor.to_list(length=None):
-#         questions_data.append(QuestionInDB.model_validate(doc))
-
-#     if not questions_data:
-#         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No questions found for the specified export criteria.")
-
-#     buffer = io.BytesIO()
-#     doc = SimpleDocTemplate(buffer, pagesize=letter)
-#     story = []
-#     styles = getSampleStyleSheet()
-
-#     # Title
-#     story.append(Paragraph("<b>MCQ Questions Export</b>", styles['h1']))
-#     story.append(Spacer(1, 0.2 * inch))
-
-#     for i, q in enumerate(questions_data):
-#         # Question Text
-#         story.append(Paragraph(f"<b>Question {i+1}:</b> {q.question_text}", styles['Normal']))
-#         story.append(Spacer(1, 0.05 * inch))
-
-#         # Options
-#         for j, opt in enumerate(q.options):
-#             story.append(Paragraph(f"  {chr(65+j)}. {opt}", styles['Normal']))
-#         story.append(Spacer(1, 0.05 * inch))
-
-#         # Correct Answer and Explanation
-#         story.append(Paragraph(f"<b>Correct Answer:</b> {q.options[q.correct_answer_index]}", styles['Normal']))
-#         if q.explanation:
-#             story.append(Paragraph(f"<b>Explanation:</b> {q.explanation}", styles['Normal']))
-#         story.append(Spacer(1, 0.2 * inch)) # Add space after each question
-
-#     doc.build(story)
-#     buffer.seek(0)
-
-#     return StreamingResponse(
-#         buffer,
-#         media_type="application/pdf",
-#         headers={"Content-Disposition": "attachment; filename=mcq_questions.pdf"}
-#     )
+@router.get("/ndjson", response_class=StreamingResponse)
+async def export_questions_ndjson(
+    question_ids: Optional[List[str]] = Query(None, description="List of specific question IDs to export."),
+    difficulty: Optional[Difficulty] = Query(None, description="Filter questions by difficulty level."),
+    category: Optional[str] = Query(None, description="Filter questions by category.")
+):
+    """Streams the matching questions as newline-delimited JSON (one question per line)."""
+    query = _build_export_query(question_ids, difficulty, category)
+    await _ensure_questions_exist(query)
+
+    return StreamingResponse(
+        stream_ndjson(mongo_db.db.questions.find(query, EXPORT_EXCLUDED_FIELDS), settings.EXPORT_BATCH_SIZE),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=mcq_questions.ndjson"}
+    )
+
+@router.get("/csv", response_class=StreamingResponse)
+async def export_questions_csv(
+    question_ids: Optional[List[str]] = Query(None, description="List of specific question IDs to export."),
+    difficulty: Optional[Difficulty] = Query(None, description="Filter questions by difficulty level."),
+    category: Optional[str] = Query(None, description="Filter questions by category.")
+):
+    """Streams the matching questions as CSV, one row per question."""
+    query = _build_export_query(question_ids, difficulty, category)
+    await _ensure_questions_exist(query)
+
+    return StreamingResponse(
+        stream_csv(mongo_db.db.questions.find(query, EXPORT_EXCLUDED_FIELDS), settings.EXPORT_BATCH_SIZE),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": "attachment; filename=mcq_questions.csv"}
+    )
+
+@router.get("/moodle-xml", response_class=StreamingResponse)
+async def export_questions_moodle_xml(
+    question_ids: Optional[List[str]] = Query(None, description="List of specific question IDs to export."),
+    difficulty: Optional[Difficulty] = Query(None, description="Filter questions by difficulty level."),
+    category: Optional[str] = Query(None, description="Filter questions by category.")
+):
+    """Streams the matching questions in Moodle XML format, importable into Moodle's question bank."""
+    query = _build_export_query(question_ids, difficulty, category)
+    await _ensure_questions_exist(query)
+
+    return StreamingResponse(
+        stream_moodle_xml(mongo_db.db.questions.find(query, EXPORT_EXCLUDED_FIELDS), settings.EXPORT_BATCH_SIZE),
+        media_type="application/xml",
+        headers={"Content-Disposition": "attachment; filename=mcq_questions.xml"}
+    )
 
+@router.get("/pdf", response_class=StreamingResponse)
+async def export_questions_pdf(
+    question_ids: Optional[List[str]] = Query(None, description="List of specific question IDs to export."),
+    difficulty: Optional[Difficulty] = Query(None, description="Filter questions by difficulty level."),
+    category: Optional[str] = Query(None, description="Filter questions by category.")
+):
+    """Renders the matching questions to PDF in the export worker pool and streams the file."""
+    if importlib.util.find_spec("reportlab") is None:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="PDF export requires reportlab. Please install it to enable this format.")
+
+    query = _build_export_query(question_ids, difficulty, category)
+    await _ensure_questions_exist(query)
+
+    try:
+        pdf_path = await render_pdf_export(mongo_db.db.questions.find(query, EXPORT_EXCLUDED_FIELDS), settings.EXPORT_BATCH_SIZE)
+    except Exception as e:
+        print(f"Error rendering PDF export: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to render PDF export: {e}")
+
+    return _TempFileResponse(
+        stream_file(pdf_path),
+        media_type="application/pdf",
+        headers={"Content-Disposition": "attachment; filename=mcq_questions.pdf"},
+        background=BackgroundTask(remove_file, pdf_path)
+    )
@@ -1,13 +1,25 @@
-from fastapi import APIRouter, HTTPException, status, Query, BackgroundTasks, Form, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Query, BackgroundTasks
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
-from ..services.parser import process_document_and_chunk
 from ..services.mcq_generator import mcq_generator_service, LLMGenerationError
+from ..services.mcq_parser import ParsedMCQ
+from ..services.llm_cache import llm_response_cache
+from ..services.dedup import question_deduplicator, add_fingerprint
+from ..services.jobs import job_queue, JOB_TYPE_DEDUPE_QUESTIONS
+from ..services.vector_index import question_vector_index, VectorSearchUnavailableError
+from ..services.question_cache import question_cache
+from ..services.question_import import import_questions, iter_ndjson_rows, iter_json_array_rows
+from ..utils.rate_limiter import llm_governor
+from ..utils.pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
 from ..db.mongo import mongo_db
-from ..models.schema import QuestionBase, QuestionInDB, Difficulty, Source, DocumentInDB, MCQItem
+from ..models.schema import QuestionBase, QuestionInDB, Difficulty, Source, BulkImportResult, JobInDB
+from ..config import settings
 from bson import ObjectId
 import os
-from datetime import datetime
+import json
 
 router = APIRouter()
 
@@ -23,40 +35,43 @@ class MCQGenerateRequest(BaseModel):
         5, ge=1, le=50, description="Number of MCQs to generate (between 1 and 50)."
     )
     category: Optional[str] = Field(None, description="Optional category to guide MCQ generation.")
+    use_cache: bool = Field(True, description="Serve identical requests from the LLM response cache. Set to false to force a fresh generation.")
 
 @router.post("/generate-from-text", response_model=List[QuestionInDB], status_code=status.HTTP_201_CREATED)
-async def generate_mcqs_from_text_endpoint(request: MCQGenerateRequest):
+async def generate_mcqs_from_text_endpoint(request: MCQGenerateRequest, background_tasks: BackgroundTasks):
     try:
-        generated_mcq_items: List[MCQItem] = await mcq_generator_service.generate_mcq_from_text(
+        generated_mcq_items: List[ParsedMCQ] = await mcq_generator_service.generate_mcqs_with_top_up(
             topic=request.topic,
             num_questions=request.num_questions,
             difficulty=request.difficulty,
-            category=request.category
+            category=request.category,
+            use_cache=request.use_cache
         )
 
         questions_to_insert = []
         for mcq_item in generated_mcq_items:
-            try:
-                correct_answer_index = mcq_item.options.index(mcq_item.correct_answer)
-            except ValueError:
-                print(f"Warning: Correct answer '{mcq_item.correct_answer}' not found in options for question: '{mcq_item.question}'. Skipping this question.")
-                continue
-
             question = QuestionInDB(
                 question_text=mcq_item.question,
                 options=mcq_item.options,
-                correct_answer_index=correct_answer_index,
-                explanation=f"The correct answer is {mcq_item.correct_answer}.",
+                correct_answer_index=mcq_item.correct_answer_index,
+                explanation=mcq_item.explanation or f"The correct answer is {mcq_item.correct_answer}.",
                 difficulty=request.difficulty,
                 categories=[request.category] if request.category else [],
                 source=Source.AI_GENERATED,
             )
             questions_to_insert.append(question.model_dump(by_alias=True, exclude_none=True))
 
+        if settings.DEDUP_ENABLED and questions_to_insert:
+            questions_to_insert, duplicate_count = await question_deduplicator.filter_new(questions_to_insert)
+            if duplicate_count:
+                print(f"Skipped {duplicate_count} near-duplicate MCQs for topic '{request.topic}'.")
+
         if questions_to_insert:
             result = await mongo_db.db.questions.insert_many(questions_to_insert)
+            await question_cache.invalidate_pools()
             inserted_ids = result.inserted_ids
             inserted_questions = await mongo_db.db.questions.find({"_id": {"$in": inserted_ids}}).to_list(length=len(inserted_ids))
+            background_tasks.add_task(question_vector_index.upsert, inserted_questions)
             return [QuestionInDB.model_validate(q) for q in inserted_questions]
         else:
             return []
@@ -66,29 +81,164 @@ async def generate_mcqs_from_text_endpoint(request: MCQGenerateRequest):
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An unexpected error occurred during MCQ generation: {e}")
 
-@router.post("/questions", response_model=QuestionInDB, status_code=status.HTTP_201_CREATED)
-async def create_manual_question(question: QuestionBase):
-    try:
-        question_data = question.model_dump(by_alias=True, exclude_none=True)
-        question_data["source"] = Source.MANUAL.value
+@router.post("/generate-from-text/stream", response_class=StreamingResponse, status_code=status.HTTP_201_CREATED)
+async def generate_mcqs_from_text_stream_endpoint(request: MCQGenerateRequest, background_tasks: BackgroundTasks):
+    """
+    Streaming variant of /generate-from-text. Each question is validated as soon as Gemini has
+    produced it, checked for near-duplicates, inserted and sent to the client as one NDJSON line.
+    Inserted questions are embedded for semantic search after the response has finished.
+    Errors after the stream has started are reported as a final {"error": ...} line.
+    """
+    inserted_questions: List[dict] = []
+
+    async def question_stream():
+        try:
+            async for mcq_item in mcq_generator_service.stream_mcq_from_text(
+                topic=request.topic,
+                num_questions=request.num_questions,
+                difficulty=request.difficulty,
+                category=request.category,
+                use_cache=request.use_cache
+            ):
+                question = QuestionInDB(
+                    question_text=mcq_item.question,
+                    options=mcq_item.options,
+                    correct_answer_index=mcq_item.correct_answer_index,
+                    explanation=mcq_item.explanation or f"The correct answer is {mcq_item.correct_answer}.",
+                    difficulty=request.difficulty,
+                    categories=[request.category] if request.category else [],
+                    source=Source.AI_GENERATED,
+                )
+                question_doc = question.model_dump(by_alias=True, exclude_none=True)
+                if settings.DEDUP_ENABLED:
+                    new_docs, _ = await question_deduplicator.filter_new([question_doc])
+                    if not new_docs:
+                        print(f"Skipped a near-duplicate MCQ for topic '{request.topic}'.")
+                        continue
+                await mongo_db.db.questions.insert_one(question_doc)
+                await question_cache.invalidate_pools()
+                inserted_questions.append(question_doc)
+                yield QuestionInDB.model_validate(question_doc).model_dump_json(by_alias=True) + "\n"
+        except LLMGenerationError as e:
+            yield json.dumps({"error": f"AI generation error: {e}"}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": f"An unexpected error occurred during MCQ generation: {e}"}) + "\n"
+
+    # Runs once the stream is done (or the client went away) with the questions inserted by then
+    background_tasks.add_task(question_vector_index.upsert, inserted_questions)
+    return StreamingResponse(question_stream(), media_type="application/x-ndjson", status_code=status.HTTP_201_CREATED)
+
+@router.get("/cache/stats")
+async def get_llm_cache_stats():
+    """Returns hit/miss counters for the LLM response cache of this worker."""
+    return llm_response_cache.stats()
 
-        result = await mongo_db.db.questions.insert_one(question_data)
-        
-        created_question_doc = await mongo_db.db.questions.find_one({"_id": result.inserted_id})
+@router.get("/questions/cache/stats")
+async def get_question_cache_stats():
+    """Returns hit/miss counters for the question and quiz pool caches of this worker."""
+    return question_cache.stats()
 
-        if created_question_doc:
-            return QuestionInDB.model_validate(created_question_doc)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to retrieve created question after insertion.")
+@router.get("/generation/stats")
+async def get_generation_yield_stats():
+    """Returns the LLM provider in use and questions requested vs returned (yield) per output mode for this worker."""
+    return {"provider": mcq_generator_service.provider.name, "modes": mcq_generator_service.yield_stats.stats()}
+
+@router.get("/llm/stats")
+async def get_llm_governor_stats():
+    """Returns the current concurrency limit, rate and error counters of this worker's LLM governor."""
+    return llm_governor.stats()
+
+@router.post("/questions", response_model=QuestionInDB, status_code=status.HTTP_201_CREATED)
+async def create_manual_question(question: QuestionBase, background_tasks: BackgroundTasks):
+    try:
+        question_data = QuestionInDB(**question.model_dump(), source=Source.MANUAL).model_dump(by_alias=True, exclude_none=True)
+        add_fingerprint(question_data)
+        # The document is fully built here, so it is returned without reading it back
+        await mongo_db.db.questions.insert_one(question_data)
+        await question_cache.invalidate_pools()
+        background_tasks.add_task(question_vector_index.upsert, [question_data])
+        return QuestionInDB.model_validate(question_data)
 
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error creating manual question: {e}")
 
-@router.get("/questions", response_model=List[QuestionInDB])
-async def get_all_questions(
-    difficulty: Optional[Difficulty] = Query(None, description="Filter by difficulty level."),
-    category: Optional[str] = Query(None, description="Filter by category (exact match)."),
-    source: Optional[Source] = Query(None, description="Filter by question source (Manual, AI_Generated, Document_Upload).")
+@router.post("/questions/bulk", response_model=BulkImportResult)
+async def bulk_import_questions(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$", description="Body format: 'ndjson' (one question per line) or 'json' (an array). Defaults to the Content-Type.")
 ):
+    """
+    Imports many questions at once. The request body is NDJSON or a JSON array of QuestionBase
+    objects; it is parsed and validated as it streams in and written with unordered batched
+    inserts. Invalid rows are reported in the result and do not stop the import.
+    Imported questions reach the semantic search index through its periodic catch-up.
+    """
+    body_format = format or ("ndjson" if "ndjson" in request.headers.get("content-type", "") else "json")
+    rows = iter_ndjson_rows(request.stream()) if body_format == "ndjson" else iter_json_array_rows(request.stream())
+    try:
+        return await import_questions(rows)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error importing questions: {e}")
+
+@router.post("/questions/dedupe", response_model=JobInDB, status_code=status.HTTP_202_ACCEPTED)
+async def dedupe_questions(
+    delete: bool = Query(False, description="Delete the newer copy of each near-duplicate. By default duplicates are only counted.")
+):
+    """
+    Queues a job that fingerprints every stored question and finds near-duplicates of older
+    questions (removing them if `delete` is set). Poll GET /api/v1/documents/jobs/{job_id}.
+    """
+    job_id = await job_queue.enqueue(JOB_TYPE_DEDUPE_QUESTIONS, payload={"delete": delete, "batch_size": settings.DEDUP_BATCH_SIZE})
+    return JobInDB.model_validate(await job_queue.get(ObjectId(job_id)))
+
+# Searches run again after dropping stale hits at most this many times in total
+SEARCH_ATTEMPTS = 3
+
+class QuestionSearchResult(BaseModel):
+    score: float = Field(..., description="Cosine similarity between the query and the question (higher is closer).")
+    question: QuestionInDB
+
+@router.get("/search", response_model=List[QuestionSearchResult])
+async def search_questions(
+    q: str = Query(..., min_length=1, description="Free-text query, matched by meaning rather than exact words."),
+    k: int = Query(10, ge=1, le=100, description="Number of results to return.")
+):
+    """Semantic search over the question bank using sentence-transformer embeddings."""
+    for _ in range(SEARCH_ATTEMPTS):
+        try:
+            hits = await question_vector_index.search(q, k)
+        except VectorSearchUnavailableError as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+        docs = await mongo_db.db.questions.find({"_id": {"$in": [ObjectId(qid) for qid, _ in hits]}}).to_list(length=len(hits))
+        docs_by_id = {str(doc["_id"]): doc for doc in docs}
+        # Questions deleted by other processes (e.g. a dedupe job in a worker) may still be indexed
+        # here; they are dropped from this index and the search is run again to fill up to `k`
+        stale_ids = [qid for qid, _ in hits if qid not in docs_by_id]
+        if not stale_ids:
+            break
+        await question_vector_index.remove(stale_ids)
+    return [
+        QuestionSearchResult(score=score, question=QuestionInDB.model_validate(docs_by_id[qid]))
+        for qid, score in hits if qid in docs_by_id
+    ]
+
+@router.get("/search/stats")
+async def get_search_index_stats():
+    """Returns the size and state of this worker's semantic search index."""
+    return question_vector_index.stats()
+
+# Fields a list view may request with `fields=`; `_id` is always returned
+QUESTION_LIST_FIELDS = {
+    "question_text", "options", "correct_answer_index", "explanation", "difficulty",
+    "categories", "created_at", "source", "generated_from_doc_id",
+    "attempt_count", "correct_count", "empirical_correct_rate", "empirical_difficulty",
+}
+QUESTION_LIST_SORT = [("_id", 1)]
+
+def _build_question_list_query(difficulty: Optional[Difficulty], category: Optional[str], source: Optional[Source],
+                               after_id: Optional[ObjectId] = None) -> dict:
+    """Filter of one page of the question list; `after_id` is the last `_id` of the previous page."""
     query = {}
     if difficulty:
         query["difficulty"] = difficulty.value
@@ -96,12 +246,55 @@ async def get_all_questions(
         query["categories"] = category
     if source:
         query["source"] = source.value
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return query
+
+@router.get("/questions", response_model=List[QuestionInDB])
+async def get_all_questions(
+    response: Response,
+    difficulty: Optional[Difficulty] = Query(None, description="Filter by difficulty level."),
+    category: Optional[str] = Query(None, description="Filter by category (exact match)."),
+    source: Optional[Source] = Query(None, description="Filter by question source (Manual, AI_Generated, Document_Upload)."),
+    limit: int = Query(100, ge=1, le=500, description="Maximum number of questions per page."),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page."),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (e.g. 'question_text,difficulty'). Defaults to all fields.")
+):
+    """
+    Lists questions oldest first, one page at a time (keyset pagination on `_id`). When more
+    questions follow, the cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    after_id = None
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor, {"_id": ObjectId})["_id"]
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    query = _build_question_list_query(difficulty, category, source, after_id)
+
+    projection = None
+    if fields:
+        requested_fields = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown_fields = requested_fields - QUESTION_LIST_FIELDS
+        if unknown_fields:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(sorted(unknown_fields))}.")
+        projection = {field: 1 for field in requested_fields}
+
+    # Fetch one extra document to know whether another page follows
+    docs = await mongo_db.db.questions.find(query, projection).sort(QUESTION_LIST_SORT).limit(limit + 1).to_list(length=limit + 1)
+    headers = {}
+    if len(docs) > limit:
+        docs = docs[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor({"_id": docs[-1]["_id"]})
+
+    if projection is not None:
+        # Partial documents do not satisfy QuestionInDB, so they are returned as-is
+        for doc in docs:
+            doc["_id"] = str(doc["_id"])
+        return JSONResponse(content=jsonable_encoder(docs), headers=headers)
 
-    questions_cursor = mongo_db.db.questions.find(query)
-    questions = []
-    for doc in await questions_cursor.to_list(length=None):
-        questions.append(QuestionInDB.model_validate(doc))
-    return questions
+    response.headers.update(headers)
+    return [QuestionInDB.model_validate(doc) for doc in docs]
 
 @router.get("/questions/{question_id}", response_model=QuestionInDB)
 async def get_question_by_id(question_id: str):
@@ -110,13 +303,13 @@ async def get_question_by_id(question_id: str):
     except Exception:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid question ID format.")
 
-    question_doc = await mongo_db.db.questions.find_one({"_id": object_id})
+    question_doc = await question_cache.get_question(object_id)
     if question_doc:
         return QuestionInDB.model_validate(question_doc)
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found.")
 
 @router.put("/questions/{question_id}", response_model=QuestionInDB)
-async def update_question(question_id: str, question_update: QuestionBase):
+async def update_question(question_id: str, question_update: QuestionBase, background_tasks: BackgroundTasks):
     try:
         object_id = ObjectId(question_id)
     except Exception:
@@ -125,13 +318,17 @@ async def update_question(question_id: str, question_update: QuestionBase):
     update_data = question_update.model_dump(by_alias=True, exclude_none=True)
     update_data.pop("source", None)
     update_data.pop("_id", None)
+    add_fingerprint(update_data)
 
     result = await mongo_db.db.questions.update_one(
         {"_id": object_id},
         {"$set": update_data}
     )
     if result.modified_count == 1:
+        await question_cache.invalidate_questions([object_id])
+        await question_cache.invalidate_pools()
         updated_question_doc = await mongo_db.db.questions.find_one({"_id": object_id})
+        background_tasks.add_task(question_vector_index.upsert, [updated_question_doc])
         return QuestionInDB.model_validate(updated_question_doc)
     elif result.matched_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found.")
@@ -147,6 +344,9 @@ async def delete_question(question_id: str):
 
     result = await mongo_db.db.questions.delete_one({"_id": object_id})
     if result.deleted_count == 1:
+        await question_cache.invalidate_questions([object_id])
+        await question_cache.invalidate_pools()
+        await question_vector_index.remove([question_id])
         return
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Question not found.")
 
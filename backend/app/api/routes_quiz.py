@@ -1,17 +1,32 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, status, Query, Response
 from typing import List, Optional, Dict, Any
+from datetime import datetime
+import random
 from ..db.mongo import mongo_db
-from ..models.schema import QuestionInDB, Difficulty, QuizResult, PyObjectId
-from random import sample
+from ..models.schema import (
+    Difficulty, QuizResult, AttemptedQuestion, PyObjectId, JobInDB,
+    QuizScoreSummary, ScoreBucket, QuizTimeseriesPoint, UserQuizStats
+)
+from ..services.quiz_analytics import quiz_analytics, as_naive_utc, TIMESERIES_INTERVALS
+from ..services.jobs import job_queue, JOB_TYPE_REBUILD_QUIZ_ROLLUPS
+from ..services.question_stats import record_answers, difficulty_filter
+from ..services.question_cache import question_cache
+from ..utils.pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
 from bson import ObjectId
 from pydantic import BaseModel, Field
 
 router = APIRouter()
 
+# Only these fields are sent to quiz takers (never the correct answer)
+QUIZ_QUESTION_PROJECTION = {"_id": 1, "question_text": 1, "options": 1}
+QUIZ_SAMPLE_ATTEMPTS = 3
+QUIZ_RESULTS_SORT = [("quiz_date", -1), ("_id", -1)]
+
 class QuizGenerationRequest(BaseModel):
     num_questions: int = Field(5, ge=1, le=20, description="Number of questions to include in the quiz.")
     difficulty: Optional[Difficulty] = Field(None, description="Optional difficulty filter for quiz questions.")
     category: Optional[str] = Field(None, description="Optional category filter for quiz questions.")
+    calibrated: bool = Field(False, description="Select by difficulty observed from past answers where enough answers exist.")
 
 class QuizQuestionForUser(BaseModel):
     id: PyObjectId = Field(alias="_id", description="The unique ID of the question.")
@@ -23,31 +38,74 @@ class QuizQuestionForUser(BaseModel):
         "arbitrary_types_allowed": True
     }
 
+def _build_quiz_query(difficulty: Optional[Difficulty], category: Optional[str], calibrated: bool = False) -> Dict[str, Any]:
+    query = {}
+    if difficulty:
+        query.update(difficulty_filter(difficulty, calibrated))
+    if category:
+        query["categories"] = category
+    return query
+
+def _quiz_sample_pipeline(query: Dict[str, Any], size: int, exclude_ids: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    """Samples `size` questions matching `query` inside MongoDB, skipping `exclude_ids`."""
+    match = dict(query)
+    if exclude_ids:
+        match["_id"] = {"$nin": exclude_ids}
+    return [
+        {"$match": match},
+        {"$sample": {"size": size}},
+        {"$project": QUIZ_QUESTION_PROJECTION},
+    ]
+
 @router.post("/generate", response_model=List[QuizQuestionForUser])
 async def generate_quiz(request: QuizGenerationRequest):
-    query = {}
-    if request.difficulty:
-        query["difficulty"] = request.difficulty.value
-    if request.category:
-        query["categories"] = request.category
+    query = _build_quiz_query(request.difficulty, request.category, request.calibrated)
+
+    selected_questions_docs: Dict[Any, Dict[str, Any]] = {}
+    # Small pools are cached as id lists and sampled in process; the documents then come from
+    # the question cache. Questions deleted since the pool was cached are topped up below.
+    pool = await question_cache.get_pool(query)
+    if pool is not None:
+        if len(pool) < request.num_questions:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Not enough questions found to create a quiz. Found {len(pool)}, requested {request.num_questions}."
+            )
+        sampled_ids = random.sample(pool, request.num_questions)
+        cached_docs = await question_cache.get_questions(sampled_ids)
+        for question_id in sampled_ids:
+            if question_id in cached_docs:
+                selected_questions_docs[question_id] = cached_docs[question_id]
+    else:
+        available_count = await mongo_db.db.questions.count_documents(query)
+        if available_count < request.num_questions:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Not enough questions found to create a quiz. Found {available_count}, requested {request.num_questions}."
+            )
 
-    all_matching_questions_cursor = mongo_db.db.questions.find(query)
-    all_matching_questions = await all_matching_questions_cursor.to_list(length=None)
+    # Sample inside MongoDB and only transfer the fields the quiz needs. $sample may return the
+    # same document twice when it samples with a random cursor, so top up until we have enough.
+    for _ in range(QUIZ_SAMPLE_ATTEMPTS):
+        missing = request.num_questions - len(selected_questions_docs)
+        if missing <= 0:
+            break
+        pipeline = _quiz_sample_pipeline(query, missing, list(selected_questions_docs))
+        async for q in mongo_db.db.questions.aggregate(pipeline):
+            selected_questions_docs.setdefault(q["_id"], q)
 
-    if len(all_matching_questions) < request.num_questions:
+    if len(selected_questions_docs) < request.num_questions:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Not enough questions found to create a quiz. Found {len(all_matching_questions)}, requested {request.num_questions}."
+            detail=f"Not enough questions found to create a quiz. Found {len(selected_questions_docs)}, requested {request.num_questions}."
         )
 
-    selected_questions_docs = sample(all_matching_questions, request.num_questions)
-
     return [
         QuizQuestionForUser(
             _id=str(q["_id"]),
             question_text=q["question_text"],
             options=q["options"]
-        ) for q in selected_questions_docs
+        ) for q in list(selected_questions_docs.values())[:request.num_questions]
     ]
 
 class UserAnswer(BaseModel):
@@ -73,20 +131,27 @@ async def submit_quiz(submission: QuizSubmission):
         except Exception:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid question ID format: {ans.question_id}")
 
-    questions_map: Dict[str, QuestionInDB] = {}
-    questions_cursor = mongo_db.db.questions.find({"_id": {"$in": attempted_question_ids_obj}})
-    for doc in await questions_cursor.to_list(length=None):
-        q_in_db = QuestionInDB.model_validate(doc)
-        questions_map[str(q_in_db.id)] = q_in_db
-
-    for answer in submission.answers:
-        question_id_str = answer.question_id
-        if question_id_str in questions_map:
-            question = questions_map[question_id_str]
-            if answer.user_answer_index == question.correct_answer_index:
-                correct_count += 1
-        else:
-            print(f"Warning: Question ID {question_id_str} not found in DB during quiz submission.")
+    correct_index_by_id: Dict[str, int] = {
+        str(question_id): doc["correct_answer_index"]
+        for question_id, doc in (await question_cache.get_questions(attempted_question_ids_obj)).items()
+    }
+
+    attempted_questions: List[AttemptedQuestion] = []
+    graded_answers = []
+    for answer, question_oid in zip(submission.answers, attempted_question_ids_obj):
+        correct_index = correct_index_by_id.get(str(question_oid))
+        if correct_index is None:
+            print(f"Warning: Question ID {answer.question_id} not found in DB during quiz submission.")
+        is_correct = correct_index is not None and answer.user_answer_index == correct_index
+        if is_correct:
+            correct_count += 1
+        if correct_index is not None:
+            graded_answers.append((question_oid, is_correct))
+        attempted_questions.append(AttemptedQuestion(
+            question_id=str(question_oid),
+            user_answer_index=answer.user_answer_index,
+            is_correct=is_correct
+        ))
 
     score = (correct_count / total_questions) * 100 if total_questions > 0 else 0
 
@@ -94,20 +159,138 @@ async def submit_quiz(submission: QuizSubmission):
         total_questions=total_questions,
         correct_answers=correct_count,
         score=score,
-        user_id=submission.user_id
+        user_id=submission.user_id,
+        attempted_questions=attempted_questions
     )
 
-    result = await mongo_db.db.quiz_results.insert_one(quiz_result.model_dump(by_alias=True, exclude_none=True))
-    created_result_doc = await mongo_db.db.quiz_results.find_one({"_id": result.inserted_id})
+    # The model already holds everything that is stored, so the result is not read back
+    result_doc = quiz_result.model_dump(by_alias=True, exclude_none=True)
+    await mongo_db.db.quiz_results.insert_one(result_doc)
+    try:
+        await record_answers(graded_answers)
+        await quiz_analytics.record_result(result_doc)
+    except Exception as e:
+        # The result itself is stored; statistics catch up with later submissions
+        print(f"Warning: Could not update quiz statistics for result {result_doc['_id']}: {e}")
+    return QuizResult.model_validate(result_doc)
 
-    if created_result_doc:
-        return QuizResult.model_validate(created_result_doc)
-    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to save quiz result.")
+def _date_range(date_from: Optional[datetime], date_to: Optional[datetime]) -> Dict[str, Any]:
+    # Bounds may mix offsets and naive values; both are compared as naive UTC, like stored dates
+    date_from, date_to = as_naive_utc(date_from), as_naive_utc(date_to)
+    if date_from and date_to and date_from >= date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from must be earlier than date_to.")
+    date_range = {}
+    if date_from:
+        date_range["$gte"] = date_from
+    if date_to:
+        date_range["$lt"] = date_to
+    return date_range
+
+def _build_results_query(user_id: Optional[str], date_range: Dict[str, Any], position: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Filter of one page of results; `position` is the quiz_date and `_id` of the previous page's last result."""
+    conditions: List[Dict[str, Any]] = []
+    if user_id:
+        conditions.append({"user_id": user_id})
+    if date_range:
+        conditions.append({"quiz_date": date_range})
+    if position:
+        conditions.append({"$or": [
+            {"quiz_date": {"$lt": position["quiz_date"]}},
+            {"quiz_date": position["quiz_date"], "_id": {"$lt": position["_id"]}},
+        ]})
+    return {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
 
 @router.get("/results", response_model=List[QuizResult])
-async def get_all_quiz_results():
-    results_cursor = mongo_db.db.quiz_results.find({})
-    results = []
-    for doc in await results_cursor.to_list(length=None):
-        results.append(QuizResult.model_validate(doc))
-    return results
+async def get_all_quiz_results(
+    response: Response,
+    user_id: Optional[str] = Query(None, description="Only results of this user."),
+    date_from: Optional[datetime] = Query(None, description="Only results taken at or after this time (UTC)."),
+    date_to: Optional[datetime] = Query(None, description="Only results taken before this time (UTC)."),
+    limit: int = Query(100, ge=1, le=500, description="Maximum number of results per page."),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page.")
+):
+    """
+    Lists quiz results newest first, one page at a time (keyset pagination on quiz_date and
+    `_id`). When more results follow, the cursor for the next page is returned in the
+    X-Next-Cursor header.
+    """
+    date_range = _date_range(date_from, date_to)
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor, {"quiz_date": datetime, "_id": ObjectId})
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    query = _build_results_query(user_id, date_range, position)
+
+    # Fetch one extra result to know whether another page follows
+    docs = await mongo_db.db.quiz_results.find(query).sort(QUIZ_RESULTS_SORT).limit(limit + 1).to_list(length=limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"quiz_date": docs[-1]["quiz_date"], "_id": docs[-1]["_id"]})
+    return [QuizResult.model_validate(doc) for doc in docs]
+
+# --- Analytics (aggregation pipelines, see services/quiz_analytics.py) ---
+
+@router.get("/analytics/summary", response_model=QuizScoreSummary)
+async def get_quiz_summary(
+    user_id: Optional[str] = Query(None, description="Only results of this user."),
+    date_from: Optional[datetime] = Query(None, description="Only results taken at or after this time (UTC)."),
+    date_to: Optional[datetime] = Query(None, description="Only results taken before this time (UTC).")
+):
+    """Count, average, spread and accuracy of quiz scores."""
+    _date_range(date_from, date_to)
+    return await quiz_analytics.summary(user_id, date_from, date_to)
+
+@router.get("/analytics/score-distribution", response_model=List[ScoreBucket])
+async def get_score_distribution(
+    user_id: Optional[str] = Query(None, description="Only results of this user."),
+    date_from: Optional[datetime] = Query(None, description="Only results taken at or after this time (UTC)."),
+    date_to: Optional[datetime] = Query(None, description="Only results taken before this time (UTC).")
+):
+    """Number of quiz results per 10-point score bucket."""
+    _date_range(date_from, date_to)
+    return await quiz_analytics.score_distribution(user_id, date_from, date_to)
+
+@router.get("/analytics/timeseries", response_model=List[QuizTimeseriesPoint])
+async def get_quiz_timeseries(
+    interval: str = Query("day", description=f"Bucket size: {', '.join(TIMESERIES_INTERVALS)}."),
+    user_id: Optional[str] = Query(None, description="Only results of this user."),
+    date_from: Optional[datetime] = Query(None, description="Only results taken at or after this time (UTC)."),
+    date_to: Optional[datetime] = Query(None, description="Only results taken before this time (UTC).")
+):
+    """Quiz statistics per day, week or month, oldest first."""
+    if interval not in TIMESERIES_INTERVALS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"interval must be one of: {', '.join(TIMESERIES_INTERVALS)}.")
+    _date_range(date_from, date_to)
+    return await quiz_analytics.timeseries(interval, user_id, date_from, date_to)
+
+@router.get("/analytics/users", response_model=List[UserQuizStats])
+async def get_user_quiz_stats(
+    response: Response,
+    date_from: Optional[datetime] = Query(None, description="Only results taken at or after this time (UTC)."),
+    date_to: Optional[datetime] = Query(None, description="Only results taken before this time (UTC)."),
+    limit: int = Query(100, ge=1, le=500, description="Maximum number of users per page."),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from the {NEXT_CURSOR_HEADER} header of the previous page.")
+):
+    """Per-user quiz statistics ordered by user ID, one page at a time (cursor in X-Next-Cursor)."""
+    _date_range(date_from, date_to)
+    after_user_id = None
+    if cursor:
+        try:
+            after_user_id = decode_cursor(cursor, {"user_id": str})["user_id"]
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    page, has_more = await quiz_analytics.users(date_from, date_to, limit, after_user_id)
+    if has_more:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"user_id": page[-1]["user_id"]})
+    return page
+
+@router.post("/analytics/rollups/rebuild", response_model=JobInDB, status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_quiz_rollups():
+    """
+    Queues a job that recomputes the per-day quiz rollups from all stored results (needed once
+    after enabling ANALYTICS_ROLLUPS_ENABLED). Poll GET /api/v1/documents/jobs/{job_id}.
+    """
+    job_id = await job_queue.enqueue(JOB_TYPE_REBUILD_QUIZ_ROLLUPS, payload={})
+    return JobInDB.model_validate(await job_queue.get(ObjectId(job_id)))
@@ -4,9 +4,101 @@ class Settings:
     """Application settings loaded from environment variables."""
     MONGO_URI: str = config('MONGO_URI', default="mongodb://localhost:27017/")
     MONGO_DB_NAME: str = config('MONGO_DB_NAME', default="mcq_generator_db")
-    GEMINI_API_KEY: str = config('GEMINI_API_KEY') # Load Google Gemini API Key
+    # LLM backend for MCQ generation (services/llm_providers.py): gemini, huggingface,
+    # transformers (local CPU model) or fake (deterministic offline stub for load tests)
+    LLM_PROVIDER: str = config('LLM_PROVIDER', default="gemini")
+    GEMINI_API_KEY: str = config('GEMINI_API_KEY', default="") # Load Google Gemini API Key (required for LLM_PROVIDER=gemini)
+    GEMINI_MODEL: str = config('GEMINI_MODEL', default="gemini-2.0-flash")
+    HF_API_TOKEN: str = config('HUGGINGFACEHUB_API_TOKEN', default="")
+    HF_MODEL: str = config('HF_MODEL', default="meta-llama/Llama-3.1-8B-Instruct")
+    LOCAL_LLM_MODEL: str = config('LOCAL_LLM_MODEL', default="Qwen/Qwen2.5-0.5B-Instruct")
+    LLM_MAX_NEW_TOKENS: int = config('LLM_MAX_NEW_TOKENS', default=2048, cast=int)
+    # Fake provider: per-call latency (jitter is a fraction of it), share of failing calls and of
+    # questions without an answer, and the seed that makes latency and failures repeatable
+    FAKE_LLM_LATENCY_SECONDS: float = config('FAKE_LLM_LATENCY_SECONDS', default=0.5, cast=float)
+    FAKE_LLM_LATENCY_JITTER: float = config('FAKE_LLM_LATENCY_JITTER', default=0.2, cast=float)
+    FAKE_LLM_ERROR_RATE: float = config('FAKE_LLM_ERROR_RATE', default=0.0, cast=float)
+    FAKE_LLM_MALFORMED_RATE: float = config('FAKE_LLM_MALFORMED_RATE', default=0.0, cast=float)
+    FAKE_LLM_SEED: int = config('FAKE_LLM_SEED', default=0, cast=int)
+    # Connection pool for the shared LLM HTTP client
+    LLM_HTTP_MAX_CONNECTIONS: int = config('LLM_HTTP_MAX_CONNECTIONS', default=20, cast=int)
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = config('LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS', default=10, cast=int)
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = config('LLM_HTTP_KEEPALIVE_EXPIRY', default=30.0, cast=float)
+    LLM_HTTP_TIMEOUT: float = config('LLM_HTTP_TIMEOUT', default=60.0, cast=float)
+    LLM_HTTP2: bool = config('LLM_HTTP2', default=True, cast=bool)
+    # Process-wide LLM governor: token bucket (requests/minute) + adaptive (AIMD) concurrency limit
+    LLM_REQUESTS_PER_MINUTE: float = config('LLM_REQUESTS_PER_MINUTE', default=600.0, cast=float)
+    LLM_RATE_BURST: int = config('LLM_RATE_BURST', default=10, cast=int)
+    LLM_INITIAL_CONCURRENCY: int = config('LLM_INITIAL_CONCURRENCY', default=4, cast=int)
+    LLM_MIN_CONCURRENCY: int = config('LLM_MIN_CONCURRENCY', default=1, cast=int)
+    LLM_MAX_CONCURRENCY: int = config('LLM_MAX_CONCURRENCY', default=16, cast=int)
+    LLM_MAX_BACKOFF_SECONDS: float = config('LLM_MAX_BACKOFF_SECONDS', default=60.0, cast=float)
+    # Content-addressed cache for raw LLM responses
+    LLM_CACHE_ENABLED: bool = config('LLM_CACHE_ENABLED', default=True, cast=bool)
+    LLM_CACHE_MAX_ENTRIES: int = config('LLM_CACHE_MAX_ENTRIES', default=1024, cast=int)
+    LLM_CACHE_TTL_SECONDS: int = config('LLM_CACHE_TTL_SECONDS', default=7 * 24 * 3600, cast=int)
+    # Uploads are streamed to disk in UPLOAD_READ_CHUNK_BYTES pieces and rejected above MAX_UPLOAD_BYTES
+    MAX_UPLOAD_BYTES: int = config('MAX_UPLOAD_BYTES', default=50 * 1024 * 1024, cast=int)
+    UPLOAD_READ_CHUNK_BYTES: int = config('UPLOAD_READ_CHUNK_BYTES', default=1024 * 1024, cast=int)
+    # Document text extraction (PyPDF2/python-docx run in a process pool)
+    DOCUMENT_EXTRACTION_PROCESSES: int = config('DOCUMENT_EXTRACTION_PROCESSES', default=2, cast=int)
+    DOCUMENT_EXTRACTION_PAGES_PER_BATCH: int = config('DOCUMENT_EXTRACTION_PAGES_PER_BATCH', default=16, cast=int)
+    # Semantic chunker: chunks pack whole paragraphs/sentences up to this many (estimated) tokens
+    CHUNK_TOKEN_BUDGET: int = config('CHUNK_TOKEN_BUDGET', default=1000, cast=int)
+    CHUNK_MIN_TOKENS: int = config('CHUNK_MIN_TOKENS', default=40, cast=int)
+    # Maximum number of document chunk requests sent to the LLM at the same time
+    MCQ_CHUNK_CONCURRENCY: int = config('MCQ_CHUNK_CONCURRENCY', default=8, cast=int)
+    # Number of document chunks packed into one Gemini request (1 disables batching)
+    MCQ_CHUNKS_PER_REQUEST: int = config('MCQ_CHUNKS_PER_REQUEST', default=4, cast=int)
+    # Ask Gemini for JSON matching MCQItem (responseSchema) instead of Q:/A)/Answer: text
+    MCQ_STRUCTURED_OUTPUT: bool = config('MCQ_STRUCTURED_OUTPUT', default=True, cast=bool)
+    # Top-up requests for questions missing from a short response: at most this many rounds, asking
+    # for at most MCQ_TOPUP_BUDGET_RATIO * num_questions extra questions in total (0 disables top-up)
+    MCQ_TOPUP_MAX_ROUNDS: int = config('MCQ_TOPUP_MAX_ROUNDS', default=2, cast=int)
+    MCQ_TOPUP_BUDGET_RATIO: float = config('MCQ_TOPUP_BUDGET_RATIO', default=0.5, cast=float)
+    # Durable job queue used by document processing workers (app/worker.py)
+    JOB_LEASE_SECONDS: int = config('JOB_LEASE_SECONDS', default=120, cast=int)
+    JOB_HEARTBEAT_SECONDS: int = config('JOB_HEARTBEAT_SECONDS', default=30, cast=int)
+    JOB_MAX_ATTEMPTS: int = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+    JOB_RETRY_BACKOFF_SECONDS: int = config('JOB_RETRY_BACKOFF_SECONDS', default=30, cast=int)
+    JOB_POLL_INTERVAL_SECONDS: float = config('JOB_POLL_INTERVAL_SECONDS', default=2.0, cast=float)
+    WORKER_PROCESSES: int = config('WORKER_PROCESSES', default=1, cast=int)
+    # Near-duplicate question detection (services/dedup.py)
+    DEDUP_ENABLED: bool = config('DEDUP_ENABLED', default=True, cast=bool)
+    DEDUP_SIMILARITY_THRESHOLD: float = config('DEDUP_SIMILARITY_THRESHOLD', default=0.8, cast=float)
+    DEDUP_BATCH_SIZE: int = config('DEDUP_BATCH_SIZE', default=500, cast=int)
+    # Stored candidates compared per lookup; a band shared by very many questions stops here
+    DEDUP_MAX_CANDIDATES: int = config('DEDUP_MAX_CANDIDATES', default=20000, cast=int)
+    # Semantic search over question embeddings (services/vector_index.py)
+    VECTOR_SEARCH_ENABLED: bool = config('VECTOR_SEARCH_ENABLED', default=True, cast=bool)
+    EMBEDDING_MODEL_NAME: str = config('EMBEDDING_MODEL_NAME', default="sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_BATCH_SIZE: int = config('EMBEDDING_BATCH_SIZE', default=64, cast=int)
+    VECTOR_INDEX_DIR: str = config('VECTOR_INDEX_DIR', default="vector_index")
+    VECTOR_INDEX_SYNC_SECONDS: float = config('VECTOR_INDEX_SYNC_SECONDS', default=30.0, cast=float)
+    # Quiz analytics: maintain per-day rollups of quiz results (services/quiz_analytics.py)
+    ANALYTICS_ROLLUPS_ENABLED: bool = config('ANALYTICS_ROLLUPS_ENABLED', default=False, cast=bool)
+    # Empirical question difficulty from quiz answers (services/question_stats.py): a question is
+    # classified once it has this many answers, by its smoothed share of correct answers
+    DIFFICULTY_MIN_ATTEMPTS: int = config('DIFFICULTY_MIN_ATTEMPTS', default=20, cast=int)
+    DIFFICULTY_EASY_CORRECT_RATE: float = config('DIFFICULTY_EASY_CORRECT_RATE', default=0.75, cast=float)
+    DIFFICULTY_HARD_CORRECT_RATE: float = config('DIFFICULTY_HARD_CORRECT_RATE', default=0.4, cast=float)
+    # Read-through caches for question reads and quiz pools (services/question_cache.py).
+    # With CACHE_REDIS_URL (e.g. redis://localhost:6379/0) Redis holds the shared tier and carries
+    # invalidations to the in-process tiers of every API and worker process. Without it the caches
+    # are in-process only and keep entries at most QUESTION_CACHE_LOCAL_TTL_SECONDS.
+    QUESTION_CACHE_ENABLED: bool = config('QUESTION_CACHE_ENABLED', default=True, cast=bool)
+    QUESTION_CACHE_MAX_ENTRIES: int = config('QUESTION_CACHE_MAX_ENTRIES', default=10000, cast=int)
+    QUESTION_CACHE_TTL_SECONDS: float = config('QUESTION_CACHE_TTL_SECONDS', default=60.0, cast=float)
+    QUIZ_POOL_CACHE_TTL_SECONDS: float = config('QUIZ_POOL_CACHE_TTL_SECONDS', default=30.0, cast=float)
+    QUIZ_POOL_MAX_SIZE: int = config('QUIZ_POOL_MAX_SIZE', default=50000, cast=int)
+    CACHE_REDIS_URL: str = config('CACHE_REDIS_URL', default="")
+    QUESTION_CACHE_LOCAL_TTL_SECONDS: float = config('QUESTION_CACHE_LOCAL_TTL_SECONDS', default=5.0, cast=float)
+    # Bulk question import (POST /api/v1/mcq/questions/bulk)
+    BULK_IMPORT_BATCH_SIZE: int = config('BULK_IMPORT_BATCH_SIZE', default=1000, cast=int)
+    BULK_IMPORT_MAX_REPORTED_ERRORS: int = config('BULK_IMPORT_MAX_REPORTED_ERRORS', default=1000, cast=int)
+    # Questions fetched from Mongo and serialized per write by the streaming exporters
+    EXPORT_BATCH_SIZE: int = config('EXPORT_BATCH_SIZE', default=500, cast=int)
+    # Worker processes that render PDF exports
+    EXPORT_RENDER_PROCESSES: int = config('EXPORT_RENDER_PROCESSES', default=1, cast=int)
 
 settings = Settings()
-
-# Debug print to confirm API Key loading (first 5 and last 5 chars for security)
-print(f"DEBUG: Gemini API Key loaded: {settings.GEMINI_API_KEY[:5]}...{settings.GEMINI_API_KEY[-5:]}")
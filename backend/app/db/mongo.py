@@ -1,9 +1,117 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from pymongo.errors import ConnectionFailure
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from ..config import settings
-from typing import Optional
+from ..utils.gemini_api_utils import llm_http_client
+from ..services.parser import shutdown_extraction_pool
+from ..utils.export_utils import shutdown_export_pool
+from typing import Optional, Dict, List
+
+def index_specs() -> Dict[str, List[IndexModel]]:
+    """
+    Every index the application relies on, per collection. Each router/service query shape
+    should be served by one of these (see tests/test_query_plans.py).
+
+    questions are filtered by any combination of difficulty, categories and source (list,
+    export, quiz sampling/counting), so three compound indexes give every combination an
+    index prefix. `categories` is an array, which makes those indexes multikey. The question list
+    pages through them in `_id` order, so each filter also has an index ending in `_id`: the
+    filtered pages are then read in order from the index instead of being scanned and sorted.
+    """
+    return {
+        "questions": [
+            IndexModel([("difficulty", ASCENDING), ("categories", ASCENDING), ("source", ASCENDING)]),
+            IndexModel([("categories", ASCENDING), ("source", ASCENDING)]),
+            IndexModel([("source", ASCENDING), ("difficulty", ASCENDING)]),
+            # Question list (routes_mcq.get_all_questions): keyset pages on _id per filter. A filter
+            # on several fields uses one of them and checks the others on the documents read.
+            IndexModel([("difficulty", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("categories", ASCENDING), ("_id", ASCENDING)]),
+            IndexModel([("source", ASCENDING), ("_id", ASCENDING)]),
+            # Calibrated quiz selection (services/question_stats.difficulty_filter): both $or branches
+            IndexModel([("empirical_difficulty", ASCENDING), ("difficulty", ASCENDING)]),
+            # Cleanup of a document's questions when its generation job is retried
+            IndexModel([("generated_from_doc_id", ASCENDING)]),
+            # Near-duplicate lookups (services/dedup.py); dedup_bands is an array (multikey)
+            IndexModel([("dedup_bands", ASCENDING)]),
+            IndexModel([("dedup_content_hash", ASCENDING)]),
+            # Semantic search index catch-up (services/vector_index.py): unstamped and recently stamped questions
+            IndexModel([("indexed_at", ASCENDING)]),
+        ],
+        "documents": [
+            IndexModel([("upload_date", DESCENDING)]),
+        ],
+        "document_chunks": [
+            IndexModel([("doc_id", ASCENDING), ("index", ASCENDING)], unique=True),
+        ],
+        "quiz_results": [
+            # Result listing (newest first, keyset on quiz_date then _id) and analytics date ranges,
+            # for one user and for everyone
+            IndexModel([("user_id", ASCENDING), ("quiz_date", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("quiz_date", DESCENDING), ("_id", DESCENDING)]),
+        ],
+        "quiz_rollups": [
+            # One rollup per user (or "*" for everyone) and day; $merge in rebuild_rollups needs it unique
+            IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], unique=True),
+        ],
+        "jobs": [
+            # Job claiming: queued jobs whose backoff elapsed / running jobs whose lease expired
+            IndexModel([("status", ASCENDING), ("available_at", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+        ],
+        "llm_cache": [
+            # Expire cached LLM responses after LLM_CACHE_TTL_SECONDS
+            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=settings.LLM_CACHE_TTL_SECONDS),
+        ],
+    }
+
+# Server error code for an existing index with the same keys but different options
+INDEX_OPTIONS_CONFLICT = 85
+
+async def _update_ttl(collection, index: IndexModel) -> bool:
+    """Applies a changed expireAfterSeconds to an existing TTL index with collMod."""
+    spec = index.document
+    if "expireAfterSeconds" not in spec:
+        return False
+    await collection.database.command(
+        "collMod", collection.name,
+        index={"keyPattern": dict(spec["key"]), "expireAfterSeconds": spec["expireAfterSeconds"]}
+    )
+    print(f"TTL of index {spec['name']} on '{collection.name}' set to {spec['expireAfterSeconds']}s.")
+    return True
+
+async def ensure_indexes(db):
+    """
+    Creates the indexes from index_specs(). Indexes keep MongoDB's default names, and
+    create_indexes is a no-op for indexes that already exist with the same definition, so this
+    is safe to run on every startup. A TTL index whose expireAfterSeconds changed (e.g.
+    LLM_CACHE_TTL_SECONDS) is updated in place with collMod.
+    """
+    for collection_name, indexes in index_specs().items():
+        collection = db[collection_name]
+        try:
+            created = await collection.create_indexes(indexes)
+            print(f"Indexes ensured on '{collection_name}': {', '.join(created)}")
+            continue
+        except Exception as e:
+            if getattr(e, "code", None) != INDEX_OPTIONS_CONFLICT:
+                print(f"Warning: Could not create indexes on '{collection_name}': {e}")
+                continue
+        # One index conflicts with an existing one; create the others one by one
+        for index in indexes:
+            try:
+                await collection.create_indexes([index])
+            except Exception as e:
+                try:
+                    if getattr(e, "code", None) == INDEX_OPTIONS_CONFLICT and await _update_ttl(collection, index):
+                        continue
+                except Exception as collmod_error:
+                    e = collmod_error
+                # Other option changes need the index dropped and rebuilt. Keep the app
+                # running on the existing index and surface the conflict.
+                print(f"Warning: Could not create index {index.document['name']} on '{collection_name}': {e}")
 
 class MongoDB:
     def __init__(self):
@@ -18,6 +126,7 @@ class MongoDB:
             # It will raise an exception if the connection fails.
             await self.client.admin.command('ping')
             self.db = self.client[settings.MONGO_DB_NAME]
+            await ensure_indexes(self.db)
             print(f"MongoDB connected successfully to database: {settings.MONGO_DB_NAME}")
         except ConnectionFailure as e:
             print(f"MongoDB connection failed: {e}")
@@ -34,9 +143,22 @@ mongo_db = MongoDB()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    FastAPI lifespan context manager for managing database connection.
-    Connects to DB on startup and closes on shutdown.
+    FastAPI lifespan context manager for managing database and LLM HTTP connections.
+    Connects to DB and opens the shared LLM HTTP client on startup; closes both and stops the
+    document extraction and export rendering pools and persists the semantic search index on
+    shutdown.
     """
     await mongo_db.connect()
-    yield # Application runs here
-    await mongo_db.close()
\ No newline at end of file
+    await llm_http_client.start()
+    try:
+        yield # Application runs here
+    finally:
+        shutdown_extraction_pool()
+        shutdown_export_pool()
+        # Imported here: these service modules themselves depend on mongo_db
+        from ..services.vector_index import question_vector_index
+        from ..services.question_cache import question_cache
+        question_vector_index.save()
+        await question_cache.close()
+        await llm_http_client.close()
+        await mongo_db.close()
\ No newline at end of file
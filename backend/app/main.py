@@ -4,8 +4,10 @@ from dotenv import load_dotenv
 load_dotenv() # Load environment variables from .env file
 # --- FIX END ---
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from .config import settings
 from .db.mongo import lifespan
 from .api import routes_mcq, routes_quiz, routes_export, routes_documents
 from bson import ObjectId
@@ -35,8 +37,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # Pagination cursor of GET /api/v1/mcq/questions
 )
 
+# Multipart framing adds a little on top of the file itself
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Rejects document uploads whose declared size exceeds MAX_UPLOAD_BYTES before the body is read."""
+    if request.method == "POST" and request.url.path == "/api/v1/documents/upload":
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"detail": f"File exceeds the maximum upload size of {settings.MAX_UPLOAD_BYTES} bytes."}
+            )
+    return await call_next(request)
+
 # Include your routers
 app.include_router(routes_mcq.router, prefix="/api/v1/mcq", tags=["MCQ Management & AI Generation"])
 app.include_router(routes_quiz.router, prefix="/api/v1/quiz", tags=["Quiz Taking & Results"])
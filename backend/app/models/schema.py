@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ValidationError
-from typing import List, Optional, Union, Any
+from typing import List, Optional, Union, Any, Dict
 from enum import Enum
 from datetime import datetime
 from bson import ObjectId
@@ -36,14 +36,21 @@ class Source(str, Enum):
     MANUAL = "Manual"
     DOCUMENT_UPLOAD = "Document_Upload"
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class MCQItem(BaseModel):
     """
-    Represents a single Multiple Choice Question as parsed directly from LLM output.
-    Includes the question text, a list of options, and the correct answer string.
+    A single Multiple Choice Question as returned by the LLM in structured output mode.
+    Its JSON schema is sent to Gemini as the responseSchema (see services/mcq_generator.py).
     """
-    question: str
-    options: List[str]
-    correct_answer: str # This is the text of the correct answer, not its index
+    question: str = Field(..., description="The question text, without a number or 'Q:' prefix.")
+    options: List[str] = Field(..., min_length=4, max_length=4, description="Exactly four answer options, without letter labels.")
+    correct_answer_index: int = Field(..., ge=0, le=3, description="0-based index of the correct option.")
+    explanation: Optional[str] = Field(None, description="A short explanation of why the correct option is right.")
 
 class QuestionBase(BaseModel):
     """Base model for a question, used for creation/update."""
@@ -75,6 +82,11 @@ class QuestionInDB(QuestionBase):
     created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of when the question was created.")
     source: Source = Field(Source.MANUAL, description="The origin of the question (manual, AI-generated, document upload).")
     generated_from_doc_id: Optional[PyObjectId] = Field(None, description="If AI-generated from a document, the ID of the source document.")
+    # Maintained from quiz submissions (services/question_stats.py)
+    attempt_count: int = Field(0, ge=0, description="Number of times the question was answered in a quiz.")
+    correct_count: int = Field(0, ge=0, description="Number of those answers that were correct.")
+    empirical_correct_rate: Optional[float] = Field(None, ge=0, le=1, description="Smoothed share of correct answers.")
+    empirical_difficulty: Optional[Difficulty] = Field(None, description="Difficulty observed from quiz answers, once enough answers are recorded.")
 
     model_config = {
         "populate_by_name": True, # Allows Pydantic to map 'id' to '_id'
@@ -96,6 +108,25 @@ class QuestionInDB(QuestionBase):
         }
     }
 
+class BulkImportError(BaseModel):
+    """A row of a bulk question import that was not inserted."""
+    row: int = Field(..., ge=1, description="1-based position of the row in the uploaded file.")
+    error: str = Field(..., description="Why the row was rejected.")
+
+class BulkImportResult(BaseModel):
+    """Summary of a bulk question import."""
+    received: int = Field(0, ge=0, description="Number of rows read from the upload.")
+    inserted: int = Field(0, ge=0, description="Number of questions inserted.")
+    failed: int = Field(0, ge=0, description="Number of rows rejected by validation or by the database.")
+    errors: List[BulkImportError] = Field(default_factory=list, description="Per-row errors (capped at BULK_IMPORT_MAX_REPORTED_ERRORS).")
+    aborted: Optional[str] = Field(None, description="Set if the upload could not be parsed to the end; rows before the error were imported.")
+
+class AttemptedQuestion(BaseModel):
+    """One answer of a submitted quiz."""
+    question_id: PyObjectId = Field(..., description="The ID of the question.")
+    user_answer_index: int = Field(..., description="The 0-based index of the option the user selected.")
+    is_correct: bool = Field(..., description="Whether the selected option was the correct one.")
+
 class QuizResult(BaseModel):
     """Model for storing quiz results."""
     id: PyObjectId = Field(alias="_id", default_factory=ObjectId, description="The unique identifier for the quiz result.")
@@ -104,9 +135,7 @@ class QuizResult(BaseModel):
     total_questions: int = Field(..., ge=0, description="Total number of questions in the quiz.")
     correct_answers: int = Field(..., ge=0, description="Number of correct answers.")
     score: float = Field(..., ge=0, le=100, description="Score as a percentage.")
-    # You could add more detailed results like:
-    # attempted_questions: List[Dict[str, Union[str, int, bool]]] = Field(default_factory=list)
-    # e.g., [{"question_id": "...", "user_answer_index": N, "is_correct": bool}]
+    attempted_questions: List[AttemptedQuestion] = Field(default_factory=list, description="The answer given to each question of the quiz.")
 
     model_config = {
         "populate_by_name": True,
@@ -119,21 +148,45 @@ class QuizResult(BaseModel):
                     "quiz_date": "2023-10-26T11:00:00:00.000Z",
                     "total_questions": 10,
                     "correct_answers": 7,
-                    "score": 70.0
+                    "score": 70.0,
+                    "attempted_questions": [
+                        {"question_id": "60c72b2f9b1d8c001a8c4d1e", "user_answer_index": 2, "is_correct": True}
+                    ]
                 }
             ]
         }
     }
 
+class QuizScoreSummary(BaseModel):
+    """Aggregated statistics over a set of quiz results."""
+    count: int = Field(0, ge=0, description="Number of quiz results.")
+    average_score: Optional[float] = Field(None, description="Mean score (percentage); null when there are no results.")
+    score_stddev: Optional[float] = Field(None, description="Population standard deviation of the scores.")
+    min_score: Optional[float] = Field(None, description="Lowest score.")
+    max_score: Optional[float] = Field(None, description="Highest score.")
+    accuracy: Optional[float] = Field(None, description="Correct answers as a percentage of all answered questions.")
+
+class ScoreBucket(BaseModel):
+    """Number of quiz results with a score in [min_score, max_score) (the last bucket includes 100)."""
+    min_score: int
+    max_score: int
+    count: int = Field(0, ge=0)
+
+class QuizTimeseriesPoint(QuizScoreSummary):
+    period_start: datetime = Field(..., description="Start (UTC) of the day, week or month.")
+
+class UserQuizStats(QuizScoreSummary):
+    user_id: str = Field(..., description="The user the statistics belong to.")
+
 class DocumentInDB(BaseModel):
     """Model for storing uploaded document metadata."""
     id: PyObjectId = Field(alias="_id", default_factory=ObjectId, description="The unique identifier for the document.")
     filename: str = Field(..., description="The original filename of the uploaded document.")
     file_size: int = Field(..., ge=0, description="The size of the uploaded file in bytes.")
     upload_date: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of when the document was uploaded.")
-    # You could add a status field for processing:
-    # status: str = Field("uploaded", description="Processing status of the document (uploaded, processing, completed, failed).")
-    # And potentially store a reference to the extracted text or chunks if not directly in DB
+    status: Optional[JobStatus] = Field(None, description="Processing status of the document's MCQ generation job.")
+    job_id: Optional[PyObjectId] = Field(None, description="The ID of the job generating MCQs for this document.")
+    # You could potentially store a reference to the extracted text or chunks if not directly in DB
     # text_content_preview: Optional[str] = Field(None, description="A short preview of the document's text content.")
 
     model_config = {
@@ -151,3 +204,38 @@ class DocumentInDB(BaseModel):
         }
     }
 
+class JobInDB(BaseModel):
+    """Model for a background job stored in the `jobs` collection and pulled by worker processes."""
+    id: PyObjectId = Field(alias="_id", default_factory=ObjectId, description="The unique identifier for the job.")
+    job_type: str = Field(..., description="The kind of work the job performs (selects the worker handler).")
+    status: JobStatus = Field(JobStatus.QUEUED, description="Current state of the job.")
+    payload: Dict[str, Any] = Field(default_factory=dict, description="Handler-specific job arguments.")
+    attempts: int = Field(0, ge=0, description="Number of times a worker has claimed the job.")
+    max_attempts: int = Field(3, ge=1, description="Attempts allowed before the job is marked as failed.")
+    worker_id: Optional[str] = Field(None, description="Identifier of the worker currently holding the lease.")
+    lease_expires_at: Optional[datetime] = Field(None, description="When the current lease lapses unless renewed by a heartbeat.")
+    available_at: datetime = Field(default_factory=datetime.utcnow, description="Earliest time the job may be claimed (used for retry backoff).")
+    last_error: Optional[str] = Field(None, description="Error message from the most recent failed attempt.")
+    result: Optional[Dict[str, Any]] = Field(None, description="Handler result once the job has completed.")
+    created_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of when the job was enqueued.")
+    updated_at: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of the last state change.")
+    finished_at: Optional[datetime] = Field(None, description="Timestamp of when the job completed or finally failed.")
+
+    model_config = {
+        "populate_by_name": True,
+        "arbitrary_types_allowed": True,
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "_id": "60c72b2f9b1d8c001a8c4d22",
+                    "job_type": "generate_document_mcqs",
+                    "status": "running",
+                    "payload": {"doc_id": "60c72b2f9b1d8c001a8c4d21", "num_questions_per_chunk": 2, "difficulty": "medium"},
+                    "attempts": 1,
+                    "max_attempts": 3,
+                    "worker_id": "worker-host-1234",
+                    "created_at": "2023-10-26T09:30:01.000Z"
+                }
+            ]
+        }
+    }
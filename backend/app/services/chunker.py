@@ -0,0 +1,285 @@
+import re
+from collections import Counter
+from typing import List, AsyncIterator, Iterable
+
+# Gemini tokenizes English prose at roughly four characters per token. An estimate is enough
+# here: the budget only needs to keep chunks comfortably inside the prompt size we want.
+CHARS_PER_TOKEN = 4
+
+_PAGE_NUMBER_RE = re.compile(
+    r"^\s*(?:page\s*)?(?:\d{1,4}|(?=[ivxlc]+\s*$)c{0,3}(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3}))"
+    r"(?:\s*(?:of|/)\s*\d{1,4})?\s*$",
+    re.IGNORECASE
+)
+_SENTENCE_BOUNDARY_RE = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+(?=[\"'(\[]?[A-Z0-9])")
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+_HYPHENATED_BREAK_RE = re.compile(r"(\w)-\n(\w)")
+_WHITESPACE_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for chunk budgeting and benchmarks."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def split_text_into_chunks(text_content: str, chunk_size: int = 2000, overlap: int = 200) -> List[str]:
+    """Splits extracted text into fixed-size, overlapping character windows (the original chunker)."""
+    chunks = []
+    start = 0
+    while start < len(text_content):
+        end = start + chunk_size
+        chunks.append(text_content[start:end])
+        start += chunk_size - overlap
+    return chunks
+
+async def chunk_text_stream(segments: AsyncIterator[str], chunk_size: int = 2000, overlap: int = 200) -> AsyncIterator[str]:
+    """
+    Lazily splits a stream of text segments into fixed-size, overlapping character windows.
+    Produces the windows of split_text_into_chunks on the concatenated text (minus trailing
+    windows that hold no text beyond the previous window's overlap) while only keeping about
+    one window of text in memory.
+    """
+    step = chunk_size - overlap
+    pending: List[str] = []
+    pending_length = 0
+    covered = 0 # Leading characters of `pending` already sent in an earlier window
+    async for segment in segments:
+        if not segment:
+            continue
+        pending.append(segment)
+        pending_length += len(segment)
+        if pending_length < chunk_size:
+            continue
+        buffer = "".join(pending)
+        start = 0
+        while len(buffer) - start >= chunk_size:
+            yield buffer[start:start + chunk_size]
+            start += step
+        if start:
+            covered = overlap
+        buffer = buffer[start:]
+        pending = [buffer]
+        pending_length = len(buffer)
+    if pending_length > covered:
+        yield "".join(pending)
+
+class SemanticChunker:
+    """
+    Packs whole paragraphs (or, for oversized paragraphs, whole sentences) into chunks of at most
+    `token_budget` estimated tokens, without any overlap.
+
+    Segments are fed as they are extracted. `segment_kind` says what a segment is:
+      - "page": a PDF page. Paragraphs may continue onto the next page, and short lines that
+        repeat across pages (running headers/footers) are dropped. The first
+        `boilerplate_window` pages are buffered to learn those lines before chunks are emitted.
+      - "paragraph": a complete paragraph (DOCX).
+      - "text": an arbitrary slice of plain text (TXT blocks).
+    Bare page numbers are always dropped, and chunks with fewer than `min_chunk_tokens` tokens
+    are discarded unless they are the only content of the document.
+    """
+    SEGMENT_KINDS = ("page", "paragraph", "text")
+
+    def __init__(self, token_budget: int = 1000, min_chunk_tokens: int = 40, segment_kind: str = "text",
+                 boilerplate_window: int = 5, boilerplate_min_repeats: int = 3, boilerplate_max_line_chars: int = 100):
+        if segment_kind not in self.SEGMENT_KINDS:
+            raise ValueError(f"segment_kind must be one of {self.SEGMENT_KINDS}, got '{segment_kind}'.")
+        self.token_budget = token_budget
+        self.min_chunk_tokens = min_chunk_tokens
+        self.segment_kind = segment_kind
+        self.boilerplate_window = boilerplate_window
+        self.boilerplate_min_repeats = boilerplate_min_repeats
+        self.boilerplate_max_line_chars = boilerplate_max_line_chars
+        self._line_counts: Counter = Counter()
+        self._warmup_segments: List[str] = []
+        self._warmed_up = segment_kind != "page"
+        self._carry = "" # Trailing, possibly unfinished paragraph of the previous segment
+        self._partial_line = "" # "text" segments: unfinished last line, cleaned once complete
+        self._in_long_line = False # "text" segments: inside a line passed on before it ended
+        self._current: List[str] = []
+        self._current_tokens = 0
+        self._emitted_any = False
+        self._held_small_chunk = ""
+
+    # --- Boilerplate filtering ---
+
+    @staticmethod
+    def _normalize_line(line: str) -> str:
+        return _DIGITS_RE.sub("#", _WHITESPACE_RE.sub(" ", line.strip().lower()))
+
+    def _learn_lines(self, segment: str):
+        seen_in_segment = set()
+        for line in segment.splitlines():
+            stripped = line.strip()
+            if stripped and len(stripped) <= self.boilerplate_max_line_chars:
+                seen_in_segment.add(self._normalize_line(stripped))
+        self._line_counts.update(seen_in_segment)
+
+    def _is_boilerplate(self, line: str) -> bool:
+        stripped = line.strip()
+        if not stripped:
+            return False
+        if _PAGE_NUMBER_RE.match(stripped):
+            return True
+        return (self.segment_kind == "page" and len(stripped) <= self.boilerplate_max_line_chars and
+                self._line_counts[self._normalize_line(stripped)] >= self.boilerplate_min_repeats)
+
+    def _clean(self, segment: str) -> str:
+        return "\n".join(line for line in segment.split("\n") if not self._is_boilerplate(line))
+
+    def _clean_text_block(self, segment: str) -> str:
+        """
+        Cleans the complete lines of a "text" segment. Blocks are cut at arbitrary offsets, so
+        the unfinished last line is held back and cleaned once the next block completes it; a
+        line longer than the token budget cannot be a page number and is passed on as is.
+        """
+        prefix = ""
+        if self._in_long_line:
+            end = segment.find("\n") + 1
+            if not end:
+                return segment
+            prefix, segment = segment[:end], segment[end:]
+            self._in_long_line = False
+        text = self._partial_line + segment
+        cut = text.rfind("\n") + 1
+        head, self._partial_line = text[:cut], text[cut:]
+        if len(self._partial_line) > self.token_budget * CHARS_PER_TOKEN:
+            head, self._partial_line, self._in_long_line = head + self._partial_line, "", True
+        return prefix + self._clean(head)
+
+    # --- Packing ---
+
+    def _units(self, text: str) -> Iterable[str]:
+        """Yields paragraphs that fit the budget, falling back to sentences and then words."""
+        text = _HYPHENATED_BREAK_RE.sub(r"\1\2", text)
+        for paragraph in _PARAGRAPH_BREAK_RE.split(text):
+            paragraph = _WHITESPACE_RE.sub(" ", paragraph).strip()
+            if not paragraph:
+                continue
+            if estimate_tokens(paragraph) <= self.token_budget:
+                yield paragraph
+                continue
+            for sentence in _SENTENCE_BOUNDARY_RE.split(paragraph):
+                if estimate_tokens(sentence) <= self.token_budget:
+                    yield sentence
+                    continue
+                piece: List[str] = []
+                piece_chars = 0
+                for word in sentence.split(" "):
+                    if piece and (piece_chars + len(word) + 1) > self.token_budget * CHARS_PER_TOKEN:
+                        yield " ".join(piece)
+                        piece, piece_chars = [], 0
+                    piece.append(word)
+                    piece_chars += len(word) + 1
+                if piece:
+                    yield " ".join(piece)
+
+    def _flush(self) -> List[str]:
+        if not self._current:
+            return []
+        chunk = " ".join(self._current)
+        tokens = self._current_tokens
+        self._current, self._current_tokens = [], 0
+        if tokens < self.min_chunk_tokens:
+            # Keep it aside: it is only emitted if the document turns out to have nothing else.
+            if not self._emitted_any:
+                self._held_small_chunk = (self._held_small_chunk + " " + chunk).strip()
+            return []
+        self._emitted_any = True
+        self._held_small_chunk = ""
+        return [chunk]
+
+    def _pack(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        for unit in self._units(text):
+            unit_tokens = estimate_tokens(unit) + 1
+            if self._current and self._current_tokens + unit_tokens > self.token_budget:
+                chunks.extend(self._flush())
+            self._current.append(unit)
+            self._current_tokens += unit_tokens
+        return chunks
+
+    def _consume(self, text: str) -> List[str]:
+        if self.segment_kind == "paragraph":
+            return self._pack(text)
+        # Hold back the text after the last paragraph break: it may continue in the next segment.
+        if self._carry:
+            separator = "" if self.segment_kind == "text" or self._carry.endswith("\n") else "\n"
+            text = self._carry + separator + text
+        last_break = None
+        for last_break in _PARAGRAPH_BREAK_RE.finditer(text):
+            pass
+        if last_break is None:
+            head, self._carry = "", text
+        else:
+            head, self._carry = text[:last_break.end()], text[last_break.end():]
+        chunks = self._pack(head)
+        budget_chars = self.token_budget * CHARS_PER_TOKEN
+        while estimate_tokens(self._carry) > self.token_budget:
+            # Pack an oversized paragraph now, one budget-sized piece at a time cut after its last
+            # sentence (or else its last whitespace), so no word is split and the short rest waits
+            # for the next segment instead of being flushed (and discarded as too small) on its own
+            window = self._carry[:budget_chars]
+            cut = 0
+            for boundary in _SENTENCE_BOUNDARY_RE.finditer(window):
+                cut = boundary.end()
+            if not cut:
+                cut = max(window.rfind(" "), window.rfind("\n")) + 1 or budget_chars
+            chunks.extend(self._pack(self._carry[:cut]))
+            self._carry = self._carry[cut:]
+        return chunks
+
+    def _drain_warmup(self) -> List[str]:
+        self._warmed_up = True
+        chunks: List[str] = []
+        for segment in self._warmup_segments:
+            chunks.extend(self._consume(self._clean(segment)))
+        self._warmup_segments = []
+        return chunks
+
+    # --- Public API ---
+
+    def feed(self, segment: str) -> List[str]:
+        """Consumes one extracted segment and returns the chunks it completed."""
+        if not segment:
+            return []
+        if self.segment_kind == "page":
+            self._learn_lines(segment)
+            if not self._warmed_up:
+                self._warmup_segments.append(segment)
+                if len(self._warmup_segments) < self.boilerplate_window:
+                    return []
+                return self._drain_warmup()
+        if self.segment_kind == "text":
+            return self._consume(self._clean_text_block(segment))
+        return self._consume(self._clean(segment))
+
+    def close(self) -> List[str]:
+        """Flushes buffered text and returns the final chunks."""
+        chunks = [] if self._warmed_up else self._drain_warmup()
+        if self._partial_line:
+            chunks.extend(self._consume(self._clean(self._partial_line)))
+            self._partial_line = ""
+        chunks.extend(self._pack(self._carry))
+        self._carry = ""
+        chunks.extend(self._flush())
+        if not self._emitted_any and self._held_small_chunk:
+            chunks.append(self._held_small_chunk)
+            self._held_small_chunk = ""
+        return chunks
+
+def semantic_chunks(segments: Iterable[str], **chunker_options) -> List[str]:
+    """Synchronous convenience wrapper around SemanticChunker."""
+    chunker = SemanticChunker(**chunker_options)
+    chunks: List[str] = []
+    for segment in segments:
+        chunks.extend(chunker.feed(segment))
+    chunks.extend(chunker.close())
+    return chunks
+
+async def semantic_chunk_stream(segments: AsyncIterator[str], **chunker_options) -> AsyncIterator[str]:
+    """Lazily chunks a stream of extracted segments with SemanticChunker."""
+    chunker = SemanticChunker(**chunker_options)
+    async for segment in segments:
+        for chunk in chunker.feed(segment):
+            yield chunk
+    for chunk in chunker.close():
+        yield chunk
@@ -0,0 +1,230 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+import hashlib
+import random
+import re
+import struct
+from pymongo import UpdateOne
+from ..config import settings
+from ..db.mongo import mongo_db
+from .question_cache import question_cache
+from .vector_index import question_vector_index
+
+# Fingerprint fields stored on question documents (indexed, see db/mongo.index_specs)
+CONTENT_HASH_FIELD = "dedup_content_hash"
+MINHASH_FIELD = "dedup_minhash"
+BANDS_FIELD = "dedup_bands"
+DEDUP_FIELDS = (CONTENT_HASH_FIELD, MINHASH_FIELD, BANDS_FIELD)
+
+# 64 MinHash values in 16 LSH bands of 4: pairs with Jaccard similarity 0.8 share a band with
+# probability ~0.9999, unrelated pairs (similarity 0.3) only ~13% of the time.
+MINHASH_PERMUTATIONS = 64
+MINHASH_BAND_ROWS = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+_permutation_rng = random.Random(20240601) # Fixed seed: signatures must be stable across processes
+_PERMUTATIONS = [
+    (_permutation_rng.randrange(1, _MERSENNE_PRIME), _permutation_rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+# Stored candidates are streamed and compared in pages of this many documents
+CANDIDATE_PAGE_SIZE = 1000
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Lowercases, drops punctuation and collapses whitespace."""
+    return _WHITESPACE_RE.sub(" ", _NON_WORD_RE.sub(" ", (text or "").lower())).strip()
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big") % _MERSENNE_PRIME
+
+def minhash_signature(features: Set[str]) -> List[int]:
+    """MinHash signature (MINHASH_PERMUTATIONS 32-bit values) of a feature set."""
+    hashes = [_feature_hash(feature) for feature in features] or [0]
+    return [min(((a * h + b) % _MERSENNE_PRIME) & 0xFFFFFFFF for h in hashes) for a, b in _PERMUTATIONS]
+
+def estimated_similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of two packed signatures (fraction of equal MinHash values)."""
+    values_a = struct.unpack(f">{MINHASH_PERMUTATIONS}I", a)
+    values_b = struct.unpack(f">{MINHASH_PERMUTATIONS}I", b)
+    return sum(x == y for x, y in zip(values_a, values_b)) / MINHASH_PERMUTATIONS
+
+def question_features(question_text: str, options: List[str]) -> Set[str]:
+    """Word unigrams and bigrams of the question plus each whole option (order-insensitive)."""
+    tokens = normalize_text(question_text).split()
+    features = set(tokens)
+    features.update(f"{tokens[i]} {tokens[i + 1]}" for i in range(len(tokens) - 1))
+    features.update(f"option:{normalize_text(option)}" for option in options or [])
+    return features
+
+def fingerprint(question_text: str, options: List[str]) -> Dict[str, Any]:
+    """
+    Computes the dedup fields of a question:
+      - an exact hash of the normalized question and its (order-insensitive) options,
+      - a MinHash signature of its features, packed as bytes, and the LSH band keys of it.
+    """
+    normalized_options = sorted(normalize_text(option) for option in options or [])
+    content_hash = hashlib.sha1(
+        (normalize_text(question_text) + "\x1f" + "\x1e".join(normalized_options)).encode("utf-8")
+    ).hexdigest()
+    signature = struct.pack(f">{MINHASH_PERMUTATIONS}I", *minhash_signature(question_features(question_text, options)))
+    band_bytes = MINHASH_BAND_ROWS * 4
+    bands = [
+        f"{i}:{hashlib.blake2b(signature[i * band_bytes:(i + 1) * band_bytes], digest_size=6).hexdigest()}"
+        for i in range(MINHASH_PERMUTATIONS // MINHASH_BAND_ROWS)
+    ]
+    return {CONTENT_HASH_FIELD: content_hash, MINHASH_FIELD: signature, BANDS_FIELD: bands}
+
+def add_fingerprint(question_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds the dedup fields to a question document in place and returns it."""
+    question_doc.update(fingerprint(question_doc.get("question_text", ""), question_doc.get("options", [])))
+    return question_doc
+
+def is_near_duplicate(a: Dict[str, Any], b: Dict[str, Any], threshold: float) -> bool:
+    if a[CONTENT_HASH_FIELD] == b.get(CONTENT_HASH_FIELD):
+        return True
+    return b.get(MINHASH_FIELD) is not None and estimated_similarity(a[MINHASH_FIELD], b[MINHASH_FIELD]) >= threshold
+
+def candidate_queries(docs: List[Dict[str, Any]], extra_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Stored questions sharing a content hash, then a MinHash band, with fingerprinted `docs`."""
+    queries = [
+        {CONTENT_HASH_FIELD: {"$in": sorted({doc[CONTENT_HASH_FIELD] for doc in docs})}},
+        {BANDS_FIELD: {"$in": sorted({band for doc in docs for band in doc[BANDS_FIELD]})}},
+    ]
+    if extra_filter:
+        queries = [{"$and": [query, extra_filter]} for query in queries]
+    return queries
+
+class QuestionDeduplicator:
+    """
+    Near-duplicate detection for the questions collection. Each question carries an exact
+    content hash and a MinHash signature split into LSH bands; candidates are the stored
+    questions that share a band (a multikey index lookup) and are confirmed by their estimated
+    Jaccard similarity.
+
+    Candidates are streamed in pages of CANDIDATE_PAGE_SIZE, and at most `max_candidates` are
+    compared per lookup. Exact content-hash matches are read first, so the cap only costs
+    recall on near (not exact) duplicates behind a very common band.
+    """
+    def __init__(self, similarity_threshold: float = 0.8, max_candidates: int = 20000):
+        self.similarity_threshold = similarity_threshold
+        self.max_candidates = max_candidates
+
+    async def _stored_duplicates(self, docs: List[Dict[str, Any]], extra_filter: Optional[Dict[str, Any]] = None) -> Set[int]:
+        """Positions in `docs` of the questions that near-duplicate a stored question."""
+        pending = dict(enumerate(docs))
+        duplicates: Set[int] = set()
+        projection = {field: 1 for field in DEDUP_FIELDS}
+        compared = 0
+        for query in candidate_queries(docs, extra_filter):
+            limit = self.max_candidates - compared
+            cursor = mongo_db.db.questions.find(query, projection).limit(limit + 1)
+            while pending and limit > 0:
+                page = await cursor.to_list(length=min(CANDIDATE_PAGE_SIZE, limit))
+                if not page:
+                    break
+                compared += len(page)
+                limit -= len(page)
+                by_band = self._index(page)
+                for position, doc in list(pending.items()):
+                    if self._match(doc, by_band) is not None:
+                        duplicates.add(position)
+                        del pending[position]
+            if pending and limit <= 0 and await cursor.to_list(length=1):
+                print(f"Near-duplicate lookup stopped after {self.max_candidates} candidates (DEDUP_MAX_CANDIDATES).")
+            await cursor.close()
+            if not pending or limit <= 0:
+                break
+        return duplicates
+
+    def _index(self, docs: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        by_band: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in docs:
+            for band in doc.get(BANDS_FIELD) or []:
+                by_band.setdefault(band, []).append(doc)
+            by_band.setdefault(doc[CONTENT_HASH_FIELD], []).append(doc)
+        return by_band
+
+    def _match(self, doc: Dict[str, Any], by_band: Dict[str, List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        for key in [doc[CONTENT_HASH_FIELD]] + doc[BANDS_FIELD]:
+            for candidate in by_band.get(key, []):
+                if candidate is not doc and is_near_duplicate(doc, candidate, self.similarity_threshold):
+                    return candidate
+        return None
+
+    async def filter_new(self, question_docs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Fingerprints `question_docs` and drops the ones that near-duplicate a stored question or
+        an earlier question of the same list. Returns (questions to insert, number dropped).
+        """
+        if not question_docs:
+            return [], 0
+        for doc in question_docs:
+            add_fingerprint(doc)
+        stored_duplicates = await self._stored_duplicates(question_docs)
+        by_band: Dict[str, List[Dict[str, Any]]] = {}
+        kept = []
+        for position, doc in enumerate(question_docs):
+            if position not in stored_duplicates and self._match(doc, by_band) is None:
+                kept.append(doc)
+                for key in [doc[CONTENT_HASH_FIELD]] + doc[BANDS_FIELD]:
+                    by_band.setdefault(key, []).append(doc)
+        return kept, len(question_docs) - len(kept)
+
+    async def dedupe_collection(self, delete: bool = False, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Walks the questions collection oldest first, backfilling missing fingerprints and finding
+        questions that near-duplicate an older one. With `delete`, those newer copies are removed.
+        """
+        stats = {"scanned": 0, "fingerprinted": 0, "duplicates": 0, "deleted": 0}
+        last_id = None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = await mongo_db.db.questions.find(
+                query, {"question_text": 1, "options": 1, **{field: 1 for field in DEDUP_FIELDS}}
+            ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+            if not batch:
+                return stats
+            last_id = batch[-1]["_id"]
+            stats["scanned"] += len(batch)
+
+            updates = []
+            for doc in batch:
+                if any(field not in doc for field in DEDUP_FIELDS):
+                    add_fingerprint(doc)
+                    updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: doc[field] for field in DEDUP_FIELDS}}))
+            if updates:
+                await mongo_db.db.questions.bulk_write(updates, ordered=False)
+                stats["fingerprinted"] += len(updates)
+
+            # Older questions (earlier batches) are in the database; this batch is matched in memory
+            stored_duplicates = await self._stored_duplicates(batch, {"_id": {"$lt": batch[0]["_id"]}})
+            by_band: Dict[str, List[Dict[str, Any]]] = {}
+            duplicate_ids = []
+            for position, doc in enumerate(batch):
+                if position in stored_duplicates or self._match(doc, by_band) is not None:
+                    duplicate_ids.append(doc["_id"])
+                    continue
+                for key in [doc[CONTENT_HASH_FIELD]] + doc[BANDS_FIELD]:
+                    by_band.setdefault(key, []).append(doc)
+            stats["duplicates"] += len(duplicate_ids)
+            if delete and duplicate_ids:
+                result = await mongo_db.db.questions.delete_many({"_id": {"$in": duplicate_ids}})
+                stats["deleted"] += result.deleted_count
+                await question_cache.invalidate_questions(duplicate_ids)
+                await question_cache.invalidate_pools()
+                await question_vector_index.remove(str(qid) for qid in duplicate_ids)
+
+question_deduplicator = QuestionDeduplicator(
+    similarity_threshold=settings.DEDUP_SIMILARITY_THRESHOLD,
+    max_candidates=settings.DEDUP_MAX_CANDIDATES
+)
+
+async def dedupe_questions_job(job: dict) -> dict:
+    """Job handler for JOB_TYPE_DEDUPE_QUESTIONS."""
+    payload = job.get("payload") or {}
+    return await question_deduplicator.dedupe_collection(
+        delete=payload.get("delete", False),
+        batch_size=payload.get("batch_size", settings.DEDUP_BATCH_SIZE)
+    )
@@ -0,0 +1,192 @@
+from typing import List, Optional, AsyncIterable, AsyncIterator
+import asyncio
+from bson import ObjectId
+from ..config import settings
+from ..db.mongo import mongo_db
+from ..models.schema import QuestionInDB, Source, Difficulty, JobStatus
+from .mcq_generator import mcq_generator_service, LLMGenerationError
+from .mcq_parser import ParsedMCQ
+from .dedup import question_deduplicator
+from .question_cache import question_cache
+
+async def generate_mcqs_from_document_background(
+    doc_id: str,
+    chunks: AsyncIterable[str],
+    num_questions_per_chunk: int,
+    difficulty: Difficulty,
+    category: Optional[str],
+    use_cache: bool = True
+) -> int:
+    """
+    Generates MCQs for every chunk of a document and stores them in the questions collection.
+    Runs inside a job worker (see app/worker.py). Chunks are read lazily, one round of
+    MCQ_CHUNK_CONCURRENCY batches at a time, and each round's questions are stored before the
+    next is read, so memory stays bounded however large the document is. Per-batch failures are
+    logged and skipped; anything else is re-raised so the job queue can retry the job.
+    Returns the number of questions inserted.
+    """
+    try:
+        print(f"Background MCQ generation started for document ID: {doc_id}")
+
+        concurrency = max(1, settings.MCQ_CHUNK_CONCURRENCY)
+        semaphore = asyncio.Semaphore(concurrency)
+        batch_size = max(1, settings.MCQ_CHUNKS_PER_REQUEST)
+
+        def to_question_docs(mcq_items: List[ParsedMCQ]) -> List[dict]:
+            chunk_questions = []
+            for mcq_item in mcq_items:
+                question = QuestionInDB(
+                    question_text=mcq_item.question,
+                    options=mcq_item.options,
+                    correct_answer_index=mcq_item.correct_answer_index,
+                    explanation=mcq_item.explanation or f"The correct answer is {mcq_item.correct_answer}.",
+                    difficulty=difficulty,
+                    categories=[category] if category else [],
+                    source=Source.DOCUMENT_UPLOAD,
+                    generated_from_doc_id=ObjectId(doc_id)
+                )
+                chunk_questions.append(question.model_dump(by_alias=True, exclude_none=True))
+            return chunk_questions
+
+        async def generate_for_batch(b: int, batch: List[str]) -> List[dict]:
+            """Generates and converts MCQs for one batch of chunks, bounded by the shared semaphore."""
+            batch_questions = []
+            async with semaphore:
+                print(f"Processing chunk batch {b+1} ({len(batch)} chunks) for document {doc_id}...")
+                try:
+                    per_chunk_mcq_items: List[List[ParsedMCQ]] = await mcq_generator_service.generate_mcqs_for_chunk_batch(
+                        chunks=batch,
+                        num_questions_per_chunk=num_questions_per_chunk,
+                        difficulty=difficulty,
+                        category=category,
+                        use_cache=use_cache
+                    )
+                except LLMGenerationError as e:
+                    print(f"LLM generation error for chunk batch {b+1} of doc {doc_id}: {e}")
+                    return batch_questions
+                except Exception as e:
+                    print(f"Unexpected error processing chunk batch {b+1} of doc {doc_id}: {e}")
+                    return batch_questions
+
+            for mcq_items in per_chunk_mcq_items:
+                try:
+                    batch_questions.extend(to_question_docs(mcq_items))
+                except Exception as e:
+                    print(f"Unexpected error processing chunk batch {b+1} of doc {doc_id}: {e}")
+            return batch_questions
+
+        async def generate_for_round(first_batch: int, batches: List[List[str]]) -> int:
+            # Batches of MCQ_CHUNKS_PER_REQUEST chunks share one Gemini request and are dispatched
+            # concurrently (at most MCQ_CHUNK_CONCURRENCY in flight); gather() returns results in
+            # batch order and each batch is demultiplexed in chunk order, so questions keep document order.
+            per_batch_questions = await asyncio.gather(
+                *(generate_for_batch(first_batch + b, batch) for b, batch in enumerate(batches))
+            )
+            round_questions = [q for batch_questions in per_batch_questions for q in batch_questions]
+
+            # Earlier rounds are already stored, so they are deduplicated against like any stored question
+            if settings.DEDUP_ENABLED and round_questions:
+                round_questions, duplicate_count = await question_deduplicator.filter_new(round_questions)
+                if duplicate_count:
+                    print(f"Skipped {duplicate_count} near-duplicate MCQs for document {doc_id}.")
+
+            if round_questions:
+                await mongo_db.db.questions.insert_many(round_questions)
+                await question_cache.invalidate_pools()
+            return len(round_questions)
+
+        inserted_count = 0
+        batch_count = 0
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        async for chunk in chunks:
+            if not chunk.strip():
+                continue
+            batch.append(chunk)
+            if len(batch) < batch_size:
+                continue
+            batches.append(batch)
+            batch = []
+            if len(batches) == concurrency:
+                inserted_count += await generate_for_round(batch_count, batches)
+                batch_count += len(batches)
+                batches = []
+        if batch:
+            batches.append(batch)
+        if batches:
+            inserted_count += await generate_for_round(batch_count, batches)
+            batch_count += len(batches)
+
+        if not batch_count:
+            print(f"No valid text chunks found for document {doc_id}.")
+        elif inserted_count:
+            print(f"Successfully generated and saved {inserted_count} MCQs for document {doc_id}")
+        else:
+            print(f"No MCQs generated from document {doc_id} after processing all chunks.")
+        return inserted_count
+
+    except Exception as e:
+        print(f"Critical error in background MCQ generation for document {doc_id}: {e}")
+        raise
+
+async def store_document_chunks(doc_id: str, chunks: AsyncIterable[str], batch_size: int = 100) -> int:
+    """
+    Persists a document's chunks so any job worker can pick them up. Chunks are consumed
+    lazily and written in batches, so only `batch_size` chunks are held in memory at once.
+    Returns the number stored.
+    """
+    doc_object_id = ObjectId(doc_id)
+    stored_count = 0
+    batch = []
+    async for chunk in chunks:
+        if not chunk.strip():
+            continue
+        batch.append({"doc_id": doc_object_id, "index": stored_count, "text": chunk})
+        stored_count += 1
+        if len(batch) >= batch_size:
+            await mongo_db.db.document_chunks.insert_many(batch)
+            batch = []
+    if batch:
+        await mongo_db.db.document_chunks.insert_many(batch)
+    return stored_count
+
+async def process_document_job(job: dict) -> dict:
+    """
+    Job handler for JOB_TYPE_GENERATE_DOCUMENT_MCQS. Loads the document's stored chunks,
+    generates MCQs for them and keeps the document's status in step with the job.
+    """
+    payload = job["payload"]
+    doc_id = payload["doc_id"]
+    doc_object_id = ObjectId(doc_id)
+
+    await mongo_db.db.documents.update_one({"_id": doc_object_id}, {"$set": {"status": JobStatus.RUNNING.value}})
+
+    if job.get("attempts", 1) > 1:
+        # A previous attempt may have inserted questions before losing its lease.
+        await mongo_db.db.questions.delete_many({"generated_from_doc_id": doc_id})
+        await question_cache.invalidate_pools()
+
+    chunks_processed = 0
+
+    async def stored_chunks() -> AsyncIterator[str]:
+        nonlocal chunks_processed
+        # One getMore per generation round, so the cursor is never idle for longer than a round
+        cursor = mongo_db.db.document_chunks.find({"doc_id": doc_object_id}, {"text": 1}).sort("index", 1).batch_size(
+            max(1, settings.MCQ_CHUNKS_PER_REQUEST) * max(1, settings.MCQ_CHUNK_CONCURRENCY)
+        )
+        async for chunk_doc in cursor:
+            chunks_processed += 1
+            yield chunk_doc["text"]
+
+    inserted_count = await generate_mcqs_from_document_background(
+        doc_id=doc_id,
+        chunks=stored_chunks(),
+        num_questions_per_chunk=payload["num_questions_per_chunk"],
+        difficulty=Difficulty(payload["difficulty"]),
+        category=payload.get("category"),
+        use_cache=payload.get("use_cache", True)
+    )
+
+    await mongo_db.db.document_chunks.delete_many({"doc_id": doc_object_id})
+    await mongo_db.db.documents.update_one({"_id": doc_object_id}, {"$set": {"status": JobStatus.COMPLETED.value}})
+    return {"questions_generated": inserted_count, "chunks_processed": chunks_processed}
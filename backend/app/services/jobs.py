@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from ..config import settings
+from ..db.mongo import mongo_db
+from ..models.schema import JobInDB, JobStatus
+
+JOB_TYPE_GENERATE_DOCUMENT_MCQS = "generate_document_mcqs"
+JOB_TYPE_DEDUPE_QUESTIONS = "dedupe_questions"
+JOB_TYPE_REBUILD_QUIZ_ROLLUPS = "rebuild_quiz_rollups"
+CLAIM_SORT = [("available_at", 1)]
+
+def claimable_filter(now: datetime) -> Dict[str, Any]:
+    """Queued jobs whose backoff has elapsed and running jobs whose lease expired, with attempts left."""
+    return {
+        "$or": [
+            {"status": JobStatus.QUEUED.value, "available_at": {"$lte": now}},
+            {"status": JobStatus.RUNNING.value, "lease_expires_at": {"$lt": now}},
+        ],
+        "$expr": {"$lt": ["$attempts", "$max_attempts"]},
+    }
+
+def abandoned_filter(now: datetime) -> Dict[str, Any]:
+    """Running jobs whose lease expired on their final attempt."""
+    return {
+        "status": JobStatus.RUNNING.value,
+        "lease_expires_at": {"$lt": now},
+        "$expr": {"$gte": ["$attempts", "$max_attempts"]},
+    }
+
+class JobQueue:
+    """
+    Durable job queue backed by the `jobs` Mongo collection.
+
+    Workers claim jobs atomically with find_one_and_update and hold them under a lease that
+    they renew with heartbeats. A job whose lease lapses (e.g. the worker crashed) becomes
+    claimable again; failed attempts are retried with a backoff until max_attempts is reached.
+    """
+    def __init__(self, lease_seconds: int, max_attempts: int, retry_backoff_seconds: int):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+    @property
+    def _collection(self):
+        return mongo_db.db.jobs
+
+    async def enqueue(self, job_type: str, payload: Dict[str, Any], max_attempts: Optional[int] = None) -> str:
+        """Adds a job to the queue and returns its ID."""
+        job = JobInDB(
+            job_type=job_type,
+            payload=payload,
+            max_attempts=max_attempts or self.max_attempts
+        )
+        result = await self._collection.insert_one(job.model_dump(by_alias=True, exclude_none=True))
+        return str(result.inserted_id)
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claims the oldest runnable job for `worker_id`: either a queued job whose
+        backoff has elapsed or a running job whose lease has expired with attempts left.
+        """
+        now = datetime.utcnow()
+        return await self._collection.find_one_and_update(
+            claimable_filter(now),
+            {
+                "$set": {
+                    "status": JobStatus.RUNNING.value,
+                    "worker_id": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=CLAIM_SORT,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def heartbeat(self, job_id: ObjectId, worker_id: str) -> bool:
+        """Extends the lease of a running job. Returns False if the worker no longer holds it."""
+        now = datetime.utcnow()
+        result = await self._collection.update_one(
+            {"_id": job_id, "worker_id": worker_id, "status": JobStatus.RUNNING.value},
+            {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_seconds), "updated_at": now}}
+        )
+        return result.matched_count == 1
+
+    async def complete(self, job_id: ObjectId, worker_id: str, result: Optional[Dict[str, Any]] = None):
+        """Marks a job as completed and stores the handler's result."""
+        now = datetime.utcnow()
+        await self._collection.update_one(
+            {"_id": job_id, "worker_id": worker_id},
+            {
+                "$set": {"status": JobStatus.COMPLETED.value, "result": result, "updated_at": now, "finished_at": now},
+                "$unset": {"lease_expires_at": ""},
+            }
+        )
+
+    async def fail(self, job: Dict[str, Any], worker_id: str, error: str) -> JobStatus:
+        """
+        Records a failed attempt. The job is requeued with a backoff while attempts remain,
+        otherwise it is marked as failed. Returns the job's new status.
+        """
+        now = datetime.utcnow()
+        if job.get("attempts", 0) < job.get("max_attempts", self.max_attempts):
+            new_status = JobStatus.QUEUED
+            update = {
+                "status": new_status.value,
+                "available_at": now + timedelta(seconds=self.retry_backoff_seconds * job.get("attempts", 1)),
+                "last_error": error,
+                "updated_at": now,
+            }
+        else:
+            new_status = JobStatus.FAILED
+            update = {"status": new_status.value, "last_error": error, "updated_at": now, "finished_at": now}
+        await self._collection.update_one(
+            {"_id": job["_id"], "worker_id": worker_id},
+            {"$set": update, "$unset": {"lease_expires_at": ""}}
+        )
+        return new_status
+
+    async def fail_abandoned(self) -> int:
+        """Marks running jobs whose lease expired on their final attempt as failed."""
+        now = datetime.utcnow()
+        result = await self._collection.update_many(
+            abandoned_filter(now),
+            {
+                "$set": {"status": JobStatus.FAILED.value, "last_error": "Lease expired on final attempt.", "updated_at": now, "finished_at": now},
+                "$unset": {"lease_expires_at": ""},
+            }
+        )
+        return result.modified_count
+
+    async def cancel(self, job_id: ObjectId, reason: str) -> bool:
+        """Marks a job that no worker has claimed yet as failed. Returns whether it was still queued."""
+        now = datetime.utcnow()
+        result = await self._collection.update_one(
+            {"_id": job_id, "status": JobStatus.QUEUED.value},
+            {"$set": {"status": JobStatus.FAILED.value, "last_error": reason, "updated_at": now, "finished_at": now}}
+        )
+        return result.modified_count == 1
+
+    async def get(self, job_id: ObjectId) -> Optional[Dict[str, Any]]:
+        return await self._collection.find_one({"_id": job_id})
+
+job_queue = JobQueue(
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_backoff_seconds=settings.JOB_RETRY_BACKOFF_SECONDS,
+)
@@ -0,0 +1,113 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any
+
+from ..config import settings
+from ..db.mongo import mongo_db
+
+class LLMResponseCache:
+    """
+    Content-addressed cache for raw LLM responses.
+
+    Entries are keyed by a SHA-256 of the model identifier plus the whitespace-normalized
+    prompt. Lookups go to a small in-process LRU first and then to the `llm_cache` Mongo
+    collection, whose TTL index (created in MongoDB.connect) expires old entries. MongoDB
+    removes expired documents only about once a minute, so persistent hits also check
+    `created_at` against `ttl_seconds`; a copy in the LRU expires with the stored entry.
+    """
+    COLLECTION_NAME = "llm_cache"
+
+    def __init__(self, max_entries: int, ttl_seconds: int, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        """Builds the cache key from the model identifier and the normalized prompt."""
+        normalized_prompt = " ".join(prompt.split())
+        return hashlib.sha256(f"{model}\n{normalized_prompt}".encode("utf-8")).hexdigest()
+
+    @property
+    def _collection(self):
+        return mongo_db.db[self.COLLECTION_NAME] if mongo_db.db is not None else None
+
+    def _remember(self, key: str, response: str, stored_at: float):
+        self._memory[key] = (response, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for `key`, or None on a miss."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            response, stored_at = entry
+            if time.time() - stored_at < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return response
+            del self._memory[key]
+
+        collection = self._collection
+        if collection is not None:
+            fresh_since = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+            try:
+                doc = await collection.find_one(
+                    {"_id": key, "created_at": {"$gte": fresh_since}}, {"response": 1, "created_at": 1}
+                )
+            except Exception as e:
+                print(f"LLM cache lookup failed, treating as miss: {e}")
+                doc = None
+            if doc:
+                self.persistent_hits += 1
+                # created_at is naive UTC, as written by set()
+                self._remember(key, doc["response"], doc["created_at"].replace(tzinfo=timezone.utc).timestamp())
+                return doc["response"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: str):
+        """Stores a response in both tiers. Persistent-tier failures are logged, not raised."""
+        now = datetime.utcnow()
+        self._remember(key, response, time.time())
+        collection = self._collection
+        if collection is None:
+            return
+        try:
+            await collection.update_one(
+                {"_id": key},
+                {"$set": {"response": response, "created_at": now}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+
+    def record_bypass(self):
+        self.bypassed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round((self.memory_hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+llm_response_cache = LLMResponseCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    enabled=settings.LLM_CACHE_ENABLED,
+)
@@ -0,0 +1,285 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import random
+import re
+import httpx
+from ..config import settings
+from ..utils.gemini_api_utils import (
+    call_gemini_api_with_retries, stream_gemini_api_with_retries, post_json_with_retries,
+)
+
+# The local CPU backend needs transformers and torch:
+# pip install transformers torch
+
+class LLMProviderError(Exception):
+    """Raised when a provider is misconfigured or fails outside its own retry handling."""
+    pass
+
+class LLMProvider:
+    """
+    A text generation backend for MCQGeneratorService (selected with LLM_PROVIDER).
+    Providers that set supports_response_schema honour a Gemini-style responseSchema and return
+    JSON; the others are only used with the Q:/A)/Answer: text format.
+    """
+    name = "base"
+    supports_response_schema = False
+
+    @property
+    def cache_model(self) -> str:
+        """Identifies the backend and model in LLM response cache keys."""
+        raise NotImplementedError
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yields the output in fragments. Backends without streaming yield it in one piece."""
+        yield await self.generate(prompt)
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    supports_response_schema = True
+
+    def __init__(self, api_key: str, model: str, client: Optional[httpx.AsyncClient] = None):
+        self.api_key = api_key
+        self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+        self.stream_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
+        self.headers = {"Content-Type": "application/json"}
+        self.client = client # None: the shared pooled client (utils/gemini_api_utils.llm_http_client)
+
+    @property
+    def cache_model(self) -> str:
+        return self.api_url
+
+    def _payload(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if not self.api_key:
+            raise LLMProviderError("GEMINI_API_KEY is not set. Please set it in your .env file or choose another LLM_PROVIDER.")
+        payload = {
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [{"text": prompt}]
+                }
+            ]
+        }
+        if response_schema is not None:
+            payload["generationConfig"] = {
+                "responseMimeType": "application/json",
+                "responseSchema": response_schema,
+            }
+        return payload
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        return await call_gemini_api_with_retries(
+            api_url=self.api_url,
+            headers=self.headers,
+            payload=self._payload(prompt, response_schema),
+            api_key=self.api_key,
+            client=self.client
+        )
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async for fragment in stream_gemini_api_with_retries(
+            api_url=self.stream_url,
+            headers=self.headers,
+            payload=self._payload(prompt),
+            api_key=self.api_key,
+            client=self.client
+        ):
+            yield fragment
+
+class HuggingFaceProvider(LLMProvider):
+    """Hugging Face Inference API (text-generation task), sharing the pooled client and the governor."""
+    name = "huggingface"
+
+    def __init__(self, api_token: str, model: str, max_new_tokens: int):
+        self.api_token = api_token
+        self.model = model
+        self.api_url = f"https://api-inference.huggingface.co/models/{model}"
+        self.max_new_tokens = max_new_tokens
+
+    @property
+    def cache_model(self) -> str:
+        return self.api_url
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        if not self.api_token:
+            raise LLMProviderError("HUGGINGFACEHUB_API_TOKEN is not set. Please set it in your .env file.")
+        payload = {
+            "inputs": prompt,
+            "parameters": {
+                "max_new_tokens": self.max_new_tokens,
+                "temperature": 0.7,
+                "return_full_text": False # Instruction models would otherwise echo the prompt
+            }
+        }
+        headers = {"Authorization": f"Bearer {self.api_token}", "Content-Type": "application/json"}
+        result = await post_json_with_retries(self.api_url, headers, payload, service_name="Hugging Face Inference API")
+        if isinstance(result, list) and result and "generated_text" in result[0]:
+            return result[0]["generated_text"]
+        raise LLMProviderError(f"Hugging Face Inference API returned an unexpected response: {result}")
+
+class TransformersProvider(LLMProvider):
+    """
+    Runs a local `transformers` text-generation pipeline on the CPU. The model is loaded on first
+    use; generations run one at a time in a worker thread so the event loop stays responsive.
+    """
+    name = "transformers"
+
+    def __init__(self, model: str, max_new_tokens: int):
+        self.model = model
+        self.max_new_tokens = max_new_tokens
+        self._pipeline = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def cache_model(self) -> str:
+        return f"transformers:{self.model}"
+
+    def _load(self):
+        try:
+            from transformers import pipeline
+        except ImportError as e:
+            raise LLMProviderError("transformers and torch must be installed for LLM_PROVIDER=transformers.") from e
+        print(f"Loading local model '{self.model}' on CPU...")
+        self._pipeline = pipeline("text-generation", model=self.model, device=-1)
+
+    async def generate(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        async with self._lock:
+            if self._pipeline is None:
+                await asyncio.to_thread(self._load)
+            outputs = await asyncio.to_thread(
+                self._pipeline, prompt, max_new_tokens=self.max_new_tokens, return_full_text=False, do_sample=False
+            )
+        return outputs[0]["generated_text"]
+
+# The fake provider reads the requested counts back out of MCQGeneratorService's prompts
+_FAKE_SECTIONS_RE = re.compile(r"Below are\s+(\d+)\s+numbered text sections", re.IGNORECASE)
+_FAKE_COUNT_RE = re.compile(r"generate\s+(\d+)\s+MCQs", re.IGNORECASE)
+_FAKE_STREAM_FRAGMENT_CHARS = 64
+
+class FakeLLMProvider(GeminiProvider):
+    """
+    Deterministic offline provider for load tests and benchmarks. The output depends only on the
+    prompt: as many MCQs as the prompt asks for (per section for batched prompts), in JSON when a
+    response schema is given and in the Q:/A)/Answer: format otherwise. A `malformed_rate` share
+    of the questions has no answer, exercising the parsers' drop paths and top-up requests.
+
+    It answers Gemini's generateContent and streamGenerateContent endpoints from an in-process
+    httpx.MockTransport, so every call takes the real Gemini path: a governor slot and the
+    retry/backoff loop of utils/gemini_api_utils. Each HTTP attempt takes `latency_seconds`
+    (+/- `latency_jitter` of it); an `error_rate` share of attempts is answered with a 429,
+    which that loop reports to the governor and retries after backing off, as for a real
+    throttle. Latency and failures come from a generator seeded with `seed`, so runs with the
+    same call order are repeatable.
+    """
+    name = "fake"
+
+    def __init__(self, latency_seconds: float = 0.5, latency_jitter: float = 0.2, error_rate: float = 0.0,
+                 malformed_rate: float = 0.0, seed: int = 0):
+        super().__init__(api_key="fake", model="fake", client=httpx.AsyncClient(transport=httpx.MockTransport(self._handle)))
+        self.latency_seconds = latency_seconds
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self._rng = random.Random(seed)
+        self.calls = 0 # HTTP attempts, retries included
+        self.throttled = 0
+
+    @property
+    def cache_model(self) -> str:
+        return "fake"
+
+    def _questions(self, rng: random.Random, tag: str, count: int) -> List[Dict[str, Any]]:
+        questions = []
+        for i in range(count):
+            answer_index = rng.randrange(4)
+            questions.append({
+                "question": f"Fake question {tag}-{i + 1}: which option is correct?",
+                "options": [f"Option {letter} of {tag}-{i + 1}" for letter in "ABCD"],
+                "correct_answer_index": None if rng.random() < self.malformed_rate else answer_index,
+                "explanation": f"Option {'ABCD'[answer_index]} is the generated answer.",
+            })
+        return questions
+
+    @staticmethod
+    def _as_text(questions: List[Dict[str, Any]]) -> str:
+        blocks = []
+        for question in questions:
+            lines = [f"Q: {question['question']}"]
+            lines += [f"{letter}) {option}" for letter, option in zip("ABCD", question["options"])]
+            if question["correct_answer_index"] is not None:
+                lines.append(f"Answer: {'ABCD'[question['correct_answer_index']]}")
+            lines.append(f"Explanation: {question['explanation']}")
+            blocks.append("\n".join(lines))
+        return "\n\n".join(blocks)
+
+    def render(self, prompt: str, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """Builds the output for `prompt` without latency or failures."""
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        rng = random.Random(digest)
+        count_match = _FAKE_COUNT_RE.search(prompt)
+        count = int(count_match.group(1)) if count_match else 5
+        sections_match = _FAKE_SECTIONS_RE.search(prompt)
+
+        if sections_match is None:
+            questions = self._questions(rng, digest[:8], count)
+            if response_schema is not None:
+                return json.dumps(questions)
+            return self._as_text(questions)
+
+        sections = [
+            (number, self._questions(rng, f"{digest[:8]}s{number}", count))
+            for number in range(1, int(sections_match.group(1)) + 1)
+        ]
+        if response_schema is not None:
+            return json.dumps([{"section": number, "questions": questions} for number, questions in sections])
+        return "\n\n".join(f"Section: {number}\n\n{self._as_text(questions)}" for number, questions in sections)
+
+    @staticmethod
+    def _gemini_response(text: str) -> Dict[str, Any]:
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+    async def _sse_events(self, output: str) -> AsyncIterator[bytes]:
+        for start in range(0, len(output), _FAKE_STREAM_FRAGMENT_CHARS):
+            event = self._gemini_response(output[start:start + _FAKE_STREAM_FRAGMENT_CHARS])
+            yield f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            await asyncio.sleep(0)
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        latency = self.latency_seconds * (1 + self.latency_jitter * (2 * self._rng.random() - 1))
+        throttled = self._rng.random() < self.error_rate
+        await asyncio.sleep(max(0.0, latency))
+        if throttled:
+            self.throttled += 1
+            return httpx.Response(429, json={"error": {"code": 429, "message": "Fake LLM provider: injected throttle."}})
+        payload = json.loads(await request.aread())
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        if request.url.path.endswith(":streamGenerateContent"):
+            return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=self._sse_events(self.render(prompt)))
+        response_schema = (payload.get("generationConfig") or {}).get("responseSchema")
+        return httpx.Response(200, json=self._gemini_response(self.render(prompt, response_schema)))
+
+LLM_PROVIDERS = ("gemini", "huggingface", "transformers", "fake")
+
+def create_llm_provider(name: str) -> LLMProvider:
+    """Builds the provider selected by LLM_PROVIDER from its settings."""
+    name = name.strip().lower()
+    if name == "gemini":
+        return GeminiProvider(settings.GEMINI_API_KEY, settings.GEMINI_MODEL)
+    if name == "huggingface":
+        return HuggingFaceProvider(settings.HF_API_TOKEN, settings.HF_MODEL, settings.LLM_MAX_NEW_TOKENS)
+    if name == "transformers":
+        return TransformersProvider(settings.LOCAL_LLM_MODEL, settings.LLM_MAX_NEW_TOKENS)
+    if name == "fake":
+        return FakeLLMProvider(
+            latency_seconds=settings.FAKE_LLM_LATENCY_SECONDS,
+            latency_jitter=settings.FAKE_LLM_LATENCY_JITTER,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            malformed_rate=settings.FAKE_LLM_MALFORMED_RATE,
+            seed=settings.FAKE_LLM_SEED,
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER '{name}'. Choose one of: {', '.join(LLM_PROVIDERS)}.")
@@ -1,7 +1,6 @@
-import os
-import json
-from typing import List, Optional
-from pydantic import BaseModel, Field, ValidationError
+import math
+from typing import Any, Dict, List, Optional, AsyncIterator
+from collections import Counter
 import enum # Keep this import
 
 # REMOVE: from dotenv import load_dotenv # REMOVE THIS LINE if present
@@ -12,8 +11,14 @@ import enum # Keep this import
 from ..config import settings
 # --- FIX END ---
 
-from ..utils.gemini_api_utils import call_gemini_api_with_retries
-from ..models.schema import Difficulty, MCQItem # Keep these imports
+from ..utils.gemini_api_utils import gemini_response_schema
+from .llm_providers import LLMProvider, create_llm_provider
+from .llm_cache import llm_response_cache
+from .mcq_parser import (
+    ParsedMCQ, MCQParser, parse_mcq_output, parse_sectioned_mcq_output,
+    parse_structured_mcq_output, parse_structured_sectioned_output,
+)
+from ..models.schema import Difficulty, MCQItem # Keep this import
 
 # --- Custom Exception for LLM Generation Errors ---
 class LLMGenerationError(Exception):
@@ -26,35 +31,73 @@ class Difficulty(str, enum.Enum): # This line now has 'enum' defined
     MEDIUM = "medium"
     HARD = "hard"
 
-class MCQItem(BaseModel):
-    question: str
-    options: List[str]
-    correct_answer: str
-    explanation: Optional[str] = None
+# responseSchema for structured output mode: a list of MCQItem objects, or for batched prompts
+# a list of {"section": <number>, "questions": [MCQItem, ...]} objects
+MCQ_LIST_RESPONSE_SCHEMA = {"type": "ARRAY", "items": gemini_response_schema(MCQItem)}
+MCQ_SECTIONS_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"section": {"type": "INTEGER"}, "questions": MCQ_LIST_RESPONSE_SCHEMA},
+        "required": ["section", "questions"],
+        "propertyOrdering": ["section", "questions"],
+    },
+}
 
-class MCQGeneratorService:
+class GenerationYieldStats:
+    """
+    Per-output-mode counters of questions requested from the LLM vs questions that survived
+    parsing, so the structured (JSON) and text modes can be compared.
+    """
     def __init__(self):
-        # --- FIX START ---
-        # Get the API key directly from the settings object
-        self.gemini_api_key = settings.GEMINI_API_KEY
-        # The ValueError check is now handled by the Settings class's __init__
-        # You can remove the 'if not self.gemini_api_key' block here,
-        # as the app won't even start if it's missing from settings.
-        # Keeping it for extra debug print, but it should ideally never be hit.
-        if not self.gemini_api_key:
-            print("DEBUG: GEMINI_API_KEY is still not set when MCQGeneratorService initializes (fallback check)!")
-            raise ValueError("GEMINI_API_KEY environment variable not set. Please set it in your .env file.")
-        
-        # REMOVE: print(f"DEBUG: Gemini API Key loaded in MCQGeneratorService: {self.gemini_api_key[:5]}...{self.gemini_api_key[-5:]}")
-        # --- FIX END ---
-
-        self.GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-        self.GEMINI_HEADERS = {"Content-Type": "application/json"}
-
-    async def generate_mcq_from_text(self, topic: str, num_questions: int, difficulty: Difficulty, category: Optional[str]) -> List[MCQItem]:
+        self._modes: Dict[str, Counter] = {}
+
+    def record(self, mode: str, requested: int, returned: int, dropped: Counter):
+        counters = self._modes.setdefault(mode, Counter())
+        counters["calls"] += 1
+        counters["requested"] += requested
+        counters["returned"] += returned
+        counters["dropped"] += sum(dropped.values())
+        for reason, count in dropped.items():
+            counters[f"dropped_{reason}"] += count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            mode: {**counters, "yield": round(counters["returned"] / counters["requested"], 4) if counters["requested"] else None}
+            for mode, counters in self._modes.items()
+        }
+
+def _log_yield(mode: str, requested: int, returned: int, dropped: Counter, context: str):
+    reasons = ", ".join(f"{reason}={count}" for reason, count in sorted(dropped.items()))
+    print(f"MCQ yield for {context} ({mode}): {returned}/{requested} questions" + (f"; dropped {reasons}" if reasons else ""))
+
+# Top-up prompts list the stems already generated, each cut to this many characters
+TOPUP_STEM_MAX_CHARS = 200
+
+def _unique_stems(questions: List[ParsedMCQ]) -> List[ParsedMCQ]:
+    """Drops questions whose stem repeats an earlier one (case and whitespace insensitive)."""
+    seen = set()
+    unique = []
+    for question in questions:
+        stem = " ".join(question.question.lower().split())
+        if stem not in seen:
+            seen.add(stem)
+            unique.append(question)
+    return unique
+
+class MCQGeneratorService:
+    def __init__(self, provider: Optional[LLMProvider] = None):
+        # The LLM backend comes from LLM_PROVIDER unless one is passed in (benchmarks, load tests).
+        # Missing credentials are reported on the first call, so the app also starts without them.
+        self.provider = provider or create_llm_provider(settings.LLM_PROVIDER)
+        # Structured output: the LLM returns JSON matching MCQItem instead of Q:/A)/Answer: text
+        self.structured_output = settings.MCQ_STRUCTURED_OUTPUT and self.provider.supports_response_schema
+        self.yield_stats = GenerationYieldStats()
+
+    def _build_prompt(self, topic: str, num_questions: int, difficulty: Difficulty, category: Optional[str]) -> str:
         category_prompt = f"The questions should be related to the category: {category}." if category else ""
 
-        prompt = f"""
+        return f"""
         Generate {num_questions} MCQs on the topic '{topic}'.
         Each MCQ should have exactly 4 options (A, B, C, D) and one correct answer.
         Difficulty: {difficulty.value}.
@@ -72,96 +115,236 @@ class MCQGeneratorService:
         Ensure there are no introductory or concluding remarks, just the MCQs following this exact format, separated by blank lines.
         """
 
-        payload = {
-            "contents": [
-                {
-                    "role": "user",
-                    "parts": [{"text": prompt}]
-                }
-            ]
-        }
+    def _build_batch_prompt(self, chunks: List[str], num_questions_per_chunk: int, difficulty: Difficulty, category: Optional[str]) -> str:
+        category_prompt = f"The questions should be related to the category: {category}." if category else ""
+        sections = "\n\n".join(
+            f"=== SECTION {i} ===\n{chunk.strip()}\n=== END SECTION {i} ==="
+            for i, chunk in enumerate(chunks, start=1)
+        )
+
+        return f"""
+        Below are {len(chunks)} numbered text sections. For EACH section, generate {num_questions_per_chunk} MCQs
+        based only on that section's text.
+        Each MCQ should have exactly 4 options (A, B, C, D) and one correct answer.
+        Difficulty: {difficulty.value}.
+        {category_prompt}
+
+        **STRICT FORMAT REQUIRED:**
+        Section: <section number>
+
+        Q: <question text>
+        A) <option A text>
+        B) <option B text>
+        C) <option C text>
+        D) <option D text>
+        Answer: <A/B/C/D>
+        (Optional) Explanation: <explanation text>
+
+        Start the questions of every section with its "Section: <number>" line, in section order.
+        Ensure there are no introductory or concluding remarks, just the section lines and MCQs following this exact format, separated by blank lines.
+
+{sections}
+        """
+
+    def _build_structured_prompt(self, topic: str, num_questions: int, difficulty: Difficulty, category: Optional[str]) -> str:
+        category_prompt = f"The questions should be related to the category: {category}." if category else ""
+
+        return f"""
+        Generate {num_questions} MCQs on the topic '{topic}'.
+        Each MCQ should have exactly 4 options and one correct answer, given as the 0-based index of the correct option.
+        Difficulty: {difficulty.value}.
+        {category_prompt}
+        """
+
+    def _build_structured_batch_prompt(self, chunks: List[str], num_questions_per_chunk: int, difficulty: Difficulty, category: Optional[str]) -> str:
+        category_prompt = f"The questions should be related to the category: {category}." if category else ""
+        sections = "\n\n".join(
+            f"=== SECTION {i} ===\n{chunk.strip()}\n=== END SECTION {i} ==="
+            for i, chunk in enumerate(chunks, start=1)
+        )
+
+        return f"""
+        Below are {len(chunks)} numbered text sections. For EACH section, generate {num_questions_per_chunk} MCQs
+        based only on that section's text, and return them under that section's number.
+        Each MCQ should have exactly 4 options and one correct answer, given as the 0-based index of the correct option.
+        Difficulty: {difficulty.value}.
+        {category_prompt}
+
+{sections}
+        """
+
+    async def _call_llm(self, prompt: str, use_cache: bool = True, response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Sends the prompt to the LLM provider, serving identical prompts from the LLM response cache.
+        Pass use_cache=False to force a fresh generation (the new output still refreshes the cache).
+        With a response_schema the provider answers in JSON mode.
+        """
+        # JSON responses are cached apart from text responses to the same prompt
+        cache_model = f"{self.provider.cache_model}#json" if response_schema is not None else self.provider.cache_model
+        cache_key = None
+        if llm_response_cache.enabled and use_cache:
+            cache_key = llm_response_cache.make_key(cache_model, prompt)
+            cached_output = await llm_response_cache.get(cache_key)
+            if cached_output is not None:
+                print("LLM cache hit, skipping LLM call.")
+                return cached_output
+        elif llm_response_cache.enabled:
+            llm_response_cache.record_bypass()
+            cache_key = llm_response_cache.make_key(cache_model, prompt)
+
+        raw_output = await self.provider.generate(prompt, response_schema=response_schema)
+        if cache_key is not None:
+            await llm_response_cache.set(cache_key, raw_output)
+        return raw_output
+
+    @staticmethod
+    def _build_avoid_prompt(avoid_questions: List[str]) -> str:
+        # Stems are shortened so a long avoid list does not cost more tokens than the questions it saves
+        stems = "\n".join(f"- {stem[:TOPUP_STEM_MAX_CHARS]}" for stem in avoid_questions)
+        return f"""
+        These questions already exist. Do not repeat or rephrase any of them:
+{stems}
+        """
+
+    async def generate_mcq_from_text(self, topic: str, num_questions: int, difficulty: Difficulty, category: Optional[str], use_cache: bool = True, avoid_questions: Optional[List[str]] = None) -> List[ParsedMCQ]:
+        if self.structured_output:
+            prompt = self._build_structured_prompt(topic, num_questions, difficulty, category)
+        else:
+            prompt = self._build_prompt(topic, num_questions, difficulty, category)
+        if avoid_questions:
+            prompt += self._build_avoid_prompt(avoid_questions)
 
         try:
-            raw_output = await call_gemini_api_with_retries(
-                api_url=self.GEMINI_API_URL,
-                headers=self.GEMINI_HEADERS,
-                payload=payload,
-                api_key=self.gemini_api_key
+            raw_output = await self._call_llm(
+                prompt, use_cache=use_cache,
+                response_schema=MCQ_LIST_RESPONSE_SCHEMA if self.structured_output else None
             )
             
             print("\n--- Raw LLM Output Start ---")
             print(raw_output)
             print("--- Raw LLM Output End ---\n")
 
-            lines = raw_output.strip().split("\n")
-
-            questions: List[MCQItem] = []
-            current_q_text: str = ""
-            options: List[str] = []
-            correct_answer_letter: str = ""
-            explanation_text: Optional[str] = None
-
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                if line.startswith("Q:"):
-                    if current_q_text and len(options) == 4 and correct_answer_letter:
-                        try:
-                            correct_index = ord(correct_answer_letter) - ord('A')
-                            if 0 <= correct_index < len(options):
-                                correct_answer_text = options[correct_index]
-                                questions.append(MCQItem(
-                                    question=current_q_text,
-                                    options=options,
-                                    correct_answer=correct_answer_text,
-                                    explanation=explanation_text
-                                ))
-                            else:
-                                print(f"Warning: Correct answer letter '{correct_answer_letter}' points to an invalid option index for question: '{current_q_text}'. Skipping this question.")
-                        except ValidationError as ve:
-                            print(f"Pydantic validation error for MCQItem: {ve} on question: '{current_q_text}'")
-                        except Exception as e:
-                            print(f"Error processing previous question: {e} on question: '{current_q_text}'")
-                    
-                    current_q_text = line[2:].strip()
-                    options = []
-                    correct_answer_letter = ""
-                    explanation_text = None
-                elif line.startswith(("A)", "B)", "C)", "D)")):
-                    options.append(line[2:].strip())
-                elif line.startswith("Answer:"):
-                    letter_part = line.split(":")[1].strip().upper()
-                    if letter_part and len(letter_part) == 1 and 'A' <= letter_part <= 'D':
-                        correct_answer_letter = letter_part
-                    else:
-                        print(f"Warning: Could not parse valid correct answer letter from '{line}'.")
-                elif line.startswith("Explanation:"):
-                    explanation_text = line[len("Explanation:"):].strip()
-            
-            if current_q_text and len(options) == 4 and correct_answer_letter:
-                try:
-                    correct_index = ord(correct_answer_letter) - ord('A')
-                    if 0 <= correct_index < len(options):
-                        correct_answer_text = options[correct_index]
-                        questions.append(MCQItem(
-                            question=current_q_text,
-                            options=options,
-                            correct_answer=correct_answer_text,
-                            explanation=explanation_text
-                        ))
-                    else:
-                        print(f"Warning: Correct answer letter '{correct_answer_letter}' points to an invalid option index for the last question: '{current_q_text}'. Skipping this question.")
-                except ValidationError as ve:
-                    print(f"Pydantic validation error for last MCQItem: {ve} on question: '{current_q_text}'")
-                except Exception as e:
-                    print(f"Error processing last question: {e} on question: '{current_q_text}'")
-            
+            if self.structured_output:
+                dropped = Counter()
+                questions = parse_structured_mcq_output(raw_output, dropped)
+            else:
+                parser = MCQParser()
+                questions = parse_mcq_output(raw_output, parser)
+                dropped = parser.dropped
+            mode = "json" if self.structured_output else "text"
+            self._record_yield(num_questions, len(questions), dropped, f"topic '{topic}'",
+                               mode=f"{mode}_top_up" if avoid_questions else mode)
             return questions
 
         except Exception as e:
             print(f"An error occurred in generate_mcq_from_text: {e}")
             raise LLMGenerationError(f"Failed to generate MCQs from LLM: {e}")
 
+    async def generate_mcqs_with_top_up(self, topic: str, num_questions: int, difficulty: Difficulty, category: Optional[str], use_cache: bool = True) -> List[ParsedMCQ]:
+        """
+        Like generate_mcq_from_text, but when the response yields fewer than `num_questions` valid
+        MCQs, asks again for only the missing count, passing the stems generated so far so they
+        are not repeated. Top-up requests stop after MCQ_TOPUP_MAX_ROUNDS rounds, once they have
+        asked for MCQ_TOPUP_BUDGET_RATIO * num_questions extra questions in total, or when a round
+        adds nothing new. A failed top-up round keeps the questions generated so far.
+        """
+        questions = _unique_stems(await self.generate_mcq_from_text(topic, num_questions, difficulty, category, use_cache=use_cache))
+        budget = math.ceil(num_questions * settings.MCQ_TOPUP_BUDGET_RATIO)
+        requested_extra = 0
+        for round_number in range(1, settings.MCQ_TOPUP_MAX_ROUNDS + 1):
+            missing = min(num_questions - len(questions), budget - requested_extra)
+            if missing <= 0:
+                break
+            requested_extra += missing
+            print(f"Top-up round {round_number} for topic '{topic}': requesting {missing} more MCQs ({len(questions)}/{num_questions} so far).")
+            try:
+                extra = await self.generate_mcq_from_text(
+                    topic, missing, difficulty, category, use_cache=use_cache,
+                    avoid_questions=[question.question for question in questions]
+                )
+            except LLMGenerationError as e:
+                print(f"Top-up round {round_number} for topic '{topic}' failed, keeping {len(questions)} MCQs: {e}")
+                break
+            added = len(questions)
+            questions = _unique_stems(questions + extra)
+            if len(questions) == added:
+                break
+        return questions[:num_questions]
+
+    async def generate_mcqs_for_chunk_batch(self, chunks: List[str], num_questions_per_chunk: int, difficulty: Difficulty, category: Optional[str], use_cache: bool = True) -> List[List[ParsedMCQ]]:
+        """
+        Generates MCQs for several chunks with a single LLM request, so the instruction preamble
+        is paid once per batch instead of once per chunk. Returns one MCQ list per input chunk, in order.
+        A batch of one chunk uses the regular single-chunk prompt.
+        """
+        if len(chunks) == 1:
+            return [await self.generate_mcq_from_text(chunks[0], num_questions_per_chunk, difficulty, category, use_cache=use_cache)]
+
+        if self.structured_output:
+            prompt = self._build_structured_batch_prompt(chunks, num_questions_per_chunk, difficulty, category)
+        else:
+            prompt = self._build_batch_prompt(chunks, num_questions_per_chunk, difficulty, category)
+        try:
+            raw_output = await self._call_llm(
+                prompt, use_cache=use_cache,
+                response_schema=MCQ_SECTIONS_RESPONSE_SCHEMA if self.structured_output else None
+            )
+        except Exception as e:
+            print(f"An error occurred in generate_mcqs_for_chunk_batch: {e}")
+            raise LLMGenerationError(f"Failed to generate MCQs from LLM: {e}")
+        if self.structured_output:
+            dropped = Counter()
+            sections = parse_structured_sectioned_output(raw_output, len(chunks), dropped)
+        else:
+            parser = MCQParser()
+            sections = parse_sectioned_mcq_output(raw_output, len(chunks), parser)
+            dropped = parser.dropped
+        self._record_yield(num_questions_per_chunk * len(chunks), sum(len(section) for section in sections), dropped, f"a batch of {len(chunks)} chunks")
+        return sections
+
+    def _record_yield(self, requested: int, returned: int, dropped: Counter, context: str, mode: Optional[str] = None):
+        """Counts the response in yield_stats and logs one summary line for it."""
+        mode = mode or ("json" if self.structured_output else "text")
+        self.yield_stats.record(mode, requested, returned, dropped)
+        _log_yield(mode, requested, returned, dropped, context)
+
+    async def stream_mcq_from_text(self, topic: str, num_questions: int, difficulty: Difficulty, category: Optional[str], use_cache: bool = True) -> AsyncIterator[ParsedMCQ]:
+        """
+        Streams MCQs from the LLM provider (Gemini's streamGenerateContent endpoint; providers without
+        streaming deliver the whole output at once), yielding each question as soon as its block
+        has been received. Cached outputs are replayed through the same parser, and a
+        completed stream refreshes the LLM response cache.
+        """
+        prompt = self._build_prompt(topic, num_questions, difficulty, category)
+        parser = MCQParser()
+
+        cache_key = None
+        if llm_response_cache.enabled:
+            cache_key = llm_response_cache.make_key(self.provider.cache_model, prompt)
+            if use_cache:
+                cached_output = await llm_response_cache.get(cache_key)
+                if cached_output is not None:
+                    print("LLM cache hit, replaying cached output instead of streaming from the LLM.")
+                    for item in parser.feed(cached_output) + parser.close():
+                        yield item
+                    return
+            else:
+                llm_response_cache.record_bypass()
+
+        fragments: List[str] = []
+        try:
+            async for fragment in self.provider.stream(prompt):
+                fragments.append(fragment)
+                for item in parser.feed(fragment):
+                    yield item
+        except Exception as e:
+            print(f"An error occurred in stream_mcq_from_text: {e}")
+            raise LLMGenerationError(f"Failed to stream MCQs from LLM: {e}")
+
+        for item in parser.close():
+            yield item
+        self._record_yield(num_questions, parser.emitted, parser.dropped, f"the stream for topic '{topic}'", mode="text_stream")
+        if cache_key is not None:
+            await llm_response_cache.set(cache_key, "".join(fragments))
+
 mcq_generator_service = MCQGeneratorService()
@@ -0,0 +1,426 @@
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from collections import Counter
+import json
+import re
+
+# orjson decodes structured (JSON mode) responses several times faster than the json module.
+# Install it with: pip install orjson
+try:
+    import orjson
+    _loads_json = orjson.loads
+except ImportError:
+    _loads_json = json.loads
+
+# Options are labelled A) to F) (QuestionBase allows up to 6 options)
+MIN_OPTIONS = 2
+MAX_OPTIONS = 6
+
+class ParsedMCQ(NamedTuple):
+    """A multiple-choice question parsed from LLM output, with the correct option as an index."""
+    question: str
+    options: List[str]
+    correct_answer_index: int
+    explanation: Optional[str] = None
+
+    @property
+    def correct_answer(self) -> str:
+        return self.options[self.correct_answer_index]
+
+# One pattern classifies a line (after markdown emphasis and list bullets are stripped, see
+# MCQParser._feed_lines). It accepts the drift seen in practice: "Q1.", "Question 2:", "1." question
+# prefixes; "A)", "a.", "(B)", "C:" option labels; "Answer: b", "Correct answer - C) text",
+# "Answer: <text>". A "." label needs a space after it, so "e.g." does not start an option.
+_LINE_RE = re.compile(r"""
+    (?P<option>\(?(?P<option_label>[a-f])(?:\s*[):\]]|\.(?=\s))\s*(?P<option_text>.+))
+  | (?P<answer>(?:correct\s+)?answer\s*[:\-]?\s*(?P<answer_text>.*))
+  | (?P<explanation>(?:\(optional\)\s*)?explanation\s*[:\-]\s*(?P<explanation_text>.*))
+  | (?P<question>(?:q(?:uestion)?\s*\d*\s*[:.)\-]|\d{1,3}\s*[.)])\s*(?P<question_text>.*))
+""", re.IGNORECASE | re.VERBOSE)
+
+# Fast path: a whole block in the exact format the prompts ask for ("Q:", "A)".."F)" in order,
+# "Answer: <letter>", an optional one-line "Explanation:"), followed by a blank line or the end of
+# the text. Such blocks are converted straight from the match; anything else goes through the
+# line parser.
+_CANONICAL_BLOCK_RE = re.compile(r"""
+    ^[ \t]*Q:[ \t]*(?P<question>\S[^\n]*)(?<=\S)[ \t]*\n
+    [ \t]*A\)[ \t]*(?P<a>\S[^\n]*)(?<=\S)[ \t]*\n
+    [ \t]*B\)[ \t]*(?P<b>\S[^\n]*)(?<=\S)[ \t]*\n
+    (?:[ \t]*C\)[ \t]*(?P<c>\S[^\n]*)(?<=\S)[ \t]*\n
+    (?:[ \t]*D\)[ \t]*(?P<d>\S[^\n]*)(?<=\S)[ \t]*\n
+    (?:[ \t]*E\)[ \t]*(?P<e>\S[^\n]*)(?<=\S)[ \t]*\n
+    (?:[ \t]*F\)[ \t]*(?P<f>\S[^\n]*)(?<=\S)[ \t]*\n)?)?)?)?
+    [ \t]*Answer:[ \t]*(?P<answer>[A-Fa-f])[ \t]*
+    (?:\n[ \t]*Explanation:[ \t]*(?P<explanation>[^\n]*))?
+    (?=\n[ \t]*(?:\n|\Z)|\Z)
+""", re.MULTILINE | re.VERBOSE)
+
+_ANSWER_LETTER_RE = re.compile(r"\(?([a-f])(?:\s*[).:\]]|$)", re.IGNORECASE)
+# "Answer: B Amylase", "Answer: B (Amylase)": a letter followed by the text of that option
+_ANSWER_LETTER_TEXT_RE = re.compile(r"([a-f])\s+\(?(.+?)\)?", re.IGNORECASE)
+_BULLET_RE = re.compile(r"[-*\u2022]\s+")
+_BULLET_CHARS = ("-", "*", "\u2022")
+_NON_WORD_RE = re.compile(r"\W+")
+
+# Matches the "Section: N" header lines that separate per-chunk output in batched prompts
+SECTION_HEADER_RE = re.compile(r"^\s*[#*=\s]*section\s*:?\s*(\d+)\b", re.IGNORECASE)
+# The same header as a whole line, found in one scan of a complete response
+_SECTION_HEADER_LINE_RE = re.compile(r"^(?:[#*=]|[^\S\n])*section[^\S\n]*:?[^\S\n]*(\d+)\b[^\n]*", re.IGNORECASE | re.MULTILINE)
+
+def _normalize_option(text: str) -> str:
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+def _answer_from_text(answer_text: str, options: List[str]) -> Optional[int]:
+    """
+    Resolves an answer given as text: "Answer: Paris" matches the option text; "Answer: B Paris"
+    is option B only when that option's text follows the letter.
+    """
+    wanted = _normalize_option(answer_text)
+    matches = [i for i, option in enumerate(options) if _normalize_option(option) == wanted]
+    if len(matches) == 1:
+        return matches[0]
+    letter = _ANSWER_LETTER_TEXT_RE.fullmatch(answer_text)
+    if letter:
+        index = ord(letter.group(1).upper()) - 65
+        if index < len(options) and _normalize_option(options[index]) == _normalize_option(letter.group(2)):
+            return index
+    return None
+
+class MCQParser:
+    """
+    Single-pass, incremental parser for the Q:/A)-D)/Answer:/Explanation: format.
+
+    Text can be fed in arbitrary fragments (streamed responses) or whole; each MCQ is emitted as
+    soon as its block is complete (blank line after the answer, the next question or the end of
+    the input). Lines that match no pattern continue the question, option or explanation they
+    follow, and text before the first question is ignored. Blocks that cannot be turned into a
+    valid question are counted in `dropped` by reason instead of being logged.
+
+    Blocks already in the exact prompt format are matched whole by _CANONICAL_BLOCK_RE, which
+    keeps the common case as fast as a plain startswith() scan; only drifted text pays for the
+    per-line classification.
+    """
+    def __init__(self):
+        self._buffer = ""
+        self.emitted = 0
+        self.dropped: Counter = Counter()
+        self._reset()
+
+    def _reset(self):
+        self._question: Optional[str] = None
+        self._options: List[str] = []
+        self._upper_labels = True # Case of the first option label; later labels must match it
+        self._answer_index: Optional[int] = None
+        self._answer_text: Optional[str] = None
+        self._explanation: Optional[str] = None
+        self._last_field: Optional[str] = None # Where continuation lines are appended
+
+    def _build(self, question: Optional[str], options: List[str], answer_index: Optional[int],
+               answer_text: Optional[str], explanation: Optional[str]) -> Optional[ParsedMCQ]:
+        """Turns a complete block into a ParsedMCQ, or counts why it was dropped."""
+        if question is None:
+            return None
+        reason = None
+        if not question:
+            reason = "missing_question"
+        elif not MIN_OPTIONS <= len(options) <= MAX_OPTIONS:
+            reason = "option_count"
+        else:
+            if answer_index is None and answer_text:
+                answer_index = _answer_from_text(answer_text, options)
+            if answer_index is None:
+                reason = "missing_answer"
+            elif answer_index >= len(options):
+                reason = "answer_out_of_range"
+        if reason is not None:
+            self.dropped[reason] += 1
+            return None
+        self.emitted += 1
+        return ParsedMCQ(question, options, answer_index, explanation)
+
+    def _finalize(self) -> Optional[ParsedMCQ]:
+        item = self._build(self._question, self._options, self._answer_index, self._answer_text, self._explanation)
+        self._reset()
+        return item
+
+    def feed_line(self, line: str) -> List[ParsedMCQ]:
+        """Consumes one complete line and returns the MCQs it completes."""
+        items: List[ParsedMCQ] = []
+        self._feed_lines([line], items)
+        return items
+
+    def _feed_lines(self, lines: List[str], items: List[ParsedMCQ]):
+        """
+        Consumes complete lines and appends the MCQs they complete to `items`. Lines that match no
+        pattern continue the question, option or explanation they follow. The block being parsed
+        is kept in locals and stored back at the end.
+        """
+        question, options, upper_labels = self._question, self._options, self._upper_labels
+        answer_index, answer_text = self._answer_index, self._answer_text
+        explanation, last_field = self._explanation, self._last_field
+        match_line = _LINE_RE.fullmatch
+        for line in lines:
+            line = line.strip()
+            if "**" in line or "__" in line:
+                line = line.replace("**", "").replace("__", "").strip()
+            if line[:1] in _BULLET_CHARS:
+                bullet = _BULLET_RE.match(line)
+                if bullet:
+                    line = line[bullet.end():]
+            if not line:
+                if answer_index is not None or answer_text:
+                    item = self._build(question, options, answer_index, answer_text, explanation)
+                    if item is not None:
+                        items.append(item)
+                    question, options, answer_index, answer_text, explanation, last_field = None, [], None, None, None, None
+                continue
+
+            match = match_line(line)
+            kind = match.lastgroup if match else None # The outer group (option/answer/...) closes last
+            if kind == "option":
+                if question is not None and answer_index is None and answer_text is None:
+                    label = match.group("option_label")
+                    index = ord(label.upper()) - 65
+                    # Only the next label of the sequence starts an option. "A" again means the model
+                    # restarted the options (the latest set is kept); "e)" after "A)".."D)" does not count.
+                    if (index == 0 and not options) or (label.isupper() == upper_labels and (index == 0 or index == len(options))):
+                        if index == 0:
+                            options, upper_labels = [], label.isupper()
+                        options.append(match.group("option_text").strip())
+                        last_field = "option"
+                        continue
+            elif kind == "answer":
+                if options:
+                    given = match.group("answer_text").strip()
+                    letter = _ANSWER_LETTER_RE.match(given)
+                    if letter:
+                        answer_index = ord(letter.group(1).upper()) - 65
+                    else:
+                        answer_text = given # Matched against the option texts in _build
+                    last_field = None
+                    continue
+            elif kind == "explanation":
+                if question is not None:
+                    # Explanations may wrap, so the block completes at the next blank line or question
+                    explanation = match.group("explanation_text").strip() or None
+                    last_field = "explanation"
+                    continue
+            elif kind == "question" and (question is None or options):
+                item = self._build(question, options, answer_index, answer_text, explanation)
+                if item is not None:
+                    items.append(item)
+                question, options, answer_index, answer_text, explanation = match.group("question_text").strip(), [], None, None, None
+                last_field = "question"
+                continue
+
+            # Continuation of the previous field
+            if last_field == "question":
+                question = f"{question} {line}".strip()
+            elif last_field == "option":
+                options[-1] = f"{options[-1]} {line}"
+            elif last_field == "explanation":
+                explanation = f"{explanation} {line}" if explanation else line
+        self._question, self._options, self._upper_labels = question, options, upper_labels
+        self._answer_index, self._answer_text = answer_index, answer_text
+        self._explanation, self._last_field = explanation, last_field
+
+    def _consume(self, text: str, final: bool) -> List[ParsedMCQ]:
+        """
+        Consumes every line of `text` (which holds complete lines only). Canonical blocks met while
+        no question is pending are converted straight from the match; the lines around them, and
+        blocks that may still continue in a later fragment (final=False), go through the line
+        parser, so both paths give the same result.
+        """
+        items: List[ParsedMCQ] = []
+        markdown = "**" in text or "__" in text # The line parser strips these, so such blocks take the line parser
+        end_of_text = len(text)
+        start = 0 # Start of the first line not consumed yet
+        for match in _CANONICAL_BLOCK_RE.finditer(text):
+            block_start, block_end = match.span()
+            if block_start > start:
+                gap = text[start:block_start - 1]
+                # Blank lines change nothing while no question is pending
+                if self._question is not None or (gap and not gap.isspace()):
+                    self._feed_lines(gap.split("\n"), items)
+            start = block_end + 1
+            if self._question is None and (final or block_end < end_of_text) \
+                    and not (markdown and ("**" in match.group(0) or "__" in match.group(0))):
+                question, *options, answer, explanation = match.groups()
+                del options[len(options) - options.count(None):] # C) to F) are optional, in order
+                answer_index = ord(answer.upper()) - 65
+                if answer_index < len(options):
+                    if explanation is not None:
+                        explanation = explanation.strip() or None
+                    items.append(ParsedMCQ(question, options, answer_index, explanation))
+                    self.emitted += 1
+                    continue
+            self._feed_lines(match.group(0).split("\n"), items)
+        if start <= end_of_text:
+            self._feed_lines(text[start:].split("\n"), items)
+        return items
+
+    def feed(self, text: str) -> List[ParsedMCQ]:
+        """Consumes a text fragment and returns any MCQs completed by it."""
+        self._buffer += text
+        end = self._buffer.rfind("\n")
+        if end < 0:
+            return []
+        complete, self._buffer = self._buffer[:end], self._buffer[end + 1:]
+        return self._consume(complete, final=False)
+
+    def close(self) -> List[ParsedMCQ]:
+        """Flushes the trailing partial line and the last pending MCQ."""
+        items = self._consume(self._buffer, final=True)
+        self._buffer = ""
+        item = self._finalize()
+        if item is not None:
+            items.append(item)
+        return items
+
+    def parse(self, text: str) -> List[ParsedMCQ]:
+        """Parses a complete response in one call; cheaper than feed() + close() on large inputs."""
+        if self._buffer:
+            return self.feed(text) + self.close()
+        self._buffer = text
+        return self.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"emitted": self.emitted, "dropped": sum(self.dropped.values()), **{f"dropped_{reason}": count for reason, count in self.dropped.items()}}
+
+def parse_mcq_output(raw_output: str, parser: Optional[MCQParser] = None) -> List[ParsedMCQ]:
+    """Parses a complete LLM response."""
+    parser = parser or MCQParser()
+    return parser.parse(raw_output)
+
+def parse_sectioned_mcq_output(raw_output: str, num_sections: int, parser: Optional[MCQParser] = None) -> List[List[ParsedMCQ]]:
+    """
+    Splits the output of a batched prompt back into per-section MCQ lists.
+    Questions appearing before the first "Section: N" header are attributed to section 1;
+    headers outside 1..num_sections are ignored (their questions go to the previous section).
+    """
+    parser = parser or MCQParser()
+    sections: List[List[ParsedMCQ]] = [[] for _ in range(num_sections)]
+    current_section = 0
+    start = 0
+    for header in _SECTION_HEADER_LINE_RE.finditer(raw_output):
+        sections[current_section].extend(parser.parse(raw_output[start:header.start() - 1]) if header.start() > start else parser.close())
+        section_number = int(header.group(1))
+        if 1 <= section_number <= num_sections:
+            current_section = section_number - 1
+        else:
+            parser.dropped["section_out_of_range"] += 1
+        start = header.end() + 1
+    sections[current_section].extend(parser.parse(raw_output[start:]) if start <= len(raw_output) else parser.close())
+    return sections
+
+# --- Structured (JSON) output ---
+
+_JSON_DECODER = json.JSONDecoder()
+
+# The start of a {"section", "questions"} object up to its questions array ("section" is
+# generated first, see propertyOrdering in MCQ_SECTIONS_RESPONSE_SCHEMA)
+_SECTION_OBJECT_START_RE = re.compile(r'\{\s*"section"\s*:\s*(-?\d+)\s*,\s*"questions"\s*:\s*\[')
+
+def _decode_json_elements(text: str, position: int) -> Tuple[List[Any], Optional[int]]:
+    """
+    Decodes the elements of the JSON array whose "[" is just before `position`. Returns the
+    elements and None, or, when the text is cut off, the complete leading elements and the
+    offset of the element that was cut off.
+    """
+    elements: List[Any] = []
+    while True:
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text):
+            return elements, position
+        if text[position] == "]":
+            return elements, None
+        try:
+            element, end = _JSON_DECODER.raw_decode(text, position)
+        except ValueError:
+            return elements, position
+        elements.append(element)
+        position = end
+
+def _decode_json_array(raw_output: str, dropped: Counter) -> Tuple[List[Any], Optional[str], Optional[int]]:
+    """
+    Decodes a JSON array. Output cut off by the token limit is not valid JSON; in that case the
+    complete leading elements are kept and the cut-off tail is counted as "truncated". Returns
+    the elements and, for cut-off output, the stripped text and the offset of the cut-off element.
+    """
+    try:
+        value = _loads_json(raw_output)
+    except ValueError:
+        pass
+    else:
+        if isinstance(value, list):
+            return value, None, None
+        dropped["not_an_array"] += 1
+        return [], None, None
+
+    text = raw_output.strip()
+    if not text.startswith("["):
+        dropped["invalid_json"] += 1
+        return [], None, None
+    elements, cut_at = _decode_json_elements(text, 1)
+    if cut_at is not None:
+        dropped["truncated"] += 1
+    return elements, text, cut_at
+
+def _to_parsed_mcq(item: Any, dropped: Counter) -> Optional[ParsedMCQ]:
+    """Checks one decoded MCQItem object; responseSchema constrains the shape but not every value."""
+    if not isinstance(item, dict):
+        dropped["not_an_object"] += 1
+        return None
+    question = item.get("question")
+    if not isinstance(question, str) or not question.strip():
+        dropped["missing_question"] += 1
+        return None
+    options = item.get("options")
+    if not isinstance(options, list) or not MIN_OPTIONS <= len(options) <= MAX_OPTIONS \
+            or not all(isinstance(option, str) and option.strip() for option in options):
+        dropped["option_count"] += 1
+        return None
+    answer_index = item.get("correct_answer_index")
+    if not isinstance(answer_index, int) or isinstance(answer_index, bool):
+        dropped["missing_answer"] += 1
+        return None
+    if not 0 <= answer_index < len(options):
+        dropped["answer_out_of_range"] += 1
+        return None
+    explanation = item.get("explanation")
+    explanation = explanation.strip() or None if isinstance(explanation, str) else None
+    return ParsedMCQ(question.strip(), [option.strip() for option in options], answer_index, explanation)
+
+def parse_structured_mcq_output(raw_output: str, dropped: Optional[Counter] = None) -> List[ParsedMCQ]:
+    """Decodes a JSON-mode response (an array of MCQItem objects) into MCQs."""
+    dropped = dropped if dropped is not None else Counter()
+    items = (_to_parsed_mcq(item, dropped) for item in _decode_json_array(raw_output, dropped)[0])
+    return [item for item in items if item is not None]
+
+def parse_structured_sectioned_output(raw_output: str, num_sections: int, dropped: Optional[Counter] = None) -> List[List[ParsedMCQ]]:
+    """
+    Decodes a batched JSON-mode response (an array of {"section", "questions"} objects) into
+    per-section MCQ lists. Sections outside 1..num_sections are dropped. When the output is cut
+    off inside the last section, the complete questions of that section are still kept.
+    """
+    dropped = dropped if dropped is not None else Counter()
+    entries, text, cut_at = _decode_json_array(raw_output, dropped)
+    if cut_at is not None:
+        partial = _SECTION_OBJECT_START_RE.match(text, cut_at)
+        if partial is not None:
+            questions, _ = _decode_json_elements(text, partial.end())
+            entries.append({"section": int(partial.group(1)), "questions": questions})
+    sections: List[List[ParsedMCQ]] = [[] for _ in range(num_sections)]
+    for entry in entries:
+        section_number = entry.get("section") if isinstance(entry, dict) else None
+        if not isinstance(section_number, int) or not 1 <= section_number <= num_sections:
+            dropped["section_out_of_range"] += 1
+            continue
+        questions = entry.get("questions")
+        if not isinstance(questions, list):
+            dropped["not_an_array"] += 1
+            continue
+        sections[section_number - 1].extend(
+            item for item in (_to_parsed_mcq(question, dropped) for question in questions) if item is not None
+        )
+    return sections
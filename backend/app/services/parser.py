@@ -1,52 +1,143 @@
-from typing import List, Dict, Any
+from typing import List, Any, AsyncIterator, Iterator, Optional
+import asyncio
+import multiprocessing
 import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from ..config import settings
 
 # Install these if you need them:
 # pip install PyPDF2
 # pip install python-docx
 
-async def process_document_and_chunk(file_path: str) -> str:
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.docx')
+# What one segment yielded by iter_document_text represents, per file type (see chunker.SemanticChunker)
+SEGMENT_KIND_BY_EXTENSION = {'.pdf': "page", '.docx': "paragraph", '.txt': "text"}
+TEXT_READ_BLOCK_SIZE = 64 * 1024
+
+class DocumentProcessingError(Exception):
+    """Raised when text cannot be extracted from an uploaded document."""
+    pass
+
+# --- Extraction workers (run inside the process pool, so they must stay picklable top-level functions) ---
+
+# Readers opened by this worker process, most recently used last. Parsing a PDF's structure
+# costs about as much as extracting a batch of pages, so a document's batches reuse one reader.
+_pdf_readers: "OrderedDict[tuple, Any]" = OrderedDict()
+PDF_READERS_PER_WORKER = 2
+
+def _pdf_reader(file_path: str):
+    from PyPDF2 import PdfReader
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_size, stat.st_mtime_ns) # Temporary upload paths can be reused
+    reader = _pdf_readers.get(key)
+    if reader is None:
+        reader = PdfReader(file_path)
+        _pdf_readers[key] = reader
+        while len(_pdf_readers) > PDF_READERS_PER_WORKER:
+            _pdf_readers.popitem(last=False)
+    _pdf_readers.move_to_end(key)
+    return reader
+
+def _count_pdf_pages(file_path: str) -> int:
+    return len(_pdf_reader(file_path).pages)
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    reader = _pdf_reader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, min(stop, len(reader.pages)))]
+
+def _extract_docx_paragraphs(file_path: str) -> List[str]:
+    from docx import Document
+    return [paragraph.text + "\n" for paragraph in Document(file_path).paragraphs]
+
+def _iter_text_blocks(file_path: str) -> Iterator[str]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(TEXT_READ_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    if _extraction_pool is None:
+        # 'spawn' avoids forking the event loop and the Mongo/HTTP client threads.
+        _extraction_pool = ProcessPoolExecutor(
+            max_workers=settings.DOCUMENT_EXTRACTION_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _extraction_pool
+
+def shutdown_extraction_pool():
+    """Stops the extraction worker processes. Called from the application lifespan on shutdown."""
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+
+async def iter_document_text(file_path: str) -> AsyncIterator[str]:
     """
-    Processes an uploaded document to extract its text content.
-    This is a simplified version. For production, you'd add robust error handling
-    and potentially more advanced text extraction/cleaning.
+    Lazily extracts the text of an uploaded document, yielding it page by page (PDF),
+    paragraph by paragraph (DOCX) or block by block (TXT).
+
+    PDF/DOCX parsing runs in a process pool and PDF pages are requested in batches of
+    DOCUMENT_EXTRACTION_PAGES_PER_BATCH, so the event loop is never blocked and only one
+    batch of pages is held in memory at a time.
+
+    Raises:
+        DocumentProcessingError: If the file type is unsupported, the parser library is
+            missing or the file cannot be read.
     """
     file_extension = os.path.splitext(file_path)[1].lower()
-    text_content = ""
-
-    if file_extension == '.txt':
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text_content = f.read()
-    elif file_extension == '.pdf':
-        try:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                text_content += page.extract_text() or ""
-        except ImportError:
-            print("PyPDF2 not installed. Cannot process PDF files.")
-            text_content = "PyPDF2 not installed. Please install it to process PDF files."
-        except Exception as e:
-            print(f"Error processing PDF {file_path}: {e}")
-            text_content = f"Error processing PDF: {e}"
-    elif file_extension == '.docx':
-        try:
-            from docx import Document
-            doc = Document(file_path)
-            for paragraph in doc.paragraphs:
-                text_content += paragraph.text + "\n"
-        except ImportError:
-            print("python-docx not installed. Cannot process DOCX files.")
-            text_content = "python-docx not installed. Please install it to process DOCX files."
-        except Exception as e:
-            print(f"Error processing DOCX {file_path}: {e}")
-            text_content = f"Error processing DOCX: {e}"
-    else:
-        print(f"Unsupported file type: {file_extension}")
-        text_content = f"Unsupported file type: {file_extension}"
+    loop = asyncio.get_running_loop()
 
-    if not text_content.strip():
-        return "No readable text content found in the document."
+    try:
+        if file_extension == '.txt':
+            blocks = _iter_text_blocks(file_path)
+            while True:
+                block = await asyncio.to_thread(next, blocks, None)
+                if block is None:
+                    break
+                yield block
+        elif file_extension == '.pdf':
+            pool = _get_extraction_pool()
+            page_count = await loop.run_in_executor(pool, _count_pdf_pages, file_path)
+            batch_size = max(1, settings.DOCUMENT_EXTRACTION_PAGES_PER_BATCH)
+            for start in range(0, page_count, batch_size):
+                pages = await loop.run_in_executor(pool, _extract_pdf_pages, file_path, start, start + batch_size)
+                for page_text in pages:
+                    yield page_text
+        elif file_extension == '.docx':
+            # python-docx has no incremental reader, so the paragraphs are extracted in one
+            # pool task; the event loop is still free while the document is parsed.
+            paragraphs = await loop.run_in_executor(_get_extraction_pool(), _extract_docx_paragraphs, file_path)
+            for paragraph_text in paragraphs:
+                yield paragraph_text
+        else:
+            print(f"Unsupported file type: {file_extension}")
+            raise DocumentProcessingError(f"Unsupported file type: {file_extension}")
+    except DocumentProcessingError:
+        raise
+    except ImportError as e:
+        library = "PyPDF2" if file_extension == '.pdf' else "python-docx"
+        print(f"{library} not installed. Cannot process {file_extension} files.")
+        raise DocumentProcessingError(f"{library} not installed. Please install it to process {file_extension} files.") from e
+    except Exception as e:
+        print(f"Error processing {file_extension} {file_path}: {e}")
+        raise DocumentProcessingError(f"Error processing {file_extension.lstrip('.').upper()}: {e}") from e
 
-    return text_content
+async def process_document_and_chunk(file_path: str) -> str:
+    """
+    Processes an uploaded document to extract its full text content.
+    Prefer iter_document_text for large documents; this helper materialises the whole text.
 
+    Raises:
+        DocumentProcessingError: If no readable text can be extracted.
+    """
+    segments = [segment async for segment in iter_document_text(file_path)]
+    text_content = "".join(segments)
+    if not text_content.strip():
+        raise DocumentProcessingError("No readable text content found in the document.")
+    return text_content
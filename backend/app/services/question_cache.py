@@ -0,0 +1,120 @@
+from typing import Any, Dict, Iterable, List, Optional
+import asyncio
+import json
+from bson import ObjectId
+from ..config import settings
+from ..db.mongo import mongo_db
+from ..utils.cache import TieredCache, create_shared_backend
+
+class QuestionCache:
+    """
+    Read-through caches for the quiz hot path:
+      - question documents by id (get_question_by_id, quiz generation and grading),
+      - quiz pools: the ids of every question matching a quiz filter, so a quiz is sampled in
+        process instead of with a $sample aggregation. Filters matching more than
+        `max_pool_size` questions are not cached and keep sampling in MongoDB.
+
+    Every write path, in the API and in the worker, calls invalidate_questions() and/or
+    invalidate_pools(). With CACHE_REDIS_URL the shared tier broadcasts those invalidations to
+    every process. Without it the caches are in-process only and their TTLs are capped at
+    `local_ttl_seconds`: grading reads correct_answer_index from this cache, so a copy that
+    another process has changed must expire quickly. Per-question answer counters
+    (services/question_stats.py) are not invalidated on each submission; cached copies show
+    them at most one TTL late.
+    """
+    def __init__(self, enabled: bool, max_entries: int, ttl_seconds: float, pool_ttl_seconds: float,
+                 max_pool_size: int, redis_url: str = "", local_ttl_seconds: float = 5.0):
+        self.enabled = enabled
+        self._shared = create_shared_backend(redis_url) if enabled else None
+        if self._shared is None:
+            ttl_seconds = min(ttl_seconds, local_ttl_seconds)
+            pool_ttl_seconds = min(pool_ttl_seconds, local_ttl_seconds)
+        self.max_pool_size = max_pool_size
+        self._questions = TieredCache("mcq:question", max_entries, ttl_seconds, self._shared)
+        self._pools = TieredCache("mcq:quiz_pool", 1024, pool_ttl_seconds, self._shared)
+        self._pool_loads: Dict[str, asyncio.Task] = {}
+
+    # --- Questions by id ---
+
+    async def get_questions(self, question_ids: Iterable[ObjectId]) -> Dict[ObjectId, Dict[str, Any]]:
+        """Returns {id: question document} for the ids that exist, reading misses from MongoDB in one query."""
+        ids = list(dict.fromkeys(question_ids))
+        if not self.enabled:
+            docs = await mongo_db.db.questions.find({"_id": {"$in": ids}}).to_list(length=None)
+            return {doc["_id"]: doc for doc in docs}
+        cached = await self._questions.get_many([str(oid) for oid in ids])
+        found = {ObjectId(key): doc for key, doc in cached.items()}
+        missing = [oid for oid in ids if oid not in found]
+        if missing:
+            generation = self._questions.generation
+            docs = await mongo_db.db.questions.find({"_id": {"$in": missing}}).to_list(length=None)
+            await self._questions.set_many({str(doc["_id"]): doc for doc in docs}, generation)
+            found.update((doc["_id"], doc) for doc in docs)
+        return found
+
+    async def get_question(self, question_id: ObjectId) -> Optional[Dict[str, Any]]:
+        return (await self.get_questions([question_id])).get(question_id)
+
+    async def invalidate_questions(self, question_ids: Iterable[Any]):
+        if self.enabled:
+            await self._questions.delete(str(qid) for qid in question_ids)
+
+    # --- Quiz pools ---
+
+    @staticmethod
+    def _pool_key(query: Dict[str, Any]) -> str:
+        return json.dumps(query, sort_keys=True, default=str)
+
+    async def _load_pool(self, key: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        generation = self._pools.generation
+        limit = self.max_pool_size + 1
+        docs = await mongo_db.db.questions.find(query, {"_id": 1}).limit(limit).to_list(length=limit)
+        pool = {"ids": [doc["_id"] for doc in docs[:self.max_pool_size]], "complete": len(docs) <= self.max_pool_size}
+        await self._pools.set(key, pool, generation)
+        return pool
+
+    async def get_pool(self, query: Dict[str, Any]) -> Optional[List[ObjectId]]:
+        """
+        Returns the ids of all questions matching `query`, or None when caching is disabled or the
+        pool is larger than `max_pool_size`. Concurrent misses for one pool share a single query.
+        """
+        if not self.enabled:
+            return None
+        key = self._pool_key(query)
+        pool = await self._pools.get(key)
+        if pool is None:
+            task = self._pool_loads.get(key)
+            if task is None:
+                task = asyncio.create_task(self._load_pool(key, query))
+                self._pool_loads[key] = task
+                task.add_done_callback(lambda done: self._pool_loads.pop(key, None) if self._pool_loads.get(key) is done else None)
+            pool = await asyncio.shield(task)
+        return pool["ids"] if pool["complete"] else None
+
+    async def invalidate_pools(self):
+        """Drops every quiz pool, in every process. Called after questions are inserted, updated or deleted."""
+        if self.enabled:
+            self._pool_loads.clear()
+            await self._pools.clear()
+
+    async def close(self):
+        if self._shared is not None:
+            await self._shared.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "shared_tier": self._shared is not None,
+            "questions": self._questions.stats(),
+            "quiz_pools": self._pools.stats(),
+        }
+
+question_cache = QuestionCache(
+    enabled=settings.QUESTION_CACHE_ENABLED,
+    max_entries=settings.QUESTION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.QUESTION_CACHE_TTL_SECONDS,
+    pool_ttl_seconds=settings.QUIZ_POOL_CACHE_TTL_SECONDS,
+    max_pool_size=settings.QUIZ_POOL_MAX_SIZE,
+    redis_url=settings.CACHE_REDIS_URL,
+    local_ttl_seconds=settings.QUESTION_CACHE_LOCAL_TTL_SECONDS,
+)
@@ -0,0 +1,165 @@
+from typing import Any, AsyncIterator, Dict, List, Tuple
+import codecs
+import json
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from ..config import settings
+from ..db.mongo import mongo_db
+from ..models.schema import QuestionBase, QuestionInDB, Source, BulkImportError, BulkImportResult
+from .dedup import add_fingerprint
+from .question_cache import question_cache
+
+class QuestionImportError(Exception):
+    """Raised when an import body cannot be parsed any further (e.g. a malformed JSON array)."""
+    pass
+
+# A row that is still incomplete after this many characters is treated as malformed
+MAX_ROW_CHARS = 1024 * 1024
+
+async def _iter_text(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    async for data in body:
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+async def iter_ndjson_rows(body: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (row_number, value) for every non-empty line of an NDJSON body as it arrives.
+    Lines that are not valid JSON are yielded as (row_number, exception) so they can be reported.
+    """
+    row_number = 0
+    pending = ""
+    async for text in _iter_text(body):
+        pending += text
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if line.strip():
+                row_number += 1
+                try:
+                    yield row_number, json.loads(line)
+                except ValueError as e:
+                    yield row_number, e
+        if len(pending) > MAX_ROW_CHARS:
+            raise QuestionImportError(f"Row {row_number + 1} exceeds {MAX_ROW_CHARS} characters.")
+    if pending.strip():
+        row_number += 1
+        try:
+            yield row_number, json.loads(pending)
+        except ValueError as e:
+            yield row_number, e
+
+async def iter_json_array_rows(body: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Yields (row_number, value) for the elements of a top-level JSON array as they arrive,
+    decoding one element at a time. A malformed array cannot be resynchronised, so it raises
+    QuestionImportError after the rows decoded so far.
+    """
+    decoder = json.JSONDecoder()
+    row_number = 0
+    buffer = ""
+    position = 0
+    started = finished = False
+    finished_stream = False
+    chunks = _iter_text(body).__aiter__()
+
+    while not finished:
+        # Skip whitespace and separators between elements
+        while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ",")):
+            position += 1
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise QuestionImportError("Expected a JSON array of questions.")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                finished = True
+                break
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError as e:
+                if finished_stream or len(buffer) - position > MAX_ROW_CHARS:
+                    raise QuestionImportError(f"Malformed JSON at row {row_number + 1}: {e}")
+            else:
+                # A number at the end of the buffer may still continue in the next chunk
+                if end < len(buffer) or finished_stream:
+                    row_number += 1
+                    position = end
+                    yield row_number, value
+                    continue
+        if finished_stream:
+            raise QuestionImportError("Unexpected end of JSON array.")
+        try:
+            buffer = buffer[position:] + await chunks.__anext__()
+            position = 0
+        except StopAsyncIteration:
+            finished_stream = True
+
+def _validate_row(value: Any) -> Dict[str, Any]:
+    """Validates one imported row and returns the document to insert. Raises ValueError/ValidationError."""
+    if isinstance(value, Exception):
+        raise ValueError(f"Invalid JSON: {value}")
+    if not isinstance(value, dict):
+        raise ValueError("Each row must be a JSON object.")
+    question = QuestionBase.model_validate(value)
+    if question.correct_answer_index >= len(question.options):
+        raise ValueError(f"correct_answer_index {question.correct_answer_index} is out of range for {len(question.options)} options.")
+    question_in_db = QuestionInDB(**question.model_dump(), source=Source.MANUAL)
+    return add_fingerprint(question_in_db.model_dump(by_alias=True, exclude_none=True))
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors())
+
+async def import_questions(rows: AsyncIterator[Tuple[int, Any]], batch_size: int = None) -> BulkImportResult:
+    """
+    Validates rows as they are parsed and inserts the valid ones with unordered insert_many
+    batches of BULK_IMPORT_BATCH_SIZE. Invalid rows and rejected writes are reported per row
+    (at most BULK_IMPORT_MAX_REPORTED_ERRORS of them) without aborting the import.
+    """
+    batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+    result = BulkImportResult()
+    batch: List[Dict[str, Any]] = []
+    batch_rows: List[int] = []
+
+    def report(row: int, message: str):
+        result.failed += 1
+        if len(result.errors) < settings.BULK_IMPORT_MAX_REPORTED_ERRORS:
+            result.errors.append(BulkImportError(row=row, error=message))
+
+    async def flush():
+        if not batch:
+            return
+        try:
+            insert_result = await mongo_db.db.questions.insert_many(batch, ordered=False)
+            result.inserted += len(insert_result.inserted_ids)
+        except BulkWriteError as e:
+            result.inserted += e.details.get("nInserted", 0)
+            for write_error in e.details.get("writeErrors", []):
+                report(batch_rows[write_error["index"]], write_error.get("errmsg", "Write failed."))
+        batch.clear()
+        batch_rows.clear()
+        await question_cache.invalidate_pools()
+
+    try:
+        async for row_number, value in rows:
+            result.received += 1
+            try:
+                batch.append(_validate_row(value))
+                batch_rows.append(row_number)
+            except ValidationError as e:
+                report(row_number, _format_validation_error(e))
+            except ValueError as e:
+                report(row_number, str(e))
+            if len(batch) >= batch_size:
+                await flush()
+    except QuestionImportError as e:
+        await flush()
+        result.aborted = str(e)
+        return result
+    await flush()
+    return result
@@ -0,0 +1,70 @@
+from typing import Any, Dict, Iterable, Tuple
+from collections import Counter
+from bson import ObjectId
+from pymongo import UpdateOne
+from ..config import settings
+from ..db.mongo import mongo_db
+from ..models.schema import Difficulty
+
+# Beta(1, 1) prior: the correct rate starts at 0.5 and a handful of answers cannot push a
+# question to 0 or 1
+PRIOR_CORRECT = 1
+PRIOR_ATTEMPTS = 2
+
+def correct_rate_expression() -> Dict[str, Any]:
+    return {"$divide": [
+        {"$add": ["$correct_count", PRIOR_CORRECT]},
+        {"$add": ["$attempt_count", PRIOR_ATTEMPTS]},
+    ]}
+
+def empirical_difficulty_expression() -> Dict[str, Any]:
+    """Aggregation expression classifying a question from its (already updated) counters."""
+    return {"$switch": {
+        "branches": [
+            {"case": {"$lt": ["$attempt_count", settings.DIFFICULTY_MIN_ATTEMPTS]}, "then": None},
+            {"case": {"$gte": ["$empirical_correct_rate", settings.DIFFICULTY_EASY_CORRECT_RATE]}, "then": Difficulty.EASY.value},
+            {"case": {"$lt": ["$empirical_correct_rate", settings.DIFFICULTY_HARD_CORRECT_RATE]}, "then": Difficulty.HARD.value},
+        ],
+        "default": Difficulty.MEDIUM.value,
+    }}
+
+def _stats_update(attempts: int, correct: int) -> list:
+    # An update pipeline increments the counters and re-derives the rate and difficulty from the
+    # new values in one atomic write per question, so no result scans are needed.
+    return [
+        {"$set": {
+            "attempt_count": {"$add": [{"$ifNull": ["$attempt_count", 0]}, attempts]},
+            "correct_count": {"$add": [{"$ifNull": ["$correct_count", 0]}, correct]},
+        }},
+        {"$set": {"empirical_correct_rate": correct_rate_expression()}},
+        {"$set": {"empirical_difficulty": empirical_difficulty_expression()}},
+    ]
+
+async def record_answers(answers: Iterable[Tuple[ObjectId, bool]]):
+    """
+    Adds quiz answers, given as (question ObjectId, is_correct) pairs, to the per-question
+    counters with one unordered bulk_write.
+    """
+    attempts: Counter = Counter()
+    correct: Counter = Counter()
+    for question_id, is_correct in answers:
+        attempts[question_id] += 1
+        correct[question_id] += int(is_correct)
+    if not attempts:
+        return
+    await mongo_db.db.questions.bulk_write([
+        UpdateOne({"_id": question_id}, _stats_update(count, correct[question_id]))
+        for question_id, count in attempts.items()
+    ], ordered=False)
+
+def difficulty_filter(difficulty: Difficulty, calibrated: bool) -> Dict[str, Any]:
+    """
+    Query filter for questions of `difficulty`. When `calibrated`, questions with enough answers
+    are selected by their empirical difficulty and the rest by their assigned difficulty.
+    """
+    if not calibrated:
+        return {"difficulty": difficulty.value}
+    return {"$or": [
+        {"empirical_difficulty": difficulty.value},
+        {"empirical_difficulty": None, "difficulty": difficulty.value},
+    ]}
@@ -0,0 +1,243 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import math
+from pymongo import UpdateOne
+from ..config import settings
+from ..db.mongo import mongo_db
+
+# Rollup documents in `quiz_rollups` hold running sums per (user_id, UTC day). The global
+# rollup of a day uses this user_id; anonymous results only count towards it.
+ALL_USERS = "*"
+SCORE_BUCKET_WIDTH = 10 # Score distribution buckets 0-9, 10-19, ..., 90-100
+SCORE_BUCKETS = 100 // SCORE_BUCKET_WIDTH
+TIMESERIES_INTERVALS = ("day", "week", "month")
+
+def score_bucket(score: float) -> int:
+    return min(SCORE_BUCKETS - 1, int(score // SCORE_BUCKET_WIDTH))
+
+def _day(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+def as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored dates are naive UTC (datetime.utcnow), so aware query bounds are converted to match."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _is_day_aligned(value: Optional[datetime]) -> bool:
+    return value is None or value == _day(value)
+
+# Both sources are reduced to documents of this shape (one per result, or one per rollup) so the
+# same $group stages serve raw results and rollups.
+_RAW_RESULT_PROJECTION = {
+    "user_id": 1,
+    "day": "$quiz_date",
+    "count": {"$literal": 1},
+    "score_sum": "$score",
+    "score_sq_sum": {"$multiply": ["$score", "$score"]},
+    "score_min": "$score",
+    "score_max": "$score",
+    "correct_sum": "$correct_answers",
+    "questions_sum": "$total_questions",
+    "buckets": {"$arrayToObject": [[{
+        "k": {"$toString": {"$min": [SCORE_BUCKETS - 1, {"$toInt": {"$floor": {"$divide": ["$score", SCORE_BUCKET_WIDTH]}}}]}},
+        "v": 1,
+    }]]},
+}
+
+_TOTALS_GROUP = {
+    "count": {"$sum": "$count"},
+    "score_sum": {"$sum": "$score_sum"},
+    "score_sq_sum": {"$sum": "$score_sq_sum"},
+    "score_min": {"$min": "$score_min"},
+    "score_max": {"$max": "$score_max"},
+    "correct_sum": {"$sum": "$correct_sum"},
+    "questions_sum": {"$sum": "$questions_sum"},
+}
+
+def _finalize(totals: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns summed counters into averages (population standard deviation from the sum of squares)."""
+    count = totals.get("count", 0)
+    if not count:
+        return {"count": 0, "average_score": None, "score_stddev": None, "min_score": None,
+                "max_score": None, "accuracy": None}
+    mean = totals["score_sum"] / count
+    questions = totals.get("questions_sum", 0)
+    return {
+        "count": count,
+        "average_score": mean,
+        "score_stddev": math.sqrt(max(0.0, totals["score_sq_sum"] / count - mean * mean)),
+        "min_score": totals.get("score_min"),
+        "max_score": totals.get("score_max"),
+        "accuracy": totals.get("correct_sum", 0) / questions * 100 if questions else None,
+    }
+
+class QuizAnalytics:
+    """
+    Quiz result analytics computed with aggregation pipelines, so no result documents are
+    loaded into the API process.
+
+    With `rollups_enabled`, every submitted result also increments a per-day rollup for its
+    user and the global one (two upserts in one bulk_write). Queries whose date bounds fall on
+    UTC day boundaries then read the much smaller rollups; other queries, and all queries while
+    rollups are disabled, aggregate quiz_results directly. After enabling rollups on an existing
+    database, run rebuild_rollups() once (POST /api/v1/quiz/analytics/rollups/rebuild).
+    """
+    def __init__(self, rollups_enabled: bool = False):
+        self.rollups_enabled = rollups_enabled
+
+    # --- Rollup maintenance ---
+
+    async def record_result(self, result_doc: Dict[str, Any]):
+        """Adds a newly stored quiz result to the rollups of its day."""
+        if not self.rollups_enabled:
+            return
+        score = result_doc["score"]
+        increments = {
+            "count": 1,
+            "score_sum": score,
+            "score_sq_sum": score * score,
+            "correct_sum": result_doc["correct_answers"],
+            "questions_sum": result_doc["total_questions"],
+            f"buckets.{score_bucket(score)}": 1,
+        }
+        day = _day(result_doc["quiz_date"])
+        user_ids = [ALL_USERS] + ([str(result_doc["user_id"])] if result_doc.get("user_id") else [])
+        await mongo_db.db.quiz_rollups.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "day": day},
+                {"$inc": increments, "$min": {"score_min": score}, "$max": {"score_max": score}},
+                upsert=True
+            ) for user_id in user_ids
+        ], ordered=False)
+
+    async def rebuild_rollups(self) -> Dict[str, int]:
+        """
+        Recomputes every rollup from quiz_results with $group + $merge, entirely server-side.
+        Results submitted while the rebuild runs may be missing from the rollup of their day.
+        """
+        await mongo_db.db.quiz_rollups.delete_many({})
+        for group_user in ({"$literal": ALL_USERS}, "$user_id"):
+            pipeline = [{"$project": _RAW_RESULT_PROJECTION}]
+            if group_user == "$user_id":
+                pipeline.append({"$match": {"user_id": {"$ne": None}}})
+            pipeline += [
+                {"$addFields": {"bucket": {"$arrayElemAt": [{"$objectToArray": "$buckets"}, 0]}}},
+                # Totals per score bucket first, then per day with the bucket counts collected
+                {"$group": {
+                    "_id": {"user_id": group_user, "day": {"$dateTrunc": {"date": "$day", "unit": "day"}}, "bucket": "$bucket.k"},
+                    **_TOTALS_GROUP,
+                }},
+                {"$group": {
+                    "_id": {"user_id": "$_id.user_id", "day": "$_id.day"},
+                    **_TOTALS_GROUP,
+                    "buckets": {"$push": {"k": "$_id.bucket", "v": "$count"}},
+                }},
+                {"$project": {
+                    "_id": 0,
+                    "user_id": "$_id.user_id",
+                    "day": "$_id.day",
+                    **{field: 1 for field in _TOTALS_GROUP},
+                    "buckets": {"$arrayToObject": "$buckets"},
+                }},
+                {"$merge": {"into": "quiz_rollups", "on": ["user_id", "day"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+            ]
+            await mongo_db.db.quiz_results.aggregate(pipeline).to_list(length=None)
+        return {
+            "results": await mongo_db.db.quiz_results.estimated_document_count(),
+            "rollups": await mongo_db.db.quiz_rollups.estimated_document_count(),
+        }
+
+    # --- Queries ---
+
+    def _source(self, user_id: Optional[str], date_from: Optional[datetime], date_to: Optional[datetime],
+                per_user: bool = False) -> Tuple[Any, List[Dict[str, Any]]]:
+        """
+        Returns (collection, stages) producing one rollup-shaped document per result or rollup in
+        range. `date_from` is inclusive and `date_to` exclusive. With `per_user` only results of
+        identified users are kept.
+        """
+        date_from, date_to = as_naive_utc(date_from), as_naive_utc(date_to)
+        use_rollups = self.rollups_enabled and _is_day_aligned(date_from) and _is_day_aligned(date_to)
+        date_field = "day" if use_rollups else "quiz_date"
+        match: Dict[str, Any] = {}
+        if user_id:
+            match["user_id"] = user_id
+        elif per_user:
+            match["user_id"] = {"$nin": [None, ALL_USERS]} if use_rollups else {"$ne": None}
+        elif use_rollups:
+            match["user_id"] = ALL_USERS
+        if date_from or date_to:
+            match[date_field] = {}
+            if date_from:
+                match[date_field]["$gte"] = date_from
+            if date_to:
+                match[date_field]["$lt"] = date_to
+        if use_rollups:
+            return mongo_db.db.quiz_rollups, [{"$match": match}]
+        return mongo_db.db.quiz_results, [{"$match": match}, {"$project": _RAW_RESULT_PROJECTION}]
+
+    async def summary(self, user_id: Optional[str] = None, date_from: Optional[datetime] = None,
+                      date_to: Optional[datetime] = None) -> Dict[str, Any]:
+        """Count, average/stddev/min/max score and answer accuracy of the matching results."""
+        collection, stages = self._source(user_id, date_from, date_to)
+        docs = await collection.aggregate(stages + [{"$group": {"_id": None, **_TOTALS_GROUP}}]).to_list(length=1)
+        return _finalize(docs[0] if docs else {})
+
+    async def score_distribution(self, user_id: Optional[str] = None, date_from: Optional[datetime] = None,
+                                 date_to: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Number of results per SCORE_BUCKET_WIDTH-point score bucket (all buckets, empty ones included)."""
+        collection, stages = self._source(user_id, date_from, date_to)
+        pipeline = stages + [
+            {"$project": {"_id": 0, "bucket": {"$objectToArray": "$buckets"}}},
+            {"$unwind": "$bucket"},
+            {"$group": {"_id": "$bucket.k", "count": {"$sum": "$bucket.v"}}},
+        ]
+        counts = {int(doc["_id"]): doc["count"] async for doc in collection.aggregate(pipeline)}
+        return [
+            {
+                "min_score": bucket * SCORE_BUCKET_WIDTH,
+                "max_score": 100 if bucket == SCORE_BUCKETS - 1 else (bucket + 1) * SCORE_BUCKET_WIDTH,
+                "count": counts.get(bucket, 0),
+            } for bucket in range(SCORE_BUCKETS)
+        ]
+
+    async def timeseries(self, interval: str = "day", user_id: Optional[str] = None,
+                         date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Per-period totals, oldest first. `interval` is one of TIMESERIES_INTERVALS (weeks start on Monday)."""
+        if interval not in TIMESERIES_INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(TIMESERIES_INTERVALS)}.")
+        collection, stages = self._source(user_id, date_from, date_to)
+        trunc: Dict[str, Any] = {"date": "$day", "unit": interval}
+        if interval == "week":
+            trunc["startOfWeek"] = "monday"
+        pipeline = stages + [
+            {"$group": {"_id": {"$dateTrunc": trunc}, **_TOTALS_GROUP}},
+            {"$sort": {"_id": 1}},
+        ]
+        return [{"period_start": doc["_id"], **_finalize(doc)} async for doc in collection.aggregate(pipeline)]
+
+    async def users(self, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                    limit: int = 100, after_user_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Per-user totals ordered by user_id, one page at a time (keyset on user_id). Returns
+        (page, whether more users follow).
+        """
+        collection, stages = self._source(None, date_from, date_to, per_user=True)
+        if after_user_id:
+            stages[0]["$match"] = {"$and": [stages[0]["$match"], {"user_id": {"$gt": after_user_id}}]}
+        pipeline = stages + [
+            {"$sort": {"user_id": 1}},
+            {"$group": {"_id": "$user_id", **_TOTALS_GROUP}},
+            {"$sort": {"_id": 1}},
+            {"$limit": limit + 1},
+        ]
+        docs = await collection.aggregate(pipeline).to_list(length=limit + 1)
+        page = [{"user_id": str(doc["_id"]), **_finalize(doc)} for doc in docs[:limit]]
+        return page, len(docs) > limit
+
+quiz_analytics = QuizAnalytics(rollups_enabled=settings.ANALYTICS_ROLLUPS_ENABLED)
+
+async def rebuild_quiz_rollups_job(job: dict) -> dict:
+    """Job handler for JOB_TYPE_REBUILD_QUIZ_ROLLUPS."""
+    return await quiz_analytics.rebuild_rollups()
@@ -0,0 +1,321 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import time
+from bson import ObjectId
+from ..config import settings
+from ..db.mongo import mongo_db
+
+# Semantic search needs these (sentence-transformers pulls in numpy):
+# pip install sentence-transformers numpy
+
+# Catch-up re-reads questions stamped this long before its watermark: a stamp becomes visible
+# only once its update commits, which can be after a concurrent catch-up has read past it
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+
+class VectorSearchUnavailableError(Exception):
+    """Raised when semantic search is disabled or its libraries are not installed."""
+    pass
+
+def question_embedding_text(doc: Dict[str, Any]) -> str:
+    """The text embedded for a question: its stem followed by its options."""
+    return f"{doc.get('question_text', '')}\n{'; '.join(doc.get('options') or [])}"
+
+def catch_up_filter(watermark: Optional[datetime]) -> Dict[str, Any]:
+    """Questions stamped since `watermark` (less CATCH_UP_OVERLAP), or every stamped one without it."""
+    return {"indexed_at": {"$gte": watermark - CATCH_UP_OVERLAP} if watermark is not None else {"$ne": None}}
+
+class QuestionVectorIndex:
+    """
+    Flat in-memory vector index over question embeddings, persisted to `index_dir`.
+
+    Embeddings are L2-normalised float32 rows of one NumPy matrix, so a query is a single
+    matrix-vector product plus argpartition. The scan is memory-bound: on one core it takes
+    about 17 ms at 100k x 384 and 200 ms at 1M x 384 (benchmarks/bench_vector_search.py), so
+    banks approaching a million questions need an approximate index.
+    Rows are kept contiguous: deleting a question moves the last row into its slot.
+
+    The index is loaded lazily on first use. It then catches up with the questions collection:
+    once fully (questions missing from the persisted index are embedded, deleted ones dropped)
+    and afterwards every `sync_seconds`, which picks up inserts made by other processes such as
+    the job workers and bulk imports. Each sync first stamps questions without `indexed_at`
+    with the MongoDB server time, then embeds those stamped since its watermark. The watermark
+    comes from a single clock and advances only over committed writes, unlike `_id`s, which
+    are generated by each client (and by bulk imports well before their insert). Writes
+    through routes_mcq are applied directly via upsert()/remove().
+
+    Searches score rows in a worker thread; mutations, which move rows in place, wait until
+    no search is running.
+    """
+    def __init__(self, model_name: str, index_dir: str, batch_size: int = 64, sync_seconds: float = 30.0):
+        self.model_name = model_name
+        self.index_dir = index_dir
+        self.batch_size = batch_size
+        self.sync_seconds = sync_seconds
+        self._np = None
+        self._model = None
+        self._vectors = None # float32 matrix, capacity rows; the first `_size` are in use
+        self._size = 0
+        self._ids: List[str] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._watermark = None # Highest `indexed_at` seen by a sync
+        self._dirty = False
+        self._last_sync = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._searches = 0
+        self._idle: Optional[asyncio.Condition] = None # Notified when the last running search ends
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    # --- Model and persistence ---
+
+    def _load_model(self):
+        if not settings.VECTOR_SEARCH_ENABLED:
+            raise VectorSearchUnavailableError("Semantic search is disabled (VECTOR_SEARCH_ENABLED=false).")
+        try:
+            import numpy
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise VectorSearchUnavailableError("sentence-transformers and numpy must be installed for semantic search.") from e
+        self._np = numpy
+        model = SentenceTransformer(self.model_name, device="cpu")
+        self._vectors = numpy.zeros((0, model.get_sentence_embedding_dimension()), dtype=numpy.float32)
+        self._load_from_disk()
+        # Set last: upsert()/remove() are no-ops until the persisted rows are in place
+        self._model = model
+
+    def _paths(self) -> Tuple[str, str, str]:
+        return (os.path.join(self.index_dir, "vectors.npy"),
+                os.path.join(self.index_dir, "ids.npy"),
+                os.path.join(self.index_dir, "meta.json"))
+
+    def _load_from_disk(self):
+        vectors_path, ids_path, meta_path = self._paths()
+        if not all(os.path.exists(path) for path in (vectors_path, ids_path, meta_path)):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name:
+            print(f"Vector index on disk was built with '{meta.get('model')}', rebuilding for '{self.model_name}'.")
+            return
+        vectors = self._np.load(vectors_path)
+        ids = [ObjectId(row.tobytes()) for row in self._np.load(ids_path)]
+        self._vectors = vectors
+        self._size = len(ids)
+        self._ids = [str(oid) for oid in ids]
+        self._row_by_id = {qid: row for row, qid in enumerate(self._ids)}
+        print(f"Loaded vector index with {self._size} questions from {self.index_dir}.")
+
+    def save(self):
+        """Writes the index to `index_dir` (atomically per file). No-op when nothing changed."""
+        if not self.loaded or not self._dirty:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        vectors_path, ids_path, meta_path = self._paths()
+        # ObjectIds as raw 12-byte rows (a bytes dtype would strip trailing zero bytes)
+        ids = self._np.frombuffer(b"".join(ObjectId(qid).binary for qid in self._ids[:self._size]), dtype=self._np.uint8).reshape(-1, 12)
+        for path, write in (
+            (vectors_path, lambda f: self._np.save(f, self._vectors[:self._size])),
+            (ids_path, lambda f: self._np.save(f, ids)),
+            (meta_path, lambda f: f.write(json.dumps({"model": self.model_name, "size": self._size}).encode("utf-8"))),
+        ):
+            with open(path + ".tmp", "wb") as f:
+                write(f)
+            os.replace(path + ".tmp", path)
+        self._dirty = False
+        print(f"Saved vector index with {self._size} questions to {self.index_dir}.")
+
+    # --- Mutation (event loop only) ---
+
+    def _embed(self, texts: List[str]):
+        return self._model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                  convert_to_numpy=True, show_progress_bar=False).astype(self._np.float32)
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= len(self._vectors):
+            return
+        capacity = max(rows, 2 * len(self._vectors), 1024)
+        grown = self._np.zeros((capacity, self._vectors.shape[1]), dtype=self._np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        self._vectors = grown
+
+    def _condition(self) -> asyncio.Condition:
+        if self._idle is None:
+            self._idle = asyncio.Condition()
+        return self._idle
+
+    async def _wait_for_searches(self):
+        idle = self._condition()
+        async with idle:
+            await idle.wait_for(lambda: self._searches == 0)
+
+    def _apply(self, ids: List[str], embeddings):
+        self._ensure_capacity(self._size + len(ids))
+        for qid, embedding in zip(ids, embeddings):
+            row = self._row_by_id.get(qid)
+            if row is None:
+                row = self._size
+                self._size += 1
+                self._row_by_id[qid] = row
+                if row < len(self._ids):
+                    self._ids[row] = qid
+                else:
+                    self._ids.append(qid)
+            self._vectors[row] = embedding
+        self._dirty = True
+
+    async def _upsert_docs(self, docs: List[Dict[str, Any]]):
+        for start in range(0, len(docs), self.batch_size * 8):
+            batch = docs[start:start + self.batch_size * 8]
+            embeddings = await asyncio.to_thread(self._embed, [question_embedding_text(doc) for doc in batch])
+            await self._wait_for_searches()
+            # No await between the wait and the write, so no search can start in between
+            self._apply([str(doc["_id"]) for doc in batch], embeddings)
+
+    async def upsert(self, docs: Iterable[Dict[str, Any]]):
+        """Embeds (in batches, off the event loop) and adds or replaces the given question documents."""
+        if not self.loaded:
+            return # Picked up by the catch-up sync once the index is loaded
+        docs = [doc for doc in docs if doc.get("_id") is not None]
+        if docs:
+            await self._upsert_docs(docs)
+
+    async def remove(self, question_ids: Iterable[str]):
+        """Drops questions from the index, moving the last row into each freed slot."""
+        if not self.loaded:
+            return
+        question_ids = list(question_ids)
+        await self._wait_for_searches()
+        for qid in question_ids:
+            row = self._row_by_id.pop(str(qid), None)
+            if row is None:
+                continue
+            last = self._size - 1
+            if row != last:
+                moved_id = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved_id
+                self._row_by_id[moved_id] = row
+            self._ids.pop()
+            self._size = last
+            self._dirty = True
+
+    # --- Synchronisation with MongoDB ---
+
+    async def _reconcile(self):
+        """Embeds every stored question missing from the index and drops deleted ones."""
+        try:
+            await self._reconcile_with_collection()
+        except Exception as e:
+            print(f"Vector index reconcile failed: {e}")
+
+    @staticmethod
+    async def _stamp_new_questions():
+        await mongo_db.db.questions.update_many({"indexed_at": None}, {"$currentDate": {"indexed_at": True}})
+
+    async def _reconcile_with_collection(self):
+        # Everything stamped up to now is covered by the full scan below; later syncs start here
+        await self._stamp_new_questions()
+        newest = await mongo_db.db.questions.find({}, {"indexed_at": 1}).sort("indexed_at", -1).to_list(length=1)
+        self._watermark = newest[0].get("indexed_at") if newest else None
+        indexed_before = set(self._ids[:self._size])
+        stored_ids = set()
+        missing: List[ObjectId] = []
+        async for doc in mongo_db.db.questions.find({}, {"_id": 1}):
+            qid = str(doc["_id"])
+            stored_ids.add(qid)
+            if qid not in self._row_by_id:
+                missing.append(doc["_id"])
+        # Only rows that predate the scan can be stale; later upserts are not in `stored_ids`
+        await self.remove(indexed_before - stored_ids)
+        print(f"Vector index: embedding {len(missing)} questions missing from the index.")
+        chunk_size = self.batch_size * 8
+        for start in range(0, len(missing), chunk_size):
+            docs = await mongo_db.db.questions.find(
+                {"_id": {"$in": missing[start:start + chunk_size]}}, {"question_text": 1, "options": 1}
+            ).to_list(length=chunk_size)
+            await self._upsert_docs(docs)
+        self.save()
+
+    async def _catch_up(self):
+        """Embeds questions inserted (by any process) since the last sync that are not indexed yet."""
+        await self._stamp_new_questions()
+        cursor = mongo_db.db.questions.find(
+            catch_up_filter(self._watermark), {"question_text": 1, "options": 1, "indexed_at": 1}
+        ).sort("indexed_at", 1)
+        batch: List[Dict[str, Any]] = []
+        async for doc in cursor:
+            self._watermark = doc["indexed_at"]
+            if str(doc["_id"]) in self._row_by_id:
+                continue # Seen in the overlap window or written through upsert()
+            batch.append(doc)
+            if len(batch) >= self.batch_size * 8:
+                await self._upsert_docs(batch)
+                batch = []
+        if batch:
+            await self._upsert_docs(batch)
+
+    async def ensure_ready(self):
+        """Loads the model and persisted index on first use and keeps the index in sync."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.loaded:
+                await asyncio.to_thread(self._load_model)
+                # The full reconcile can take a while on a large bank; searches are served meanwhile.
+                self._reconcile_task = asyncio.create_task(self._reconcile())
+                self._last_sync = time.monotonic()
+            elif (self._reconcile_task is None or self._reconcile_task.done()) and time.monotonic() - self._last_sync >= self.sync_seconds:
+                self._last_sync = time.monotonic()
+                await self._catch_up()
+
+    # --- Query ---
+
+    def _search_rows(self, vectors, query_vector, k: int) -> List[Tuple[int, float]]:
+        size = len(vectors)
+        if size == 0:
+            return []
+        scores = vectors @ query_vector
+        k = min(k, size)
+        top = self._np.argpartition(-scores, k - 1)[:k]
+        top = top[self._np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    async def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Returns up to `k` (question_id, cosine similarity) pairs, most similar first."""
+        await self.ensure_ready()
+        query_vector = (await asyncio.to_thread(self._embed, [query]))[0]
+        # Rows and ids are taken together; mutations wait for self._searches to drop to zero,
+        # so the rows are not rewritten while the thread scores them
+        size = self._size
+        vectors, ids = self._vectors[:size], self._ids[:size]
+        self._searches += 1
+        try:
+            rows = await asyncio.to_thread(self._search_rows, vectors, query_vector, k)
+        finally:
+            self._searches -= 1
+            if self._searches == 0:
+                idle = self._condition()
+                async with idle:
+                    idle.notify_all()
+        return [(ids[row], score) for row, score in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "model": self.model_name,
+            "size": self._size,
+            "reconciling": self._reconcile_task is not None and not self._reconcile_task.done(),
+        }
+
+question_vector_index = QuestionVectorIndex(
+    model_name=settings.EMBEDDING_MODEL_NAME,
+    index_dir=settings.VECTOR_INDEX_DIR,
+    batch_size=settings.EMBEDDING_BATCH_SIZE,
+    sync_seconds=settings.VECTOR_INDEX_SYNC_SECONDS,
+)
@@ -0,0 +1,332 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict
+import asyncio
+import json
+import time
+import bson
+
+# The shared (Redis) cache tier needs the redis client with asyncio support:
+# pip install "redis>=4.2"
+
+# Pub/sub channel on which every process announces the keys it invalidated
+INVALIDATION_CHANNEL = "mcq:cache:invalidations"
+INVALIDATION_RESUBSCRIBE_SECONDS = 1.0
+
+class CacheBackend(ABC):
+    """
+    A shared cache tier (e.g. Redis) behind TieredCache. Implementations must not raise on
+    connection problems: a failing shared tier degrades to cache misses.
+
+    Backends that broadcast invalidations to every process set `invalidations_live` while they
+    are sure to receive them; TieredCache only serves from its in-process tier in that state.
+    """
+    invalidations_live = False
+
+    def subscribe(self, namespace: str, on_invalidate: Callable[[Optional[List[str]]], None]):
+        """Registers `on_invalidate(keys)` for invalidations of `namespace`; keys is None for a clear."""
+        pass
+
+    def ensure_listening(self):
+        """Starts receiving invalidations if not already; called from the event loop."""
+        pass
+
+    async def publish_invalidation(self, namespace: str, keys: Optional[List[str]]):
+        pass
+
+    @abstractmethod
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def set_many(self, items: Dict[str, Any], ttl_seconds: float):
+        ...
+
+    @abstractmethod
+    async def delete(self, keys: List[str]):
+        ...
+
+    @abstractmethod
+    async def clear(self, prefix: str):
+        ...
+
+    async def close(self):
+        pass
+
+class MemoryTTLCache:
+    """In-process LRU cache whose entries also expire `ttl_seconds` after they were stored."""
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared tier in Redis. Values are BSON-encoded, so ObjectIds, datetimes and bytes round-trip.
+    Invalidations are published on INVALIDATION_CHANNEL; a listener task evicts them from the
+    in-process tiers of this process.
+    """
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio
+        self._client = redis_asyncio.from_url(url)
+        self._listeners: Dict[str, Callable[[Optional[List[str]]], None]] = {}
+        self._listener_task: Optional[asyncio.Task] = None
+        self.invalidations_live = False
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        return bson.encode({"v": value})
+
+    @staticmethod
+    def _decode(data: bytes) -> Any:
+        return bson.decode(data)["v"]
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        try:
+            values = await self._client.mget(keys)
+        except Exception as e:
+            print(f"Shared cache read failed, treating as miss: {e}")
+            return {}
+        return {key: self._decode(data) for key, data in zip(keys, values) if data is not None}
+
+    async def set_many(self, items: Dict[str, Any], ttl_seconds: float):
+        if not items:
+            return
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(key, self._encode(value), px=int(ttl_seconds * 1000))
+                await pipe.execute()
+        except Exception as e:
+            print(f"Shared cache write failed: {e}")
+
+    async def delete(self, keys: List[str]):
+        if not keys:
+            return
+        try:
+            await self._client.unlink(*keys)
+        except Exception as e:
+            print(f"Shared cache delete failed: {e}")
+
+    async def clear(self, prefix: str):
+        try:
+            batch = []
+            async for key in self._client.scan_iter(match=f"{prefix}*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    await self._client.unlink(*batch)
+                    batch = []
+            if batch:
+                await self._client.unlink(*batch)
+        except Exception as e:
+            print(f"Shared cache clear failed: {e}")
+
+    def subscribe(self, namespace: str, on_invalidate: Callable[[Optional[List[str]]], None]):
+        self._listeners[namespace] = on_invalidate
+
+    def ensure_listening(self):
+        # Started lazily: the backend is built at import time, before an event loop runs
+        if self._listeners and (self._listener_task is None or self._listener_task.done()):
+            self._listener_task = asyncio.get_running_loop().create_task(self._listen())
+
+    def _notify(self, namespace: Optional[str], keys: Optional[List[str]]):
+        for name, on_invalidate in self._listeners.items():
+            if namespace is None or name == namespace:
+                on_invalidate(keys)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Invalidations published while we were not subscribed are lost: start over
+                self._notify(None, None)
+                self.invalidations_live = True
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    self._notify(payload["namespace"], payload.get("keys"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Shared cache invalidation listener failed, bypassing in-process caches until it reconnects: {e}")
+            finally:
+                self.invalidations_live = False
+                close = getattr(pubsub, "aclose", None) or pubsub.close
+                try:
+                    await close()
+                except Exception:
+                    pass
+            await asyncio.sleep(INVALIDATION_RESUBSCRIBE_SECONDS)
+
+    async def publish_invalidation(self, namespace: str, keys: Optional[List[str]]):
+        try:
+            await self._client.publish(INVALIDATION_CHANNEL, json.dumps({"namespace": namespace, "keys": keys}))
+        except Exception as e:
+            print(f"Shared cache invalidation publish failed: {e}")
+
+    async def close(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener_task = None
+        # redis-py 5 renamed close() to aclose()
+        close = getattr(self._client, "aclose", None) or self._client.close
+        await close()
+
+class TieredCache:
+    """
+    Read-through cache: an in-process MemoryTTLCache in front of a shared CacheBackend. Keys
+    are namespaced with `namespace`, so one backend can serve several caches.
+
+    Invalidation deletes from the shared tier and is broadcast to the in-process tiers of every
+    process. The in-process tier is only read and filled while the backend is receiving those
+    broadcasts; while its listener is down every read goes to the shared tier, so no process
+    serves a copy another process has invalidated. Without a shared backend the cache is
+    in-process only: invalidations reach this process alone, and `ttl_seconds` bounds how long
+    another process's writes can go unseen.
+    """
+    def __init__(self, namespace: str, max_entries: int, ttl_seconds: float, shared: Optional[CacheBackend] = None):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._memory = MemoryTTLCache(max_entries, ttl_seconds)
+        self.generation = 0 # Bumped on every invalidation seen by this process
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        if shared is not None:
+            shared.subscribe(namespace, self._on_invalidation)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _on_invalidation(self, keys: Optional[List[str]]):
+        self.generation += 1
+        if keys is None:
+            self._memory.clear()
+        else:
+            for key in keys:
+                self._memory.delete(key)
+
+    def _local_tier(self) -> bool:
+        if self.shared is None:
+            return True
+        self.shared.ensure_listening()
+        if not self.shared.invalidations_live:
+            self._memory.clear()
+            return False
+        return True
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Returns the cached values of `keys` (missing keys are left out)."""
+        keys = list(keys)
+        local = self._local_tier()
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        for key in keys:
+            value = self._memory.get(key) if local else None
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.memory_hits += len(found)
+        if missing and self.shared is not None:
+            generation = self.generation
+            shared_values = await self.shared.get_many([self._key(key) for key in missing])
+            for key in missing:
+                value = shared_values.get(self._key(key))
+                if value is not None:
+                    found[key] = value
+                    if local and generation == self.generation:
+                        self._memory.set(key, value)
+                    self.shared_hits += 1
+        self.misses += len(missing) - sum(1 for key in missing if key in found)
+        return found
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_many([key])).get(key)
+
+    async def set_many(self, items: Dict[str, Any], generation: Optional[int] = None):
+        """
+        Stores `items`. Pass the `generation` read before loading them from the source: if an
+        invalidation arrived in between, the values may be stale and are not stored.
+        """
+        if not items or (generation is not None and generation != self.generation):
+            return
+        if self._local_tier():
+            for key, value in items.items():
+                self._memory.set(key, value)
+        if self.shared is not None:
+            await self.shared.set_many({self._key(key): value for key, value in items.items()}, self.ttl_seconds)
+
+    async def set(self, key: str, value: Any, generation: Optional[int] = None):
+        await self.set_many({key: value}, generation)
+
+    async def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        if not keys:
+            return
+        self._on_invalidation(keys)
+        if self.shared is not None:
+            await self.shared.delete([self._key(key) for key in keys])
+            await self.shared.publish_invalidation(self.namespace, keys)
+
+    async def clear(self):
+        self._on_invalidation(None)
+        if self.shared is not None:
+            await self.shared.clear(self._key(""))
+            await self.shared.publish_invalidation(self.namespace, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.shared_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "local_tier_live": self.shared is None or self.shared.invalidations_live,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+def create_shared_backend(url: str) -> Optional[CacheBackend]:
+    """Returns a Redis backend for `url`, or None when no URL is configured or redis is not installed."""
+    if not url:
+        return None
+    try:
+        return RedisCacheBackend(url)
+    except ImportError:
+        print("Warning: CACHE_REDIS_URL is set but the 'redis' package is not installed; question caches stay in-process.")
+        return None
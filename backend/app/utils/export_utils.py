@@ -0,0 +1,263 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape as xml_escape
+from bson import ObjectId
+from ..config import settings
+import asyncio
+import csv
+import html
+import io
+import multiprocessing
+import os
+import tempfile
+
+# orjson is several times faster than the standard library encoder for large exports.
+# Install it with: pip install orjson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_json(value: Any) -> bytes:
+    """Serializes `value` to compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default)
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads_json(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Internal fields left out of exports (near-duplicate fingerprints, see services/dedup.py)
+EXPORT_EXCLUDED_FIELDS = {"dedup_content_hash": 0, "dedup_minhash": 0, "dedup_bands": 0}
+
+def to_export_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts the ObjectId fields of a stored question into strings for export."""
+    doc["_id"] = str(doc["_id"])
+    if doc.get("generated_from_doc_id"):
+        doc["generated_from_doc_id"] = str(doc["generated_from_doc_id"])
+    return doc
+
+async def iter_document_batches(cursor, batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Groups the documents of a Motor cursor into lists of at most `batch_size`."""
+    batch: List[Dict[str, Any]] = []
+    async for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def stream_json_array(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    """Writes the documents of `cursor` as one JSON array, one serialized batch at a time."""
+    yield b"["
+    first = True
+    async for batch in iter_document_batches(cursor, batch_size):
+        body = b",".join(dumps_json(to_export_document(doc)) for doc in batch)
+        yield body if first else b"," + body
+        first = False
+    yield b"]"
+
+async def stream_ndjson(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    """Writes the documents of `cursor` as newline-delimited JSON, one serialized batch at a time."""
+    async for batch in iter_document_batches(cursor, batch_size):
+        yield b"".join(dumps_json(to_export_document(doc)) + b"\n" for doc in batch)
+
+# --- CSV ---
+
+# Questions have between 2 and 6 options (QuestionBase)
+CSV_MAX_OPTIONS = 6
+CSV_COLUMNS = (
+    ["id", "question_text"] + [f"option_{chr(65 + i)}" for i in range(CSV_MAX_OPTIONS)] +
+    ["correct_answer", "correct_answer_index", "explanation", "difficulty", "categories", "source", "created_at"]
+)
+
+def _csv_row(doc: Dict[str, Any]) -> List[Any]:
+    options = doc.get("options") or []
+    correct_index = doc.get("correct_answer_index")
+    created_at = doc.get("created_at")
+    return (
+        [str(doc["_id"]), doc.get("question_text", "")] +
+        [options[i] if i < len(options) else "" for i in range(CSV_MAX_OPTIONS)] +
+        [
+            chr(65 + correct_index) if isinstance(correct_index, int) and correct_index < len(options) else "",
+            correct_index if correct_index is not None else "",
+            doc.get("explanation") or "",
+            doc.get("difficulty", ""),
+            "|".join(doc.get("categories") or []),
+            doc.get("source", ""),
+            created_at.isoformat() if isinstance(created_at, datetime) else (created_at or ""),
+        ]
+    )
+
+async def stream_csv(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    """Writes the documents of `cursor` as CSV rows (categories joined with '|'), one batch at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # UTF-8 BOM so spreadsheet applications detect the encoding
+    writer.writerow(CSV_COLUMNS)
+    yield b"\xef\xbb\xbf" + buffer.getvalue().encode("utf-8")
+    async for batch in iter_document_batches(cursor, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_csv_row(doc) for doc in batch)
+        yield buffer.getvalue().encode("utf-8")
+
+# --- Moodle XML ---
+
+def _moodle_text(text: str) -> str:
+    # html.escape removes every '>' so the text can never close the CDATA section early
+    return f"<text><![CDATA[<p>{html.escape(text or '')}</p>]]></text>"
+
+def _moodle_question(doc: Dict[str, Any]) -> str:
+    question_text = doc.get("question_text", "")
+    options = doc.get("options") or []
+    correct_index = doc.get("correct_answer_index")
+    parts = [
+        '  <question type="multichoice">\n',
+        f"    <name><text>{xml_escape(question_text[:80])}</text></name>\n",
+        f'    <questiontext format="html">{_moodle_text(question_text)}</questiontext>\n',
+        f'    <generalfeedback format="html">{_moodle_text(doc.get("explanation") or "")}</generalfeedback>\n',
+        "    <defaultgrade>1</defaultgrade>\n",
+        "    <single>true</single>\n",
+        "    <shuffleanswers>true</shuffleanswers>\n",
+        "    <answernumbering>abc</answernumbering>\n",
+    ]
+    for i, option in enumerate(options):
+        fraction = 100 if i == correct_index else 0
+        parts.append(f'    <answer fraction="{fraction}" format="html">{_moodle_text(option)}</answer>\n')
+    categories = doc.get("categories") or []
+    if categories or doc.get("difficulty"):
+        parts.append("    <tags>\n")
+        for tag in categories + ([doc["difficulty"]] if doc.get("difficulty") else []):
+            parts.append(f"      <tag><text>{xml_escape(tag)}</text></tag>\n")
+        parts.append("    </tags>\n")
+    parts.append("  </question>\n")
+    return "".join(parts)
+
+async def stream_moodle_xml(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    """Writes the documents of `cursor` as a Moodle XML quiz (multichoice questions), one batch at a time."""
+    yield b'<?xml version="1.0" encoding="UTF-8"?>\n<quiz>\n'
+    async for batch in iter_document_batches(cursor, batch_size):
+        yield "".join(_moodle_question(doc) for doc in batch).encode("utf-8")
+    yield b"</quiz>\n"
+
+# --- PDF ---
+# ReportLab only writes a PDF when it is complete, so PDF exports are rendered to a temporary
+# file by a worker process and then streamed. The questions are spooled to NDJSON first, so
+# neither the API process nor the renderer holds the whole question bank in memory.
+
+PDF_FONT = "Helvetica"
+PDF_FONT_BOLD = "Helvetica-Bold"
+PDF_FONT_SIZE = 10
+PDF_LINE_HEIGHT = 14
+PDF_MARGIN = 72
+
+def _render_questions_pdf(ndjson_path: str, pdf_path: str) -> int:
+    """Lays out the spooled questions page by page on a ReportLab canvas. Runs in the export pool."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas
+
+    page_width, page_height = letter
+    text_width = page_width - 2 * PDF_MARGIN
+    pdf = canvas.Canvas(pdf_path, pagesize=letter)
+    y = page_height - PDF_MARGIN
+
+    def write(text: str, font: str = PDF_FONT, indent: float = 0, space_after: float = 0):
+        nonlocal y
+        for line in simpleSplit(text, font, PDF_FONT_SIZE, text_width - indent) or [""]:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                y = page_height - PDF_MARGIN
+            pdf.setFont(font, PDF_FONT_SIZE)
+            pdf.drawString(PDF_MARGIN + indent, y, line)
+            y -= PDF_LINE_HEIGHT
+        y -= space_after
+
+    pdf.setFont(PDF_FONT_BOLD, 16)
+    pdf.drawString(PDF_MARGIN, y, "MCQ Questions Export")
+    y -= 2 * PDF_LINE_HEIGHT
+
+    count = 0
+    with open(ndjson_path, "rb") as spool:
+        for line in spool:
+            q = loads_json(line)
+            count += 1
+            options = q.get("options") or []
+            correct_index = q.get("correct_answer_index")
+            write(f"Question {count}: {q.get('question_text', '')}", font=PDF_FONT_BOLD, space_after=2)
+            for j, option in enumerate(options):
+                write(f"{chr(65 + j)}. {option}", indent=14)
+            if isinstance(correct_index, int) and correct_index < len(options):
+                write(f"Correct Answer: {options[correct_index]}", font=PDF_FONT_BOLD)
+            if q.get("explanation"):
+                write(f"Explanation: {q['explanation']}")
+            y -= PDF_LINE_HEIGHT
+    pdf.save()
+    return count
+
+_export_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_export_pool() -> ProcessPoolExecutor:
+    global _export_pool
+    if _export_pool is None:
+        # 'spawn' avoids forking the event loop and the Mongo/HTTP client threads.
+        _export_pool = ProcessPoolExecutor(
+            max_workers=max(1, settings.EXPORT_RENDER_PROCESSES),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _export_pool
+
+def shutdown_export_pool():
+    """Stops the export rendering processes. Called from the application lifespan on shutdown."""
+    global _export_pool
+    if _export_pool is not None:
+        _export_pool.shutdown(wait=False, cancel_futures=True)
+        _export_pool = None
+
+async def render_pdf_export(cursor, batch_size: int) -> str:
+    """
+    Spools the documents of `cursor` to a temporary NDJSON file and renders them to a temporary
+    PDF in the export pool. Returns the PDF path; the caller deletes it (see remove_file).
+    """
+    spool_fd, spool_path = tempfile.mkstemp(suffix=".ndjson")
+    pdf_fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(pdf_fd)
+    try:
+        with os.fdopen(spool_fd, "wb") as spool:
+            async for chunk in stream_ndjson(cursor, batch_size):
+                await asyncio.to_thread(spool.write, chunk)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(_get_export_pool(), _render_questions_pdf, spool_path, pdf_path)
+    except BaseException:
+        os.remove(pdf_path)
+        raise
+    finally:
+        os.remove(spool_path)
+    return pdf_path
+
+async def stream_file(path: str, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+    """Streams a file in chunks read off the event loop."""
+    with open(path, "rb") as f:
+        while True:
+            data = await asyncio.to_thread(f.read, chunk_size)
+            if not data:
+                break
+            yield data
+
+def remove_file(path: str):
+    """Deletes a temporary export file; run as the response's background task."""
+    if os.path.exists(path):
+        os.remove(path)
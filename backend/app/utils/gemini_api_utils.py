@@ -1,16 +1,127 @@
-import time
 import asyncio
 import httpx
 import json
 from httpx import RequestError, HTTPStatusError
+from typing import Any, Dict, Optional, AsyncIterator, Type
+from pydantic import BaseModel
+from ..config import settings
+from .rate_limiter import llm_governor, backoff_delay, parse_retry_after
 
 # --- Configuration for Retries ---
 MAX_RETRIES = 5
 INITIAL_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = settings.LLM_MAX_BACKOFF_SECONDS
+# 429/503 mean "slow down" and feed the governor's throttle signal; the rest are transient server errors.
+THROTTLE_STATUS_CODES = {429, 503}
+RETRYABLE_STATUS_CODES = THROTTLE_STATUS_CODES | {500, 502, 504}
 
-async def call_gemini_api_with_retries(api_url: str, headers: dict, payload: dict, api_key: str) -> str:
+class LLMHTTPClient:
     """
-    Makes an asynchronous call to the Gemini API with retry logic for 503 errors.
+    Holds the long-lived httpx.AsyncClient shared by every LLM call, so connections
+    (and their TLS sessions) are pooled and kept alive across requests.
+    """
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """Creates the pooled client. Called once from the application lifespan."""
+        if self.client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        )
+        http2 = settings.LLM_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx needs the 'h2' package for HTTP/2)
+            except ImportError:
+                print("h2 not installed. Falling back to HTTP/1.1 for LLM calls (pip install 'httpx[http2]').")
+                http2 = False
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=limits,
+            timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT),
+        )
+        print(f"LLM HTTP client started (http2={http2}, max_connections={settings.LLM_HTTP_MAX_CONNECTIONS}).")
+
+    async def close(self):
+        """Closes the pooled client and its open connections."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            print("LLM HTTP client closed.")
+
+    async def get_client(self) -> httpx.AsyncClient:
+        """Returns the shared client, starting it lazily when used outside the app lifespan (e.g. scripts)."""
+        if self.client is None:
+            await self.start()
+        return self.client
+
+llm_http_client = LLMHTTPClient()
+
+# JSON Schema keywords understood by Gemini's responseSchema (an OpenAPI 3.0 subset); others are dropped
+_RESPONSE_SCHEMA_KEYWORDS = ("description", "enum", "format", "minItems", "maxItems", "minimum", "maximum")
+
+def gemini_response_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Converts a pydantic model's JSON schema into the form Gemini expects for
+    generationConfig.responseSchema: uppercase types, inlined $refs, Optional fields as
+    nullable, and propertyOrdering so properties are generated in declaration order.
+    """
+    json_schema = model.model_json_schema()
+    definitions = json_schema.get("$defs", {})
+
+    def convert(node: Dict[str, Any]) -> Dict[str, Any]:
+        if "$ref" in node:
+            node = definitions[node["$ref"].rsplit("/", 1)[-1]]
+        variants = node.get("anyOf")
+        if variants:
+            non_null = [variant for variant in variants if variant.get("type") != "null"]
+            converted = convert({**non_null[0], **{k: v for k, v in node.items() if k != "anyOf"}})
+            if len(non_null) < len(variants):
+                converted["nullable"] = True
+            return converted
+
+        converted = {"type": node["type"].upper()}
+        converted.update((key, node[key]) for key in _RESPONSE_SCHEMA_KEYWORDS if key in node)
+        if node["type"] == "object":
+            properties = node.get("properties", {})
+            converted["properties"] = {name: convert(prop) for name, prop in properties.items()}
+            converted["propertyOrdering"] = list(properties)
+            if node.get("required"):
+                converted["required"] = node["required"]
+        elif node["type"] == "array":
+            converted["items"] = convert(node["items"])
+        return converted
+
+    return convert(json_schema)
+
+async def _handle_retryable_status(e: HTTPStatusError, attempt: int) -> float:
+    """Reports a retryable HTTP error to the governor and returns how long to wait before retrying."""
+    status_code = e.response.status_code
+    retry_after = parse_retry_after(e.response.headers.get("retry-after"))
+    if status_code in THROTTLE_STATUS_CODES:
+        await llm_governor.record_throttle(retry_after)
+    else:
+        await llm_governor.record_error()
+    return backoff_delay(attempt, INITIAL_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS, retry_after)
+
+async def _wait_before_retry(attempt: int, wait_time: float, reason: str):
+    """Logs a retryable failure and sleeps before the next attempt. There is no wait after the last attempt."""
+    if attempt >= MAX_RETRIES - 1:
+        print(f"{reason}. No attempts left.")
+        return
+    print(f"{reason}. Retrying in {wait_time:.2f} seconds...")
+    await asyncio.sleep(wait_time)
+
+async def call_gemini_api_with_retries(api_url: str, headers: dict, payload: dict, api_key: str,
+                                       client: Optional[httpx.AsyncClient] = None) -> str:
+    """
+    Makes an asynchronous call to the Gemini API through the process-wide LLM governor, with retries.
+    429/500/502/503/504 and network errors are retried with jittered exponential backoff, honouring
+    Retry-After; throttling responses also shrink the governor's concurrency limit.
     This version expects a plain text response from Gemini (not structured JSON within text).
 
     Args:
@@ -18,6 +129,7 @@ async def call_gemini_api_with_retries(api_url: str, headers: dict, payload: dic
         headers (dict): HTTP headers for the request.
         payload (dict): The JSON payload for the Gemini API request.
         api_key (str): Your Gemini API key.
+        client (httpx.AsyncClient, optional): Client to send with instead of the shared pooled one.
 
     Returns:
         str: The raw text content from Gemini's response.
@@ -27,57 +139,159 @@ async def call_gemini_api_with_retries(api_url: str, headers: dict, payload: dic
     """
     full_api_url = f"{api_url}?key={api_key}"
 
-    async with httpx.AsyncClient() as client:
-        for i in range(MAX_RETRIES):
-            response = None # Initialize response to None
+    client = client or await llm_http_client.get_client()
+    for i in range(MAX_RETRIES):
+        response = None # Initialize response to None
+        try:
+            print(f"Attempt {i + 1}/{MAX_RETRIES} to call Gemini API...")
+            async with llm_governor.slot():
+                response = await client.post(full_api_url, json=payload, headers=headers)
+            response.raise_for_status()
+            await llm_governor.record_success()
+            print(f"Attempt {i + 1}: Gemini API call successful.")
+
+            # Attempt to parse the response as JSON
+            result = response.json() 
+
+            if result.get("candidates") and len(result["candidates"]) > 0 and \
+               result["candidates"][0].get("content") and \
+               result["candidates"][0]["content"].get("parts") and \
+               len(result["candidates"][0]["content"]["parts"]) > 0:
+                raw_output = result["candidates"][0]["content"]["parts"][0]["text"]
+                return raw_output
+            else:
+                print(f"Gemini API response structure unexpected: {result}")
+                raise ValueError("Gemini API returned an unexpected response structure or no content within candidates.")
+
+        except HTTPStatusError as e:
+            if e.response.status_code in RETRYABLE_STATUS_CODES:
+                wait_time = await _handle_retryable_status(e, i)
+                await _wait_before_retry(i, wait_time, f"Gemini API returned {e.response.status_code}")
+            else:
+                # For other HTTP errors, include response text for debugging
+                error_detail = f"Gemini API HTTP error: {e.response.status_code} - {e.response.text}"
+                print(error_detail)
+                raise Exception(error_detail)
+        except RequestError as e:
+            await llm_governor.record_error()
+            wait_time = backoff_delay(i, INITIAL_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS)
+            await _wait_before_retry(i, wait_time, f"Network error during Gemini API call: {e}")
+        except json.JSONDecodeError as e:
+            # --- FIX START ---
+            # This block is specifically for when response.json() fails
+            raw_response_text = response.text if response else "No response object available."
+            error_message = f"Invalid JSON response from Gemini API: {e}. Raw response: {raw_response_text}"
+            print(f"DEBUG: {error_message}") # Print to backend console
+            raise Exception(error_message) # Re-raise with more detail
+            # --- FIX END ---
+        except ValueError as e: # Catches the ValueError from unexpected structure or missing content
+            error_message = f"Error parsing Gemini response structure: {e}. Raw response: {{(response.text if response else 'N/A')}}"
+            print(f"DEBUG: {error_message}")
+            raise Exception(error_message)
+        except Exception as e:
+            # Catch any other unexpected errors
+            print(f"An unexpected error occurred during Gemini API call: {e}")
+            raise e
+
+    raise Exception(f"Failed to get a successful response from Gemini API after {MAX_RETRIES} attempts.")
+
+async def post_json_with_retries(api_url: str, headers: dict, payload: dict, service_name: str = "LLM API") -> Any:
+    """
+    POSTs `payload` through the shared client and the LLM governor and returns the decoded JSON
+    response, retrying like call_gemini_api_with_retries. Used by the non-Gemini HTTP providers
+    (services/llm_providers.py).
+    """
+    client = await llm_http_client.get_client()
+    for i in range(MAX_RETRIES):
+        try:
+            async with llm_governor.slot():
+                response = await client.post(api_url, json=payload, headers=headers)
+            response.raise_for_status()
+            await llm_governor.record_success()
+            return response.json()
+        except HTTPStatusError as e:
+            if e.response.status_code not in RETRYABLE_STATUS_CODES:
+                raise Exception(f"{service_name} HTTP error: {e.response.status_code} - {e.response.text}")
+            wait_time = await _handle_retryable_status(e, i)
+            await _wait_before_retry(i, wait_time, f"{service_name} returned {e.response.status_code}")
+        except RequestError as e:
+            await llm_governor.record_error()
+            wait_time = backoff_delay(i, INITIAL_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS)
+            await _wait_before_retry(i, wait_time, f"Network error during {service_name} call: {e}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid JSON response from {service_name}: {e}")
+
+    raise Exception(f"Failed to get a successful response from {service_name} after {MAX_RETRIES} attempts.")
+
+async def stream_gemini_api_with_retries(api_url: str, headers: dict, payload: dict, api_key: str,
+                                         client: Optional[httpx.AsyncClient] = None) -> AsyncIterator[str]:
+    """
+    Calls Gemini's streamGenerateContent endpoint (server-sent events) and yields text fragments
+    as they arrive. A governor slot is held only while the request is sent and the response headers
+    are read; the body is then streamed outside it, so the consumer's work between fragments does
+    not count against the LLM concurrency limit. Retryable errors are retried like
+    call_gemini_api_with_retries, but only until the first fragment has been yielded; after that
+    errors are raised to the caller.
+
+    Args:
+        api_url (str): The streamGenerateContent endpoint URL (without query string).
+        headers (dict): HTTP headers for the request.
+        payload (dict): The JSON payload for the Gemini API request.
+        api_key (str): Your Gemini API key.
+        client (httpx.AsyncClient, optional): Client to send with instead of the shared pooled one.
+
+    Yields:
+        str: Successive text fragments of the model output.
+    """
+    full_api_url = f"{api_url}?alt=sse&key={api_key}"
+
+    client = client or await llm_http_client.get_client()
+    for i in range(MAX_RETRIES):
+        yielded_any = False
+        try:
+            print(f"Attempt {i + 1}/{MAX_RETRIES} to stream from Gemini API...")
+            request = client.build_request("POST", full_api_url, json=payload, headers=headers)
+            async with llm_governor.slot():
+                response = await client.send(request, stream=True)
             try:
-                print(f"Attempt {i + 1}/{MAX_RETRIES} to call Gemini API...")
-                response = await client.post(full_api_url, json=payload, headers=headers, timeout=60.0)
+                if response.status_code >= 400:
+                    await response.aread()
                 response.raise_for_status()
-                print(f"Attempt {i + 1}: Gemini API call successful.")
-
-                # Attempt to parse the response as JSON
-                result = response.json() 
-
-                if result.get("candidates") and len(result["candidates"]) > 0 and \
-                   result["candidates"][0].get("content") and \
-                   result["candidates"][0]["content"].get("parts") and \
-                   len(result["candidates"][0]["content"]["parts"]) > 0:
-                    raw_output = result["candidates"][0]["content"]["parts"][0]["text"]
-                    return raw_output
-                else:
-                    print(f"Gemini API response structure unexpected: {result}")
-                    raise ValueError("Gemini API returned an unexpected response structure or no content within candidates.")
-
-            except HTTPStatusError as e:
-                if e.response.status_code == 503:
-                    wait_time = INITIAL_BACKOFF_SECONDS * (2 ** i)
-                    print(f"Gemini API returned 503 (Overloaded). Retrying in {wait_time:.2f} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    # For other HTTP errors, include response text for debugging
-                    error_detail = f"Gemini API HTTP error: {e.response.status_code} - {e.response.text}"
-                    print(error_detail)
-                    raise Exception(error_detail)
-            except RequestError as e:
-                wait_time = INITIAL_BACKOFF_SECONDS * (2 ** i)
-                print(f"Network error during Gemini API call: {e}. Retrying in {wait_time:.2f} seconds...")
-                await asyncio.sleep(wait_time)
-            except json.JSONDecodeError as e:
-                # --- FIX START ---
-                # This block is specifically for when response.json() fails
-                raw_response_text = response.text if response else "No response object available."
-                error_message = f"Invalid JSON response from Gemini API: {e}. Raw response: {raw_response_text}"
-                print(f"DEBUG: {error_message}") # Print to backend console
-                raise Exception(error_message) # Re-raise with more detail
-                # --- FIX END ---
-            except ValueError as e: # Catches the ValueError from unexpected structure or missing content
-                error_message = f"Error parsing Gemini response structure: {e}. Raw response: {{(response.text if response else 'N/A')}}"
-                print(f"DEBUG: {error_message}")
-                raise Exception(error_message)
-            except Exception as e:
-                # Catch any other unexpected errors
-                print(f"An unexpected error occurred during Gemini API call: {e}")
-                raise e
-
-        raise Exception(f"Failed to get a successful response from Gemini API after {MAX_RETRIES} attempts.")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if not data:
+                        continue
+                    chunk = json.loads(data)
+                    for candidate in chunk.get("candidates") or []:
+                        for part in (candidate.get("content") or {}).get("parts") or []:
+                            text = part.get("text")
+                            if text:
+                                yielded_any = True
+                                yield text
+            finally:
+                await response.aclose()
+            await llm_governor.record_success()
+            return
+
+        except HTTPStatusError as e:
+            if e.response.status_code in RETRYABLE_STATUS_CODES and not yielded_any:
+                wait_time = await _handle_retryable_status(e, i)
+                await _wait_before_retry(i, wait_time, f"Gemini API returned {e.response.status_code}")
+            else:
+                error_detail = f"Gemini API HTTP error: {e.response.status_code} - {e.response.text}"
+                print(error_detail)
+                raise Exception(error_detail)
+        except RequestError as e:
+            await llm_governor.record_error()
+            if yielded_any:
+                raise Exception(f"Gemini stream interrupted: {e}")
+            wait_time = backoff_delay(i, INITIAL_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS)
+            await _wait_before_retry(i, wait_time, f"Network error during Gemini API stream: {e}")
+        except json.JSONDecodeError as e:
+            error_message = f"Invalid JSON event in Gemini API stream: {e}"
+            print(f"DEBUG: {error_message}")
+            raise Exception(error_message)
+
+    raise Exception(f"Failed to get a successful stream from Gemini API after {MAX_RETRIES} attempts.")
@@ -0,0 +1,30 @@
+from typing import Any, Dict, Optional
+import base64
+from bson import json_util
+
+# Response header carrying the cursor of the next page (exposed via CORS in main.py)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """
+    Encodes the sort-key values of the last item of a page into an opaque, URL-safe cursor.
+    Extended JSON keeps ObjectIds and datetimes intact across the round trip.
+    """
+    return base64.urlsafe_b64encode(json_util.dumps(position).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, fields: Optional[Dict[str, type]] = None) -> Dict[str, Any]:
+    """
+    Decodes a cursor produced by encode_cursor. With `fields` (name -> expected type) every
+    field must be present with that type, so a crafted cursor cannot inject query operators.
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        position = json_util.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8"))
+    except Exception as e:
+        raise ValueError("Invalid pagination cursor.") from e
+    if not isinstance(position, dict):
+        raise ValueError("Invalid pagination cursor.")
+    for name, expected_type in (fields or {}).items():
+        if not isinstance(position.get(name), expected_type):
+            raise ValueError("Invalid pagination cursor.")
+    return position
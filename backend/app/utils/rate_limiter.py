@@ -0,0 +1,171 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any
+from ..config import settings
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (delta-seconds or HTTP-date) into seconds to wait."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    Exponential backoff with "equal jitter": half of the exponential step is fixed, the other
+    half random, so concurrent callers spread out. A server-provided Retry-After is a lower bound.
+    """
+    step = min(cap, base * (2 ** attempt))
+    delay = step / 2 + random.uniform(0, step / 2)
+    return max(delay, retry_after or 0.0)
+
+class AdaptiveConcurrencyGovernor:
+    """
+    Process-wide gate for LLM calls combining a token bucket and an AIMD concurrency limit.
+
+    - The token bucket caps the request rate at `requests_per_minute` (with `burst` capacity).
+    - The concurrency limit grows additively on success (+increase_step per limit's worth of
+      successes) and shrinks multiplicatively on throttling (429/503) or when the recent error
+      rate exceeds `error_rate_threshold`. At most one decrease is applied per `decrease_cooldown`
+      seconds, so one burst of failures does not collapse the limit.
+    - A Retry-After from the server pauses every caller until it has elapsed.
+    """
+    def __init__(self, requests_per_minute: float, burst: int, initial_concurrency: int, min_concurrency: int,
+                 max_concurrency: int, increase_step: float = 1.0, decrease_factor: float = 0.5,
+                 error_rate_threshold: float = 0.2, window_size: int = 50, decrease_cooldown: float = 1.0):
+        self.rate_per_second = requests_per_minute / 60.0 if requests_per_minute > 0 else 0.0
+        self.burst = max(1, burst)
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(self.max_concurrency, max(self.min_concurrency, initial_concurrency)))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.error_rate_threshold = error_rate_threshold
+        self.decrease_cooldown = decrease_cooldown
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._outcomes: deque = deque(maxlen=window_size)
+        self.successes = 0
+        self.throttled = 0
+        self.errors = 0
+
+    @property
+    def _cond(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def _wait_for_token(self):
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            if self.rate_per_second <= 0:
+                return
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+        try:
+            await self._wait_for_token()
+        except BaseException:
+            await self.release()
+            raise
+
+    async def release(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds one concurrency slot (and one rate token) for the duration of an LLM call."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_concurrency), self.limit * self.decrease_factor)
+        print(f"LLM governor: reducing concurrency limit to {int(self.limit)}.")
+
+    async def record_success(self):
+        self.successes += 1
+        self._outcomes.append(True)
+        previous_limit = int(self.limit)
+        self.limit = min(float(self.max_concurrency), self.limit + self.increase_step / max(self.limit, 1.0))
+        if int(self.limit) > previous_limit:
+            async with self._cond:
+                self._cond.notify_all()
+
+    async def record_throttle(self, retry_after: Optional[float] = None):
+        """Called on 429/503. Shrinks the limit and, if given, pauses all callers for retry_after seconds."""
+        self.throttled += 1
+        self._outcomes.append(False)
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+        self._decrease()
+
+    async def record_error(self):
+        """Called on other retryable failures (5xx, network). Shrinks the limit if the error rate is high."""
+        self.errors += 1
+        self._outcomes.append(False)
+        if len(self._outcomes) >= 10 and self.error_rate() > self.error_rate_threshold:
+            self._decrease()
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": int(self.limit),
+            "in_flight": self._in_flight,
+            "requests_per_minute": self.rate_per_second * 60,
+            "recent_error_rate": round(self.error_rate(), 4),
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "paused_for_seconds": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+        }
+
+llm_governor = AdaptiveConcurrencyGovernor(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    burst=settings.LLM_RATE_BURST,
+    initial_concurrency=settings.LLM_INITIAL_CONCURRENCY,
+    min_concurrency=settings.LLM_MIN_CONCURRENCY,
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+)
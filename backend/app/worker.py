@@ -0,0 +1,128 @@
+# Job worker for document MCQ generation.
+# Run one or more of these next to the API (from the backend directory):
+#     python -m app.worker                  # WORKER_PROCESSES processes (default 1)
+#     python -m app.worker --processes 4
+# Workers can run on any machine that can reach MongoDB and the LLM API.
+
+from dotenv import load_dotenv
+load_dotenv() # Load environment variables from .env file
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import traceback
+from typing import Awaitable, Callable, Dict
+
+from bson import ObjectId
+from .config import settings
+from .db.mongo import mongo_db
+from .models.schema import JobStatus
+from .utils.gemini_api_utils import llm_http_client
+from .services.jobs import job_queue, JOB_TYPE_GENERATE_DOCUMENT_MCQS, JOB_TYPE_DEDUPE_QUESTIONS, JOB_TYPE_REBUILD_QUIZ_ROLLUPS
+from .services.document_generation import process_document_job
+from .services.dedup import dedupe_questions_job
+from .services.quiz_analytics import rebuild_quiz_rollups_job
+from .services.question_cache import question_cache
+
+JOB_HANDLERS: Dict[str, Callable[[dict], Awaitable[dict]]] = {
+    JOB_TYPE_GENERATE_DOCUMENT_MCQS: process_document_job,
+    JOB_TYPE_DEDUPE_QUESTIONS: dedupe_questions_job,
+    JOB_TYPE_REBUILD_QUIZ_ROLLUPS: rebuild_quiz_rollups_job,
+}
+
+async def _heartbeat(job_id: ObjectId, worker_id: str, stop: asyncio.Event):
+    """Renews the job lease until `stop` is set."""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.JOB_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            if not await job_queue.heartbeat(job_id, worker_id):
+                print(f"Worker {worker_id} lost the lease on job {job_id}.")
+                return
+
+async def _run_job(job: dict, worker_id: str):
+    handler = JOB_HANDLERS.get(job["job_type"])
+    stop_heartbeat = asyncio.Event()
+    heartbeat_task = asyncio.create_task(_heartbeat(job["_id"], worker_id, stop_heartbeat))
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job type '{job['job_type']}'.")
+        print(f"Worker {worker_id} running job {job['_id']} ({job['job_type']}), attempt {job['attempts']}/{job['max_attempts']}.")
+        result = await handler(job)
+        await job_queue.complete(job["_id"], worker_id, result)
+        print(f"Worker {worker_id} completed job {job['_id']}: {result}")
+    except Exception as e:
+        traceback.print_exc()
+        new_status = await job_queue.fail(job, worker_id, str(e))
+        print(f"Worker {worker_id} failed job {job['_id']} (now {new_status.value}): {e}")
+        if new_status == JobStatus.FAILED and job["job_type"] == JOB_TYPE_GENERATE_DOCUMENT_MCQS:
+            await mongo_db.db.documents.update_one(
+                {"_id": ObjectId(job["payload"]["doc_id"])},
+                {"$set": {"status": JobStatus.FAILED.value}}
+            )
+    finally:
+        stop_heartbeat.set()
+        await heartbeat_task
+
+async def run_worker(worker_id: str):
+    """Claims and runs jobs one at a time until SIGINT/SIGTERM."""
+    shutdown = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, shutdown.set)
+        except NotImplementedError: # e.g. Windows
+            pass
+
+    await mongo_db.connect()
+    await llm_http_client.start()
+    print(f"Worker {worker_id} started.")
+    try:
+        while not shutdown.is_set():
+            await job_queue.fail_abandoned()
+            job = await job_queue.claim(worker_id)
+            if job is None:
+                try:
+                    await asyncio.wait_for(shutdown.wait(), timeout=settings.JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await _run_job(job, worker_id)
+    finally:
+        await question_cache.close()
+        await llm_http_client.close()
+        await mongo_db.close()
+        print(f"Worker {worker_id} stopped.")
+
+def _worker_process_main(index: int):
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    asyncio.run(run_worker(worker_id))
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run MCQ generation job workers.")
+    arg_parser.add_argument("--processes", type=int, default=settings.WORKER_PROCESSES, help="Number of worker processes to start.")
+    args = arg_parser.parse_args()
+
+    if args.processes <= 1:
+        _worker_process_main(0)
+        return
+
+    processes = [
+        multiprocessing.Process(target=_worker_process_main, args=(i,), name=f"mcq-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Children receive the same SIGINT and shut down after their current job.
+        for process in processes:
+            process.join()
+
+if __name__ == "__main__":
+    main()
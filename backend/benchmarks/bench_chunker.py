@@ -0,0 +1,97 @@
+# ==============================================================================
+# mcq-generator/backend/benchmarks/bench_chunker.py
+# Compares the fixed 2000/200 character slicer with the semantic chunker:
+# number of LLM calls, document tokens sent, prompt overhead tokens and chunking time.
+#
+# Run from the backend directory:
+#     python -m benchmarks.bench_chunker                    # synthetic 200-page document
+#     python -m benchmarks.bench_chunker notes.txt book.pdf # your own files
+# ==============================================================================
+import argparse
+import os
+import random
+import time
+from typing import List, Tuple
+
+from app.services.chunker import split_text_into_chunks, semantic_chunks, estimate_tokens
+
+# Approximate size of the fixed instruction preamble sent with every chunk
+# (MCQGeneratorService._build_prompt without the topic text).
+PROMPT_OVERHEAD_TOKENS = 170
+
+VOCABULARY = (
+    "cell membrane protein enzyme energy molecule structure function transport signal "
+    "receptor gradient diffusion osmosis pathway reaction substrate catalyst nucleus gene "
+    "expression regulation metabolism oxygen glucose mitochondria synthesis complex"
+).split()
+
+def synthetic_pages(page_count: int = 200, seed: int = 42) -> List[str]:
+    """Builds textbook-like pages with a running header, a footer and page numbers."""
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(1, page_count + 1):
+        lines = ["Introduction to Cell Biology - Lecture Notes"]
+        for _ in range(rng.randint(3, 6)):
+            sentences = []
+            for _ in range(rng.randint(2, 6)):
+                words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))]
+                sentences.append(" ".join(words).capitalize() + ".")
+            paragraph = " ".join(sentences)
+            # PDF text extraction wraps lines at roughly 90 characters
+            lines.extend(paragraph[i:i + 90] for i in range(0, len(paragraph), 90))
+            lines.append("")
+        lines.append("(c) University Press. All rights reserved.")
+        lines.append(str(page_number))
+        pages.append("\n".join(lines))
+    return pages
+
+def load_segments(path: str) -> Tuple[List[str], str]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        from PyPDF2 import PdfReader
+        return [page.extract_text() or "" for page in PdfReader(path).pages], "page"
+    if extension == ".docx":
+        from docx import Document
+        return [paragraph.text + "\n" for paragraph in Document(path).paragraphs], "paragraph"
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return [text[i:i + 64 * 1024] for i in range(0, len(text), 64 * 1024)], "text"
+
+def report(name: str, chunks: List[str], elapsed: float):
+    document_tokens = sum(estimate_tokens(chunk) for chunk in chunks)
+    overhead_tokens = PROMPT_OVERHEAD_TOKENS * len(chunks)
+    print(f"  {name:<22} calls={len(chunks):>5}  doc_tokens={document_tokens:>8}  "
+          f"prompt_overhead={overhead_tokens:>7}  total_input={document_tokens + overhead_tokens:>8}  "
+          f"time={elapsed * 1000:8.1f} ms")
+    return len(chunks), document_tokens + overhead_tokens
+
+def benchmark(label: str, segments: List[str], segment_kind: str, token_budget: int, min_chunk_tokens: int):
+    print(f"\n{label} ({len(segments)} segments, {sum(len(s) for s in segments)} chars)")
+
+    start = time.perf_counter()
+    fixed_chunks = [chunk for chunk in split_text_into_chunks("".join(segments)) if chunk.strip()]
+    fixed_calls, fixed_total = report("fixed 2000/200 slicer", fixed_chunks, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    packed_chunks = semantic_chunks(segments, token_budget=token_budget, min_chunk_tokens=min_chunk_tokens, segment_kind=segment_kind)
+    packed_calls, packed_total = report(f"semantic ({token_budget} tok)", packed_chunks, time.perf_counter() - start)
+
+    if packed_calls and packed_total:
+        print(f"  -> {fixed_calls / packed_calls:.2f}x fewer calls, {fixed_total / packed_total:.2f}x fewer input tokens")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark document chunkers.")
+    arg_parser.add_argument("files", nargs="*", help="Optional .txt/.pdf/.docx files to chunk.")
+    arg_parser.add_argument("--token-budget", type=int, default=1000)
+    arg_parser.add_argument("--min-chunk-tokens", type=int, default=40)
+    arg_parser.add_argument("--pages", type=int, default=200, help="Pages in the synthetic document.")
+    args = arg_parser.parse_args()
+
+    if not args.files:
+        benchmark(f"synthetic {args.pages}-page document", synthetic_pages(args.pages), "page", args.token_budget, args.min_chunk_tokens)
+    for path in args.files:
+        segments, segment_kind = load_segments(path)
+        benchmark(path, segments, segment_kind, args.token_budget, args.min_chunk_tokens)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# ==============================================================================
+# mcq-generator/backend/benchmarks/bench_mcq_parser.py
+# Measures the MCQ output parser: parse throughput and recovery rate, i.e. the
+# share of well-formed questions parsed with the right answer index. The strict
+# line parser the generator used before app/services/mcq_parser.py is kept
+# below as the baseline.
+#
+# benchmarks/data/sample_mcq_outputs.json holds hand-written samples of the
+# format drift seen in LLM output (markdown, relabelled options, wrapped lines,
+# malformed blocks); they are not captured responses. Throughput is reported
+# for two corpora:
+#   canonical  the questions of the samples rendered in the exact format the
+#              prompts ask for, which is what most responses look like,
+#   drift      the samples as written, which go through the per-line parser.
+# Canonical text parses about as fast as with the legacy parser. Drifted text
+# takes 3 to 4 times as long: the legacy parser only checks prefixes and skips the
+# lines it does not know (hence its low recovery rate there), while every line
+# is classified here. A profile of that path puts about half of the time in
+# _LINE_RE and the rest in the per-line bookkeeping of MCQParser._feed_lines.
+# The same measurements run under pytest-benchmark in test_mcq_parser_benchmark.py.
+#
+# Run from the backend directory:
+#     python -m benchmarks.bench_mcq_parser
+#     python -m benchmarks.bench_mcq_parser --repeat 2000 my_outputs.json
+# Extra files use the same format: [{"name", "output", "expected_answers"}],
+# with null for blocks that should be rejected and "sections" for batched output.
+# ==============================================================================
+import argparse
+import json
+import os
+import time
+from typing import Any, Callable, List, Optional
+
+from app.services.mcq_parser import (
+    MCQParser, ParsedMCQ, parse_mcq_output, parse_sectioned_mcq_output, parse_structured_mcq_output,
+)
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(__file__), "data", "sample_mcq_outputs.json")
+
+def load_samples(paths: List[str]) -> List[dict]:
+    samples = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            samples.extend(json.load(f))
+    return samples
+
+def legacy_parse(raw_output: str) -> List[Optional[int]]:
+    """The previous strict parser: exact "Q:", "A)".."D)" and "Answer: <letter>" prefixes."""
+    answers = []
+    question, options, letter = "", [], ""
+
+    def finalize():
+        if question and len(options) == 4 and letter:
+            answers.append(ord(letter) - ord("A"))
+
+    for line in raw_output.strip().split("\n"):
+        line = line.strip()
+        if line.startswith("Q:"):
+            finalize()
+            question, options, letter = line[2:].strip(), [], ""
+        elif line.startswith(("A)", "B)", "C)", "D)")):
+            options.append(line[2:].strip())
+        elif line.startswith("Answer:"):
+            part = line.split(":")[1].strip().upper()
+            if len(part) == 1 and "A" <= part <= "D":
+                letter = part
+    finalize()
+    return answers
+
+def parse_sample(sample: dict, parser: MCQParser) -> List[ParsedMCQ]:
+    if "sections" in sample:
+        return [item for section in parse_sectioned_mcq_output(sample["output"], sample["sections"], parser) for item in section]
+    return parse_mcq_output(sample["output"], parser)
+
+def flatten(answers: List[Any]) -> List[Optional[int]]:
+    flat = []
+    for answer in answers:
+        flat.extend(answer if isinstance(answer, list) else [answer])
+    return flat
+
+def recovery(expected: List[Optional[int]], parsed: List[Optional[int]]) -> int:
+    """Number of expected questions found, in order, with the expected answer index."""
+    wanted = [answer for answer in expected if answer is not None]
+    found, position = 0, 0
+    for answer in parsed:
+        if position < len(wanted) and answer == wanted[position]:
+            found += 1
+            position += 1
+    return found
+
+def canonical_output(items: List[ParsedMCQ]) -> str:
+    """Renders questions in the exact Q:/A)/Answer:/Explanation: format of the prompts."""
+    blocks = []
+    for item in items:
+        lines = [f"Q: {item.question}"]
+        lines += [f"{'ABCDEF'[i]}) {option}" for i, option in enumerate(item.options)]
+        lines.append(f"Answer: {'ABCDEF'[item.correct_answer_index]}")
+        if item.explanation:
+            lines.append(f"Explanation: {item.explanation}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+def corpora(samples: List[dict]) -> dict:
+    """The canonical, drift and JSON-mode corpora measured for throughput."""
+    items = [item for sample in samples for item in parse_sample(sample, MCQParser())]
+    return {
+        "canonical": [canonical_output(items)],
+        "drift": [sample["output"] for sample in samples],
+        "json": [json.dumps([item._asdict() for item in items], ensure_ascii=False)],
+    }
+
+def throughput(parse: Callable[[str], Any], outputs: List[str], repeat: int) -> float:
+    """Parsed megabytes per second over `repeat` passes of all outputs (best of three runs)."""
+    size = sum(len(output.encode("utf-8")) for output in outputs)
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for output in outputs:
+                parse(output)
+        best = min(best, time.perf_counter() - start)
+    return size * repeat / best / 1e6
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the MCQ output parser on sample LLM outputs.")
+    arg_parser.add_argument("files", nargs="*", default=[DEFAULT_SAMPLES], help="JSON files of sample outputs.")
+    arg_parser.add_argument("--repeat", type=int, default=500, help="Passes over the outputs for the throughput measurement.")
+    args = arg_parser.parse_args()
+
+    samples = load_samples(args.files)
+    print(f"{'sample':<28} {'expected':>8} {'legacy':>7} {'parser':>7}  dropped")
+    totals = {"expected": 0, "legacy": 0, "parser": 0}
+    for sample in samples:
+        expected = flatten(sample["expected_answers"])
+        parser = MCQParser()
+        parsed = [item.correct_answer_index for item in parse_sample(sample, parser)]
+        counts = {
+            "expected": sum(answer is not None for answer in expected),
+            "legacy": recovery(expected, legacy_parse(sample["output"])),
+            "parser": recovery(expected, parsed),
+        }
+        for key, value in counts.items():
+            totals[key] += value
+        dropped = ", ".join(f"{reason}={count}" for reason, count in sorted(parser.dropped.items())) or "-"
+        print(f"{sample['name']:<28} {counts['expected']:>8} {counts['legacy']:>7} {counts['parser']:>7}  {dropped}")
+
+    if totals["expected"]:
+        print(f"\nrecovery rate: legacy {totals['legacy'] / totals['expected']:.1%}, parser {totals['parser'] / totals['expected']:.1%}")
+    corpus = corpora(samples)
+    for name in ("canonical", "drift"):
+        print(f"throughput ({name}):{' ' * (10 - len(name))}legacy {throughput(legacy_parse, corpus[name], args.repeat):.1f} MB/s, "
+              f"parser {throughput(lambda output: parse_mcq_output(output), corpus[name], args.repeat):.1f} MB/s")
+    print(f"throughput (json mode):  {throughput(parse_structured_mcq_output, corpus['json'], args.repeat):.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
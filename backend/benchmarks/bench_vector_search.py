@@ -0,0 +1,53 @@
+# ==============================================================================
+# mcq-generator/backend/benchmarks/bench_vector_search.py
+# Measures the flat scan behind semantic search (app/services/vector_index.py):
+# query latency of QuestionVectorIndex._search_rows over random L2-normalised
+# float32 rows, the layout the index keeps in memory. No model is loaded, so
+# only the matrix-vector product and the top-k selection are timed.
+#
+# Run from the backend directory (needs: pip install numpy):
+#     python -m benchmarks.bench_vector_search
+#     python -m benchmarks.bench_vector_search --sizes 100000 1000000 --dim 384 --queries 50
+# A 1M x 384 matrix takes 1.5 GB of memory.
+# ==============================================================================
+import argparse
+import time
+
+import numpy
+
+from app.services.vector_index import QuestionVectorIndex
+from benchmarks.load_test_pipeline import percentile
+
+def normalized(rng: numpy.random.Generator, rows: int, dim: int) -> numpy.ndarray:
+    vectors = rng.standard_normal((rows, dim), dtype=numpy.float32)
+    vectors /= numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the flat vector scan used by semantic search.")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="Indexed questions.")
+    arg_parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (384 for all-MiniLM-L6-v2).")
+    arg_parser.add_argument("--k", type=int, default=10, help="Results per query.")
+    arg_parser.add_argument("--queries", type=int, default=20, help="Timed queries per size.")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    rng = numpy.random.default_rng(args.seed)
+    index = QuestionVectorIndex(model_name="benchmark", index_dir="")
+    index._np = numpy
+    for size in args.sizes:
+        vectors = normalized(rng, size, args.dim)
+        queries = normalized(rng, args.queries + 1, args.dim)
+        index._search_rows(vectors, queries[-1], args.k) # Warm-up
+        latencies = []
+        for query_vector in queries[:-1]:
+            start = time.perf_counter()
+            index._search_rows(vectors, query_vector, args.k)
+            latencies.append(time.perf_counter() - start)
+        print(f"{size:>9} x {args.dim}: p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms, "
+              f"{size * args.dim * 4 / percentile(latencies, 0.5) / 1e9:.1f} GB/s scanned")
+        del vectors
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# ==============================================================================
+# mcq-generator/backend/benchmarks/load_test_pipeline.py
+# Load-tests MCQ generation offline with the fake LLM provider (LLM_PROVIDER=fake,
+# see app/services/llm_providers.py): simulated latency and injected failures,
+# no API key and no network.
+#
+#   --target pipeline  runs services/document_generation.generate_mcqs_from_document_background
+#                      in process: chunks batched MCQ_CHUNKS_PER_REQUEST per request,
+#                      MCQ_CHUNK_CONCURRENCY in flight, the governor and the Gemini
+#                      retry loop, then the dedup check and insert. The questions
+#                      collection is an in-memory store starting empty (no MongoDB needed).
+#   --target api       drives POST /api/v1/mcq/generate-from-text on a running
+#                      server; start it with LLM_PROVIDER=fake for an offline run.
+#
+# Run from the backend directory:
+#     python -m benchmarks.load_test_pipeline
+#     python -m benchmarks.load_test_pipeline --chunks 2000 --latency 1.5 --error-rate 0.05
+#     python -m benchmarks.load_test_pipeline --target api --requests 500 --concurrency 32
+# ==============================================================================
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+from bson import ObjectId
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def print_latencies(label: str, latencies: List[float]):
+    print(f"{label} latency: p50 {percentile(latencies, 0.5):.3f}s, p95 {percentile(latencies, 0.95):.3f}s, "
+          f"max {max(latencies, default=0.0):.3f}s")
+
+class EmptyCursor:
+    """A cursor over no documents: the load test starts from an empty question bank."""
+    def limit(self, count: int):
+        return self
+
+    async def to_list(self, length=None) -> list:
+        return []
+
+    async def close(self):
+        pass
+
+class InMemoryQuestions:
+    """Stands in for the questions collection: the reads of the dedup check and insert_many."""
+    def __init__(self):
+        self.docs: List[dict] = []
+
+    def find(self, *args, **kwargs) -> EmptyCursor:
+        return EmptyCursor()
+
+    async def insert_many(self, docs: List[dict]):
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+        self.docs.extend(docs)
+
+class InMemoryStore:
+    def __init__(self):
+        self.questions = InMemoryQuestions()
+
+async def run_pipeline(args):
+    # Imported here: settings are read from the environment prepared in main()
+    from app.config import settings
+    from app.db.mongo import mongo_db
+    from app.models.schema import Difficulty
+    from app.services.document_generation import generate_mcqs_from_document_background
+    from app.services.mcq_generator import mcq_generator_service
+    from app.utils.rate_limiter import llm_governor
+
+    store = InMemoryStore()
+    mongo_db.db = store
+    chunks = [f"Load test chunk {i}: " + "cell membrane transport " * 60 for i in range(args.chunks)]
+    batch_size = max(1, settings.MCQ_CHUNKS_PER_REQUEST)
+    batches = (len(chunks) + batch_size - 1) // batch_size
+
+    async def iter_chunks():
+        for chunk in chunks:
+            yield chunk
+
+    start = time.perf_counter()
+    inserted = await generate_mcqs_from_document_background(
+        doc_id=str(ObjectId()),
+        chunks=iter_chunks(),
+        num_questions_per_chunk=args.questions,
+        difficulty=Difficulty.MEDIUM,
+        category=None,
+        use_cache=False
+    )
+    elapsed = time.perf_counter() - start
+
+    provider = mcq_generator_service.provider
+    print(f"{len(chunks)} chunks in {batches} batches ({batch_size} per request, "
+          f"concurrency {settings.MCQ_CHUNK_CONCURRENCY}): {elapsed:.2f}s")
+    print(f"LLM HTTP attempts: {provider.calls}, throttled (429): {provider.throttled}")
+    print(f"questions inserted: {inserted}/{len(chunks) * args.questions} "
+          f"({inserted / elapsed:.1f}/s, {len(store.questions.docs)} in the store)")
+    print(f"yield: {mcq_generator_service.yield_stats.stats()}")
+    print(f"governor: {llm_governor.stats()}")
+
+async def run_api(args):
+    import httpx
+
+    url = f"{args.base_url.rstrip('/')}/api/v1/mcq/generate-from-text"
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counts = {"questions": 0, "errors": 0}
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout)) as client:
+        async def send(i: int):
+            payload = {"topic": f"load test topic {i}", "num_questions": args.questions, "use_cache": False}
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=payload)
+                except httpx.HTTPError:
+                    counts["errors"] += 1
+                    return
+                finally:
+                    latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 201:
+                counts["questions"] += len(response.json())
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        stats = await client.get(f"{args.base_url.rstrip('/')}/api/v1/mcq/generation/stats")
+
+    print(f"{args.requests} requests (concurrency {args.concurrency}) in {elapsed:.2f}s: "
+          f"{args.requests / elapsed:.1f} req/s, status codes {statuses}, connection errors {counts['errors']}")
+    print(f"questions inserted: {counts['questions']}/{args.requests * args.questions}")
+    print_latencies("request", latencies)
+    if stats.status_code == 200:
+        print(f"server generation stats: {stats.json()}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Load-test MCQ generation offline with the fake LLM provider.")
+    arg_parser.add_argument("--target", choices=("pipeline", "api"), default="pipeline")
+    arg_parser.add_argument("--chunks", type=int, default=200, help="Document chunks (pipeline target).")
+    arg_parser.add_argument("--questions", type=int, default=5, help="Questions per chunk or per request.")
+    arg_parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency in seconds (pipeline target).")
+    arg_parser.add_argument("--jitter", type=float, default=0.2, help="Latency jitter as a fraction of --latency.")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake LLM HTTP attempts answered with 429.")
+    arg_parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of fake questions without an answer.")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--base-url", default="http://localhost:8000", help="Server URL (api target).")
+    arg_parser.add_argument("--requests", type=int, default=100, help="Requests to send (api target).")
+    arg_parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight (api target).")
+    arg_parser.add_argument("--timeout", type=float, default=120.0, help="Request timeout in seconds (api target).")
+    args = arg_parser.parse_args()
+
+    if args.target == "pipeline":
+        os.environ.update({
+            "LLM_PROVIDER": "fake",
+            "FAKE_LLM_LATENCY_SECONDS": str(args.latency),
+            "FAKE_LLM_LATENCY_JITTER": str(args.jitter),
+            "FAKE_LLM_ERROR_RATE": str(args.error_rate),
+            "FAKE_LLM_MALFORMED_RATE": str(args.malformed_rate),
+            "FAKE_LLM_SEED": str(args.seed),
+            # Every batch reaches the provider
+            "LLM_CACHE_ENABLED": "False",
+        })
+        asyncio.run(run_pipeline(args))
+    else:
+        asyncio.run(run_api(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# ==============================================================================
+# mcq-generator/backend/benchmarks/test_mcq_parser_benchmark.py
+# pytest-benchmark suite for the MCQ output parser (app/services/mcq_parser.py):
+# throughput on the canonical, drift and JSON-mode corpora next to the legacy
+# strict parser, and the recovery rate on the sample outputs. Corpora and
+# helpers are shared with bench_mcq_parser.py.
+#
+# Run from the backend directory (needs: pip install pytest-benchmark):
+#     python -m pytest benchmarks/test_mcq_parser_benchmark.py
+#     python -m pytest benchmarks/test_mcq_parser_benchmark.py --benchmark-group-by=group
+# ==============================================================================
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app.services.mcq_parser import MCQParser, parse_mcq_output, parse_structured_mcq_output
+from benchmarks.bench_mcq_parser import (
+    DEFAULT_SAMPLES, corpora, flatten, legacy_parse, load_samples, parse_sample, recovery,
+)
+
+SAMPLES = load_samples([DEFAULT_SAMPLES])
+CORPORA = corpora(SAMPLES)
+
+def parse_all(parse, outputs):
+    for output in outputs:
+        parse(output)
+
+def run_throughput(benchmark, parse, corpus: str):
+    outputs = CORPORA[corpus]
+    size = sum(len(output.encode("utf-8")) for output in outputs)
+    benchmark.group = f"throughput: {corpus}"
+    benchmark(parse_all, parse, outputs)
+    if benchmark.stats is not None: # None with --benchmark-disable
+        benchmark.extra_info["mb_per_s"] = round(size / benchmark.stats.stats.mean / 1e6, 1)
+
+@pytest.mark.parametrize("corpus", ["canonical", "drift"])
+def test_parser_throughput(benchmark, corpus):
+    run_throughput(benchmark, parse_mcq_output, corpus)
+
+@pytest.mark.parametrize("corpus", ["canonical", "drift"])
+def test_legacy_parser_throughput(benchmark, corpus):
+    run_throughput(benchmark, legacy_parse, corpus)
+
+def test_structured_output_throughput(benchmark):
+    run_throughput(benchmark, parse_structured_mcq_output, "json")
+
+def recovery_totals():
+    totals = {"expected": 0, "legacy": 0, "parser": 0}
+    for sample in SAMPLES:
+        expected = flatten(sample["expected_answers"])
+        parsed = [item.correct_answer_index for item in parse_sample(sample, MCQParser())]
+        totals["expected"] += sum(answer is not None for answer in expected)
+        totals["legacy"] += recovery(expected, legacy_parse(sample["output"]))
+        totals["parser"] += recovery(expected, parsed)
+    return totals
+
+def test_recovery_rate(benchmark):
+    benchmark.group = "recovery"
+    totals = benchmark(recovery_totals)
+    benchmark.extra_info["legacy_recovery"] = round(totals["legacy"] / totals["expected"], 3)
+    benchmark.extra_info["parser_recovery"] = round(totals["parser"] / totals["expected"], 3)
+    assert totals["parser"] == totals["expected"]
+    assert totals["parser"] >= totals["legacy"]
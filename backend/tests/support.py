@@ -0,0 +1,47 @@
+# ==============================================================================
+# mcq-generator/backend/tests/support.py
+# Helpers shared by the tests. Tests that need MongoDB run against the database
+# named by TEST_MONGO_DB_NAME on TEST_MONGO_URL and are skipped unless both are
+# set; the application database (MONGO_DB_NAME) is refused.
+# ==============================================================================
+import asyncio
+import os
+from typing import Any, Awaitable, Dict, List
+
+import pytest
+
+from app.config import settings
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+TEST_MONGO_DB_NAME = os.environ.get("TEST_MONGO_DB_NAME")
+
+requires_mongo = pytest.mark.skipif(
+    not (TEST_MONGO_URL and TEST_MONGO_DB_NAME), reason="TEST_MONGO_URL and TEST_MONGO_DB_NAME are not set"
+)
+
+def mongo_test_database() -> str:
+    if TEST_MONGO_DB_NAME == settings.MONGO_DB_NAME:
+        pytest.fail("TEST_MONGO_DB_NAME must not be the application database (MONGO_DB_NAME).")
+    return TEST_MONGO_DB_NAME
+
+def run(coroutine: Awaitable[Any]) -> Any:
+    """Runs a coroutine to completion on a fresh event loop."""
+    return asyncio.run(coroutine)
+
+async def collect(iterator) -> List[Any]:
+    return [item async for item in iterator]
+
+async def aiter_items(items):
+    for item in items:
+        yield item
+
+class ListCursor:
+    """Stands in for a Motor cursor over `docs` (async iteration and batch_size())."""
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self.docs = docs
+
+    def batch_size(self, size: int) -> "ListCursor":
+        return self
+
+    def __aiter__(self):
+        return aiter_items(self.docs)
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from app.services.chunker import (
+    CHARS_PER_TOKEN, SemanticChunker, chunk_text_stream, estimate_tokens, semantic_chunk_stream,
+    semantic_chunks, split_text_into_chunks,
+)
+from tests.support import aiter_items, collect, run
+
+SENTENCE = "The mitochondrion is the site of aerobic respiration in the cell. "
+
+def paragraphs(count: int, sentences: int = 6) -> str:
+    return "\n\n".join(f"Paragraph {i}. " + SENTENCE * sentences for i in range(count))
+
+def random_segments(text: str, seed: int):
+    """Cuts `text` at random offsets, the way extracted blocks arrive."""
+    rng = random.Random(seed)
+    segments, start = [], 0
+    while start < len(text):
+        end = start + rng.randint(1, 700)
+        segments.append(text[start:end])
+        start = end
+    return segments
+
+@pytest.mark.parametrize("seed", range(5))
+def test_chunk_text_stream_matches_the_windows_of_the_whole_text(seed):
+    text = paragraphs(12)
+    expected = split_text_into_chunks(text, chunk_size=500, overlap=100)
+    streamed = run(collect(chunk_text_stream(aiter_items(random_segments(text, seed)), chunk_size=500, overlap=100)))
+    # Trailing windows that hold nothing beyond the previous window's overlap are not repeated
+    assert streamed == expected[:len(streamed)]
+    assert "".join(chunk[100:] if i else chunk for i, chunk in enumerate(streamed)).endswith(text[-50:])
+
+def test_semantic_chunks_stay_within_the_token_budget_and_keep_paragraphs_whole():
+    text = paragraphs(10)
+    chunks = semantic_chunks([text], token_budget=250, min_chunk_tokens=10)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 250 for chunk in chunks)
+    for i in range(10):
+        assert sum(f"Paragraph {i}." in chunk for chunk in chunks) == 1
+
+def test_oversized_paragraph_is_split_at_sentences():
+    text = SENTENCE * 40 # One paragraph of about 660 tokens
+    chunks = semantic_chunks([text], token_budget=200, min_chunk_tokens=10)
+    assert all(estimate_tokens(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith("cell.") for chunk in chunks)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_text_blocks_chunk_the_same_however_they_are_cut(seed):
+    text = paragraphs(8)
+    whole = semantic_chunks([text], token_budget=300, min_chunk_tokens=10)
+    assert semantic_chunks(random_segments(text, seed), token_budget=300, min_chunk_tokens=10) == whole
+
+def test_number_at_a_text_block_boundary_is_not_dropped_as_a_page_number():
+    # "section\n12" would look like a bare page number "12" if the line were cleaned before completing
+    text = "Cell membranes are covered in section 12 of the course. " * 20
+    cut = text.index("12")
+    chunks = semantic_chunks([text[:cut], text[cut:]], token_budget=1000, min_chunk_tokens=10)
+    assert " ".join(chunks).count("section 12") == 20
+
+def test_bare_page_number_lines_are_dropped():
+    text = paragraphs(2) + "\n\n17\n\n" + paragraphs(2)
+    chunks = semantic_chunks([text], token_budget=2000, min_chunk_tokens=10)
+    assert "17" not in " ".join(chunks)
+
+def test_long_line_longer_than_the_budget_is_passed_on():
+    long_line = "word " * 2000 # No newline for 10000 characters
+    chunks = semantic_chunks(random_segments(long_line, 0), token_budget=200, min_chunk_tokens=10)
+    assert " ".join(chunks).split() == long_line.split()
+
+def test_running_headers_repeated_across_pages_are_dropped():
+    pages = [f"Biology 101 - Lecture Notes\n\n{paragraphs(1)}\n\n{page + 1}" for page in range(6)]
+    chunks = semantic_chunks(pages, token_budget=2000, min_chunk_tokens=10, segment_kind="page")
+    joined = " ".join(chunks)
+    assert "Lecture Notes" not in joined
+    assert joined.count("Paragraph 0.") == 6
+
+def test_small_document_is_kept_even_below_the_minimum_chunk_size():
+    assert semantic_chunks(["A short note."], token_budget=1000, min_chunk_tokens=40) == ["A short note."]
+
+def test_semantic_chunk_stream_matches_semantic_chunks():
+    segments = random_segments(paragraphs(6), 3)
+    streamed = run(collect(semantic_chunk_stream(aiter_items(segments), token_budget=300, min_chunk_tokens=10)))
+    assert streamed == semantic_chunks(segments, token_budget=300, min_chunk_tokens=10)
+
+def test_unknown_segment_kind_is_rejected():
+    with pytest.raises(ValueError):
+        SemanticChunker(segment_kind="slide")
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("x" * (CHARS_PER_TOKEN + 1)) == 2
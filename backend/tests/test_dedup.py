@@ -0,0 +1,63 @@
+from app.services import dedup
+from app.services.dedup import (
+    BANDS_FIELD, CONTENT_HASH_FIELD, QuestionDeduplicator, add_fingerprint, candidate_queries,
+    estimated_similarity, fingerprint, is_near_duplicate, normalize_text,
+)
+from tests.support import run
+
+OPTIONS = ["Mitochondria", "Nucleus", "Ribosome", "Golgi apparatus"]
+
+def question(text: str, options=OPTIONS) -> dict:
+    return add_fingerprint({"question_text": text, "options": list(options)})
+
+def test_normalize_text_drops_case_punctuation_and_extra_spaces():
+    assert normalize_text("  What IS the  cell's\npowerhouse? ") == "what is the cell s powerhouse"
+
+def test_content_hash_ignores_formatting_and_option_order():
+    a = fingerprint("Which organelle produces ATP?", OPTIONS)
+    b = fingerprint("which organelle produces ATP", list(reversed(OPTIONS)))
+    assert a[CONTENT_HASH_FIELD] == b[CONTENT_HASH_FIELD]
+    assert a[BANDS_FIELD] == b[BANDS_FIELD]
+
+def test_reworded_question_is_a_near_duplicate():
+    original = question("Which organelle of the eukaryotic cell produces most of its ATP?")
+    reworded = question("Which organelle of the eukaryotic cell produces most of the ATP?")
+    assert original[CONTENT_HASH_FIELD] != reworded[CONTENT_HASH_FIELD]
+    assert estimated_similarity(original["dedup_minhash"], reworded["dedup_minhash"]) >= 0.75
+    assert set(original[BANDS_FIELD]) & set(reworded[BANDS_FIELD]) # Found as an LSH candidate
+    assert is_near_duplicate(reworded, original, threshold=0.75)
+
+def test_unrelated_question_is_not_a_near_duplicate():
+    a = question("Which organelle of the eukaryotic cell produces most of its ATP?")
+    b = question("In which year did the French Revolution begin?", ["1789", "1815", "1648", "1914"])
+    assert estimated_similarity(a["dedup_minhash"], b["dedup_minhash"]) < 0.2
+    assert not is_near_duplicate(b, a, threshold=0.8)
+
+def test_candidate_queries_look_up_hashes_then_bands():
+    docs = [question("What is ATP?"), question("What is DNA?")]
+    by_hash, by_band = candidate_queries(docs, {"_id": {"$lt": 5}})
+    assert by_hash["$and"][0][CONTENT_HASH_FIELD]["$in"] == sorted(doc[CONTENT_HASH_FIELD] for doc in docs)
+    assert set(by_band["$and"][0][BANDS_FIELD]["$in"]) == set(docs[0][BANDS_FIELD]) | set(docs[1][BANDS_FIELD])
+    assert by_band["$and"][1] == {"_id": {"$lt": 5}}
+
+def test_filter_new_drops_duplicates_of_stored_and_of_earlier_questions(monkeypatch):
+    async def stored_duplicates(self, docs, extra_filter=None):
+        return {2} # The third question matches a stored one
+
+    monkeypatch.setattr(QuestionDeduplicator, "_stored_duplicates", stored_duplicates)
+    deduplicator = QuestionDeduplicator(similarity_threshold=0.8)
+    docs = [
+        {"question_text": "Which organelle produces ATP?", "options": OPTIONS},
+        {"question_text": "which organelle produces ATP", "options": list(reversed(OPTIONS))},
+        {"question_text": "What is the function of the ribosome?", "options": OPTIONS},
+        {"question_text": "What does the Golgi apparatus do?", "options": OPTIONS},
+    ]
+    kept, dropped = run(deduplicator.filter_new(docs))
+    assert [doc["question_text"] for doc in kept] == ["Which organelle produces ATP?", "What does the Golgi apparatus do?"]
+    assert dropped == 2
+    assert all(CONTENT_HASH_FIELD in doc for doc in kept)
+
+def test_signature_size_matches_the_band_layout():
+    doc = question("What is ATP?")
+    assert len(doc["dedup_minhash"]) == dedup.MINHASH_PERMUTATIONS * 4
+    assert len(doc[BANDS_FIELD]) == dedup.MINHASH_PERMUTATIONS // dedup.MINHASH_BAND_ROWS
@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+from datetime import datetime
+from xml.etree import ElementTree
+
+import pytest
+from bson import ObjectId
+
+from app.models.schema import Source
+from app.services.question_import import QuestionImportError, _validate_row, iter_json_array_rows, iter_ndjson_rows
+from app.utils.export_utils import CSV_COLUMNS, stream_csv, stream_json_array, stream_moodle_xml, stream_ndjson
+from tests.support import ListCursor, aiter_items, collect, run
+
+ROW = {"question_text": "Which organelle produces ATP?", "options": ["Mitochondria", "Nucleus"], "correct_answer_index": 0}
+
+def byte_chunks(data: bytes, size: int):
+    return aiter_items([data[i:i + size] for i in range(0, len(data), size)])
+
+def stored_question(**fields) -> dict:
+    doc = {
+        "_id": ObjectId(), "question_text": "Which organelle produces ATP?",
+        "options": ["Mitochondria", "Nucleus", "Ribosome"], "correct_answer_index": 0,
+        "explanation": "Cellular respiration.", "difficulty": "easy", "categories": ["Biology", "Cells"],
+        "source": Source.MANUAL.value, "created_at": datetime(2024, 3, 5, 12, 0),
+    }
+    doc.update(fields)
+    return doc
+
+def export(stream, docs, batch_size=2) -> bytes:
+    return b"".join(run(collect(stream(ListCursor(docs), batch_size))))
+
+# --- Import ---
+
+def test_ndjson_rows_are_decoded_across_chunk_boundaries():
+    body = "\ufeff" + json.dumps({"question_text": "Qu'est-ce que l'ATP ? é"}) + "\n\nnot json\n" + json.dumps(ROW)
+    rows = run(collect(iter_ndjson_rows(byte_chunks(body.encode("utf-8"), 3))))
+    assert [number for number, _ in rows] == [1, 2, 3]
+    assert rows[0][1] == {"question_text": "Qu'est-ce que l'ATP ? é"}
+    assert isinstance(rows[1][1], ValueError)
+    assert rows[2][1] == ROW
+
+def test_json_array_rows_are_decoded_one_element_at_a_time():
+    body = json.dumps([ROW, 12345, ROW], indent=2).encode("utf-8")
+    rows = run(collect(iter_json_array_rows(byte_chunks(body, 5))))
+    assert rows == [(1, ROW), (2, 12345), (3, ROW)]
+    assert run(collect(iter_json_array_rows(byte_chunks(b" [ ] ", 2)))) == []
+
+def test_malformed_json_array_fails_after_the_rows_before_it():
+    rows = []
+
+    async def read():
+        async for row in iter_json_array_rows(byte_chunks(b'[{"a": 1}, {"b": }]', 4)):
+            rows.append(row)
+
+    with pytest.raises(QuestionImportError):
+        run(read())
+    assert rows == [(1, {"a": 1})]
+
+@pytest.mark.parametrize("body", [b'{"a": 1}', b'[{"a": 1}'])
+def test_body_that_is_not_a_complete_array_is_rejected(body):
+    with pytest.raises(QuestionImportError):
+        run(collect(iter_json_array_rows(byte_chunks(body, 4))))
+
+def test_validate_row_returns_a_fingerprinted_manual_question():
+    doc = _validate_row(ROW)
+    assert doc["source"] == Source.MANUAL
+    assert doc["dedup_content_hash"]
+
+@pytest.mark.parametrize("value", [ValueError("bad"), ["not", "an", "object"], dict(ROW, correct_answer_index=2)])
+def test_validate_row_rejects_invalid_rows(value):
+    with pytest.raises(ValueError):
+        _validate_row(value)
+
+# --- Export ---
+
+@pytest.mark.parametrize("count", [0, 1, 5])
+def test_json_array_export_is_one_valid_array(count):
+    docs = [stored_question() for _ in range(count)]
+    exported = json.loads(export(stream_json_array, docs))
+    assert [doc["_id"] for doc in exported] == [str(doc["_id"]) for doc in docs]
+    assert all(doc["created_at"] == "2024-03-05T12:00:00" for doc in exported)
+
+def test_ndjson_export_has_one_line_per_question():
+    docs = [stored_question() for _ in range(3)]
+    lines = export(stream_ndjson, docs).decode("utf-8").splitlines()
+    assert [json.loads(line)["_id"] for line in lines] == [str(doc["_id"]) for doc in docs]
+
+def test_csv_export_has_a_bom_header_and_one_row_per_question():
+    doc = stored_question(question_text='Commas, "quotes"\nand newlines')
+    data = export(stream_csv, [doc, stored_question()])
+    assert data.startswith(b"\xef\xbb\xbf")
+    rows = list(csv.reader(io.StringIO(data[3:].decode("utf-8"))))
+    assert rows[0] == CSV_COLUMNS
+    assert len(rows) == 3
+    row = dict(zip(CSV_COLUMNS, rows[1]))
+    assert row["question_text"] == doc["question_text"]
+    assert (row["option_C"], row["option_D"]) == ("Ribosome", "")
+    assert (row["correct_answer"], row["categories"]) == ("A", "Biology|Cells")
+
+def test_moodle_export_is_well_formed_and_marks_the_correct_answer():
+    doc = stored_question(question_text="Is 1 < 2 & ]]> safe?", correct_answer_index=1)
+    quiz = ElementTree.fromstring(export(stream_moodle_xml, [doc]))
+    question = quiz.find("question")
+    assert question.get("type") == "multichoice"
+    assert "1 &lt; 2 &amp; ]]&gt; safe?" in question.find("questiontext/text").text
+    assert [answer.get("fraction") for answer in question.findall("answer")] == ["0", "100", "0"]
+    assert [tag.text for tag in question.findall("tags/tag/text")] == ["Biology", "Cells", "easy"]
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app.db.mongo import mongo_db
+from app.models.schema import JobStatus
+from app.services.jobs import JobQueue
+from tests.support import TEST_MONGO_URL, mongo_test_database, requires_mongo, run
+
+class RecordingCollection:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+@pytest.fixture
+def recording_jobs(monkeypatch):
+    collection = RecordingCollection()
+    monkeypatch.setattr(mongo_db, "db", SimpleNamespace(jobs=collection))
+    return collection
+
+def test_failed_attempt_is_requeued_with_a_growing_backoff(recording_jobs):
+    queue = JobQueue(lease_seconds=60, max_attempts=3, retry_backoff_seconds=30)
+    job = {"_id": ObjectId(), "attempts": 2, "max_attempts": 3}
+    before = datetime.utcnow()
+    assert run(queue.fail(job, "worker-1", "boom")) == JobStatus.QUEUED
+    query, update = recording_jobs.updates[0]
+    assert query == {"_id": job["_id"], "worker_id": "worker-1"}
+    assert update["$set"]["status"] == JobStatus.QUEUED.value
+    assert update["$set"]["available_at"] - before >= timedelta(seconds=60)
+    assert update["$unset"] == {"lease_expires_at": ""}
+
+def test_final_failed_attempt_marks_the_job_as_failed(recording_jobs):
+    queue = JobQueue(lease_seconds=60, max_attempts=3, retry_backoff_seconds=30)
+    job = {"_id": ObjectId(), "attempts": 3, "max_attempts": 3}
+    assert run(queue.fail(job, "worker-1", "boom")) == JobStatus.FAILED
+    _, update = recording_jobs.updates[0]
+    assert update["$set"]["status"] == JobStatus.FAILED.value
+    assert "available_at" not in update["$set"]
+    assert update["$set"]["last_error"] == "boom"
+
+# --- Against MongoDB ---
+
+def run_with_jobs_collection(monkeypatch, scenario):
+    """Runs `scenario(queue, collection)` against an emptied `jobs` collection of the test database."""
+    async def main():
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(TEST_MONGO_URL)
+        database = client[mongo_test_database()]
+        monkeypatch.setattr(mongo_db, "db", database)
+        await database.jobs.delete_many({})
+        try:
+            await scenario(JobQueue(lease_seconds=60, max_attempts=2, retry_backoff_seconds=0), database.jobs)
+        finally:
+            await database.jobs.delete_many({})
+            client.close()
+
+    run(main())
+
+async def expire_lease(collection, job_id):
+    await collection.update_one({"_id": job_id}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+@requires_mongo
+def test_a_job_is_claimed_by_one_worker_at_a_time(monkeypatch):
+    async def scenario(queue, collection):
+        job_id = ObjectId(await queue.enqueue("test", {"n": 1}))
+        job = await queue.claim("worker-1")
+        assert (job["_id"], job["status"], job["attempts"]) == (job_id, JobStatus.RUNNING.value, 1)
+        assert await queue.claim("worker-2") is None
+        assert await queue.heartbeat(job_id, "worker-1")
+        assert not await queue.heartbeat(job_id, "worker-2")
+        await queue.complete(job_id, "worker-1", {"ok": True})
+        assert (await queue.get(job_id))["status"] == JobStatus.COMPLETED.value
+
+    run_with_jobs_collection(monkeypatch, scenario)
+
+@requires_mongo
+def test_an_expired_lease_is_claimed_again_until_attempts_run_out(monkeypatch):
+    async def scenario(queue, collection):
+        job_id = ObjectId(await queue.enqueue("test", {}))
+        await queue.claim("worker-1")
+        await expire_lease(collection, job_id)
+        job = await queue.claim("worker-2")
+        assert (job["worker_id"], job["attempts"]) == ("worker-2", 2)
+        assert not await queue.heartbeat(job_id, "worker-1") # The first worker lost the job
+
+        await expire_lease(collection, job_id)
+        assert await queue.claim("worker-3") is None # No attempts left
+        assert await queue.fail_abandoned() == 1
+        assert (await queue.get(job_id))["status"] == JobStatus.FAILED.value
+
+    run_with_jobs_collection(monkeypatch, scenario)
+
+@requires_mongo
+def test_a_failed_job_waits_for_its_backoff(monkeypatch):
+    async def scenario(queue, collection):
+        queue.retry_backoff_seconds = 3600
+        job_id = ObjectId(await queue.enqueue("test", {}))
+        job = await queue.claim("worker-1")
+        assert await queue.fail(job, "worker-1", "boom") == JobStatus.QUEUED
+        assert await queue.claim("worker-1") is None
+        await collection.update_one({"_id": job_id}, {"$set": {"available_at": datetime.utcnow()}})
+        assert (await queue.claim("worker-1"))["attempts"] == 2
+
+    run_with_jobs_collection(monkeypatch, scenario)
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.mongo import mongo_db
+from app.services import llm_cache
+from app.services.llm_cache import LLMResponseCache
+from tests.support import run
+
+class RecordingCollection:
+    """Returns `doc` from find_one and records the filters and writes it receives."""
+    def __init__(self, doc=None):
+        self.doc = doc
+        self.filters = []
+        self.updates = []
+
+    async def find_one(self, query, projection=None):
+        self.filters.append(query)
+        return self.doc
+
+    async def update_one(self, query, update, upsert=False):
+        self.updates.append((query, update))
+
+@pytest.fixture
+def no_database(monkeypatch):
+    monkeypatch.setattr(mongo_db, "db", None)
+
+def use_collection(monkeypatch, collection: RecordingCollection):
+    monkeypatch.setattr(mongo_db, "db", {LLMResponseCache.COLLECTION_NAME: collection})
+
+def test_key_ignores_whitespace_but_not_the_model():
+    key = LLMResponseCache.make_key("gemini", "Generate  5\nquestions ")
+    assert key == LLMResponseCache.make_key("gemini", "Generate 5 questions")
+    assert key != LLMResponseCache.make_key("other-model", "Generate 5 questions")
+
+def test_memory_tier_evicts_the_least_recently_used_entry(no_database):
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=60)
+    run(cache.set("a", "A"))
+    run(cache.set("b", "B"))
+    assert run(cache.get("a")) == "A" # "b" is now the least recently used
+    run(cache.set("c", "C"))
+    assert run(cache.get("b")) is None
+    assert run(cache.get("a")) == "A"
+    assert cache.stats()["memory_entries"] == 2
+
+def test_memory_tier_expires_entries_after_the_ttl(no_database, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    run(cache.set("key", "response"))
+    now[0] += 59
+    assert run(cache.get("key")) == "response"
+    now[0] += 2
+    assert run(cache.get("key")) is None
+    assert cache.stats()["memory_entries"] == 0
+
+def test_persistent_lookup_only_accepts_entries_younger_than_the_ttl(monkeypatch):
+    collection = RecordingCollection()
+    use_collection(monkeypatch, collection)
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=3600)
+    before = datetime.utcnow()
+    assert run(cache.get("key")) is None
+    fresh_since = collection.filters[0]["created_at"]["$gte"]
+    assert before - timedelta(seconds=3601) < fresh_since <= datetime.utcnow() - timedelta(seconds=3599)
+
+def test_persistent_hit_expires_in_memory_with_the_stored_entry(monkeypatch):
+    collection = RecordingCollection({"response": "stored", "created_at": datetime.utcnow() - timedelta(seconds=3590)})
+    use_collection(monkeypatch, collection)
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=3600)
+    assert run(cache.get("key")) == "stored"
+    assert cache.persistent_hits == 1
+
+    # The copy kept in memory is 3590 s old, not fresh: 20 s later it has expired
+    real_time = llm_cache.time.time
+    monkeypatch.setattr(llm_cache.time, "time", lambda: real_time() + 20)
+    collection.doc = None
+    assert run(cache.get("key")) is None
+    assert cache.memory_hits == 0
+
+def test_set_writes_both_tiers(monkeypatch):
+    collection = RecordingCollection()
+    use_collection(monkeypatch, collection)
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60)
+    run(cache.set("key", "response"))
+    query, update = collection.updates[0]
+    assert query == {"_id": "key"}
+    assert update["$set"]["response"] == "response"
+    assert run(cache.get("key")) == "response"
+    assert cache.memory_hits == 1
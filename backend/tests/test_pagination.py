@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.api.routes_mcq import _build_question_list_query
+from app.api.routes_quiz import _build_results_query, _date_range
+from app.models.schema import Difficulty, Source
+from app.utils.pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip_keeps_object_ids_and_datetimes():
+    position = {"quiz_date": datetime(2024, 3, 5, 14, 30, 15, 123000), "_id": ObjectId()}
+    cursor = encode_cursor(position)
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor # URL-safe, unpadded
+    assert decode_cursor(cursor, {"quiz_date": datetime, "_id": ObjectId}) == position
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "e30", base64.urlsafe_b64encode(b"[1, 2]").decode()])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, {"_id": ObjectId})
+
+def test_cursor_cannot_inject_query_operators():
+    crafted = base64.urlsafe_b64encode(json.dumps({"_id": {"$ne": None}}).encode()).decode()
+    with pytest.raises(ValueError):
+        decode_cursor(crafted, {"_id": ObjectId})
+
+def test_question_list_query_pages_after_the_last_id():
+    last_id = ObjectId()
+    assert _build_question_list_query(Difficulty.HARD, "Biology", Source.MANUAL, last_id) == {
+        "difficulty": Difficulty.HARD.value,
+        "categories": "Biology",
+        "source": Source.MANUAL.value,
+        "_id": {"$gt": last_id},
+    }
+    assert _build_question_list_query(None, None, None) == {}
+
+def test_results_query_continues_after_the_previous_page():
+    position = {"quiz_date": datetime(2024, 3, 5), "_id": ObjectId()}
+    query = _build_results_query("user-1", {"$gte": datetime(2024, 1, 1)}, position)
+    assert query == {"$and": [
+        {"user_id": "user-1"},
+        {"quiz_date": {"$gte": datetime(2024, 1, 1)}},
+        {"$or": [
+            {"quiz_date": {"$lt": position["quiz_date"]}},
+            {"quiz_date": position["quiz_date"], "_id": {"$lt": position["_id"]}},
+        ]},
+    ]}
+    assert _build_results_query("user-1", {}) == {"user_id": "user-1"}
+    assert _build_results_query(None, {}) == {}
+
+def test_date_range_compares_aware_and_naive_bounds_as_utc():
+    date_range = _date_range(datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=2))), datetime(2024, 2, 1))
+    assert date_range == {"$gte": datetime(2023, 12, 31, 22), "$lt": datetime(2024, 2, 1)}
+
+def test_date_range_rejects_an_empty_interval():
+    with pytest.raises(HTTPException) as error:
+        _date_range(datetime(2024, 2, 1, tzinfo=timezone.utc), datetime(2024, 2, 1))
+    assert error.value.status_code == 400
@@ -0,0 +1,135 @@
+# ==============================================================================
+# mcq-generator/backend/tests/test_query_plans.py
+# Runs explain() on the query shapes the routers and services issue and fails if
+# any of them is planned as a collection scan (COLLSCAN). The shapes come from the
+# same helpers the application builds its queries with, so they follow the code.
+#
+# Needs a MongoDB the test can create indexes in; skipped unless both are set:
+#     TEST_MONGO_URL=mongodb://localhost:27017 TEST_MONGO_DB_NAME=mcq_plan_check \
+#         python -m pytest tests/test_query_plans.py
+# The indexes from app.db.mongo.index_specs() are created in that database.
+# ==============================================================================
+import itertools
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pytest
+from bson import ObjectId
+
+from app.api.routes_export import _build_export_query
+from app.api.routes_mcq import QUESTION_LIST_SORT, _build_question_list_query
+from app.api.routes_quiz import QUIZ_RESULTS_SORT, _build_quiz_query, _build_results_query, _date_range, _quiz_sample_pipeline
+from app.db.mongo import index_specs, mongo_db
+from app.models.schema import Difficulty, Source
+from app.services.dedup import add_fingerprint, candidate_queries
+from app.services.jobs import CLAIM_SORT, abandoned_filter, claimable_filter
+from app.services.quiz_analytics import QuizAnalytics
+from app.services.vector_index import catch_up_filter
+from tests.support import TEST_MONGO_URL, requires_mongo, mongo_test_database
+
+pytestmark = requires_mongo
+
+SAMPLE_ID = ObjectId()
+NOW = datetime(2024, 3, 5, 14, 30)
+DAY = datetime(2024, 3, 5)
+
+def find(collection: str, query: Dict[str, Any], sort: List[Tuple[str, int]] = None, limit: int = 0) -> Dict[str, Any]:
+    command = {"find": collection, "filter": query}
+    if sort:
+        command["sort"] = dict(sort)
+    if limit:
+        command["limit"] = limit
+    return command
+
+def aggregate(collection: str, pipeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"aggregate": collection, "pipeline": pipeline, "cursor": {}}
+
+def question_commands() -> Iterator[Tuple[str, Dict[str, Any]]]:
+    for difficulty, category, source in itertools.product([None, Difficulty.MEDIUM], [None, "Biology"], [None, Source.AI_GENERATED]):
+        label = "+".join(name for name, value in (("difficulty", difficulty), ("category", category), ("source", source)) if value) or "all"
+        if label != "all":
+            # An unfiltered first page is read in _id order from the _id index
+            yield f"question list {label}", find("questions", _build_question_list_query(difficulty, category, source), QUESTION_LIST_SORT, 101)
+        yield f"question list {label} after cursor", find("questions", _build_question_list_query(difficulty, category, source, SAMPLE_ID), QUESTION_LIST_SORT, 101)
+        if source is None and label != "all":
+            yield f"export {label}", find("questions", _build_export_query(None, difficulty, category))
+            for calibrated in (False, True):
+                query = _build_quiz_query(difficulty, category, calibrated)
+                yield f"quiz count {label} calibrated={calibrated}", {"count": "questions", "query": query}
+                yield f"quiz sample {label} calibrated={calibrated}", aggregate("questions", _quiz_sample_pipeline(query, 5, [SAMPLE_ID]))
+    yield "export selected ids", find("questions", _build_export_query([str(SAMPLE_ID)], None, None))
+    for position, query in enumerate(candidate_queries([add_fingerprint({"question_text": "What is ATP?", "options": ["A", "B"]})])):
+        yield f"dedup candidates {position}", find("questions", query)
+    yield "job retry cleanup", find("questions", {"generated_from_doc_id": str(SAMPLE_ID)})
+    yield "search index stamp", find("questions", {"indexed_at": None})
+    for watermark in (NOW, None):
+        yield f"search index catch-up watermark={watermark}", find("questions", catch_up_filter(watermark), [("indexed_at", 1)])
+
+def quiz_result_commands() -> Iterator[Tuple[str, Dict[str, Any]]]:
+    date_range = _date_range(NOW - timedelta(days=30), NOW)
+    position = {"quiz_date": NOW, "_id": SAMPLE_ID}
+    for user_id, range_, after in itertools.product([None, str(SAMPLE_ID)], [{}, date_range], [None, position]):
+        if user_id or range_ or after:
+            label = f"user={bool(user_id)} range={bool(range_)} cursor={bool(after)}"
+            yield f"quiz results {label}", find("quiz_results", _build_results_query(user_id, range_, after), QUIZ_RESULTS_SORT, 101)
+
+def analytics_commands() -> Iterator[Tuple[str, Dict[str, Any]]]:
+    analytics = QuizAnalytics(rollups_enabled=True)
+    for date_from, date_to in ((DAY - timedelta(days=7), DAY), (NOW - timedelta(days=7), NOW)):
+        for user_id, per_user in ((None, False), (str(SAMPLE_ID), False), (None, True)):
+            collection, stages = analytics._source(user_id, date_from, date_to, per_user=per_user)
+            label = f"{collection.name} user={bool(user_id)} per_user={per_user}"
+            yield f"analytics {label}", aggregate(collection.name, stages + [{"$group": {"_id": None, "count": {"$sum": 1}}}])
+
+def other_commands() -> Iterator[Tuple[str, Dict[str, Any]]]:
+    yield "documents by upload date", find("documents", {}, [("upload_date", -1)])
+    yield "document chunks in order", find("document_chunks", {"doc_id": SAMPLE_ID}, [("index", 1)])
+    yield "job claim", find("jobs", claimable_filter(NOW), CLAIM_SORT)
+    yield "abandoned jobs", find("jobs", abandoned_filter(NOW))
+
+def plan_stages(node: Any) -> Iterator[str]:
+    """Yields every stage name in an explain() result, skipping the plans the optimizer rejected."""
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            yield node["stage"]
+        for key, value in node.items():
+            if key != "rejectedPlans":
+                yield from plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from plan_stages(item)
+
+@pytest.fixture(scope="module")
+def db():
+    from pymongo import MongoClient
+    client = MongoClient(TEST_MONGO_URL)
+    database = client[mongo_test_database()]
+    for collection_name, indexes in index_specs().items():
+        database[collection_name].create_indexes(indexes)
+    yield database
+    client.close()
+
+@pytest.fixture(autouse=True)
+def app_db(db, monkeypatch):
+    # QuizAnalytics._source picks its collection from mongo_db.db
+    monkeypatch.setattr(mongo_db, "db", db)
+
+def check_plans(db, commands: Iterator[Tuple[str, Dict[str, Any]]]):
+    scans = []
+    for label, command in commands:
+        stages = set(plan_stages(db.command("explain", command, verbosity="queryPlanner")))
+        if "COLLSCAN" in stages:
+            scans.append(f"{label}: {', '.join(sorted(stages))}")
+    assert not scans, "Query shapes planned as COLLSCAN:\n" + "\n".join(scans)
+
+def test_question_queries_use_indexes(db):
+    check_plans(db, question_commands())
+
+def test_quiz_result_queries_use_indexes(db):
+    check_plans(db, quiz_result_commands())
+
+def test_analytics_queries_use_indexes(db):
+    check_plans(db, analytics_commands())
+
+def test_other_queries_use_indexes(db):
+    check_plans(db, other_commands())
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.mongo import mongo_db
+from app.services.quiz_analytics import ALL_USERS, QuizAnalytics, _finalize, as_naive_utc, score_bucket
+
+@pytest.fixture
+def collections(monkeypatch):
+    db = SimpleNamespace(quiz_results="quiz_results", quiz_rollups="quiz_rollups")
+    monkeypatch.setattr(mongo_db, "db", db)
+    return db
+
+def test_score_bucket_puts_a_perfect_score_in_the_last_bucket():
+    assert [score_bucket(score) for score in (0, 9.9, 10, 55, 99.9, 100)] == [0, 0, 1, 5, 9, 9]
+
+def test_finalize_computes_population_stddev_and_accuracy():
+    scores = [60.0, 80.0, 100.0]
+    totals = {
+        "count": 3, "score_sum": sum(scores), "score_sq_sum": sum(s * s for s in scores),
+        "score_min": 60.0, "score_max": 100.0, "correct_sum": 12, "questions_sum": 15,
+    }
+    result = _finalize(totals)
+    assert result["average_score"] == 80.0
+    assert result["score_stddev"] == pytest.approx((800 / 3) ** 0.5)
+    assert result["accuracy"] == 80.0
+    assert (result["min_score"], result["max_score"]) == (60.0, 100.0)
+
+def test_finalize_of_no_results_has_no_averages():
+    assert _finalize({}) == {"count": 0, "average_score": None, "score_stddev": None, "min_score": None,
+                             "max_score": None, "accuracy": None}
+
+def test_as_naive_utc_converts_aware_values_only():
+    assert as_naive_utc(datetime(2024, 1, 1, 2, tzinfo=timezone(timedelta(hours=2)))) == datetime(2024, 1, 1)
+    assert as_naive_utc(datetime(2024, 1, 1, 2)) == datetime(2024, 1, 1, 2)
+    assert as_naive_utc(None) is None
+
+def test_day_aligned_queries_read_the_global_rollups(collections):
+    collection, stages = QuizAnalytics(rollups_enabled=True)._source(None, datetime(2024, 1, 1), datetime(2024, 2, 1))
+    assert collection == "quiz_rollups"
+    assert stages == [{"$match": {"user_id": ALL_USERS, "day": {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 2, 1)}}}]
+
+def test_bounds_within_a_day_read_the_raw_results(collections):
+    collection, stages = QuizAnalytics(rollups_enabled=True)._source("user-1", datetime(2024, 1, 1, 12), None)
+    assert collection == "quiz_results"
+    assert stages[0] == {"$match": {"user_id": "user-1", "quiz_date": {"$gte": datetime(2024, 1, 1, 12)}}}
+
+def test_aware_midnight_in_another_zone_is_not_day_aligned_in_utc(collections):
+    collection, _ = QuizAnalytics(rollups_enabled=True)._source(None, datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=2))), None)
+    assert collection == "quiz_results"
+
+def test_per_user_queries_leave_out_anonymous_results(collections):
+    _, stages = QuizAnalytics(rollups_enabled=True)._source(None, None, None, per_user=True)
+    assert stages[0]["$match"] == {"user_id": {"$nin": [None, ALL_USERS]}}
+    collection, stages = QuizAnalytics(rollups_enabled=False)._source(None, None, None, per_user=True)
+    assert collection == "quiz_results"
+    assert stages[0]["$match"] == {"user_id": {"$ne": None}}
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils import rate_limiter
+from app.utils.rate_limiter import AdaptiveConcurrencyGovernor, backoff_delay, parse_retry_after
+from tests.support import run
+
+def make_governor(**options) -> AdaptiveConcurrencyGovernor:
+    defaults = dict(requests_per_minute=0, burst=1, initial_concurrency=4, min_concurrency=1, max_concurrency=8, decrease_cooldown=0.0)
+    defaults.update(options)
+    return AdaptiveConcurrencyGovernor(**defaults)
+
+def test_parse_retry_after_seconds_and_http_date():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0 # In the past
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+def test_backoff_delay_stays_within_the_jittered_step(monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+    assert backoff_delay(0, base=1.0, cap=30.0) == 1.0
+    assert backoff_delay(3, base=1.0, cap=30.0) == 8.0
+    assert backoff_delay(10, base=1.0, cap=30.0) == 30.0
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: low)
+    assert backoff_delay(3, base=1.0, cap=30.0) == 4.0
+    assert backoff_delay(0, base=1.0, cap=30.0, retry_after=5.0) == 5.0
+
+def test_limit_grows_by_about_one_per_limits_worth_of_successes():
+    governor = make_governor(initial_concurrency=4)
+    for _ in range(4):
+        run(governor.record_success())
+    assert 4.9 < governor.limit < 5
+    run(governor.record_success())
+    assert int(governor.limit) == 5
+    for _ in range(100):
+        run(governor.record_success())
+    assert governor.limit == governor.max_concurrency
+
+def test_throttle_halves_the_limit_once_per_cooldown():
+    governor = make_governor(initial_concurrency=8, decrease_cooldown=60.0)
+    governor._last_decrease = float("-inf") # time.monotonic() may itself be below the cooldown
+    run(governor.record_throttle())
+    assert governor.limit == 4
+    run(governor.record_throttle()) # Same burst of failures
+    assert governor.limit == 4
+    assert governor.throttled == 2
+
+def test_limit_never_drops_below_min_concurrency():
+    governor = make_governor(initial_concurrency=4, min_concurrency=3)
+    for _ in range(5):
+        run(governor.record_throttle())
+    assert governor.limit == 3
+
+def test_errors_shrink_the_limit_only_above_the_error_rate_threshold():
+    governor = make_governor(initial_concurrency=8, error_rate_threshold=0.2)
+    for _ in range(9):
+        run(governor.record_success())
+    run(governor.record_error()) # 10% errors
+    assert int(governor.limit) == 8
+    for _ in range(2):
+        run(governor.record_error()) # 25% errors
+    assert int(governor.limit) == 4
+
+def test_retry_after_pauses_every_caller():
+    governor = make_governor()
+    run(governor.record_throttle(retry_after=30))
+    assert governor.stats()["paused_for_seconds"] > 29
+
+def test_slot_blocks_callers_beyond_the_limit():
+    governor = make_governor(initial_concurrency=2, max_concurrency=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with governor.slot():
+            peak = max(peak, governor.stats()["in_flight"])
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    run(main())
+    assert peak == 2
+    assert governor.stats()["in_flight"] == 0
+
+def test_token_bucket_caps_the_request_rate():
+    governor = make_governor(requests_per_minute=1200, burst=1) # One token every 50 ms
+
+    async def main():
+        for _ in range(3):
+            async with governor.slot():
+                pass
+
+    start = time.monotonic()
+    run(main())
+    assert time.monotonic() - start == pytest.approx(0.1, abs=0.05)
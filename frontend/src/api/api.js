@@ -32,22 +32,28 @@ export const generateMCQs = async (topic, difficulty, num_questions, category) =
 };
 
 /**
- * Fetches all questions from the backend API, with optional filters.
+ * Fetches one page of questions from the backend API, with optional filters.
+ * The cursor of the next page comes back in the X-Next-Cursor header; pass it as `cursor` to
+ * fetch the following page. It is null on the last page.
  * @param {object} [filters={}] - Optional filters like difficulty, category, source.
- * @returns {Promise<Array>} - A promise that resolves to an array of question objects.
+ * @param {string|null} [cursor=null] - Cursor returned with the previous page.
+ * @returns {Promise<{questions: Array, nextCursor: string|null}>} - A promise that resolves to the page of question objects and the cursor of the next page.
  */
-export const getQuestions = async (filters = {}) => {
+export const getQuestions = async (filters = {}, cursor = null) => {
   try {
-    const query = new URLSearchParams(filters).toString();
-    const response = await fetch(`${API_BASE_URL}/mcq/questions?${query}`);
+    const params = new URLSearchParams(filters);
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    const response = await fetch(`${API_BASE_URL}/mcq/questions?${params.toString()}`);
 
     if (!response.ok) {
       const errorData = await response.json();
       throw new Error(errorData.detail || 'Failed to fetch questions from backend.');
     }
 
-    const data = await response.json();
-    return data;
+    const questions = await response.json();
+    return { questions, nextCursor: response.headers.get('X-Next-Cursor') };
   } catch (error) {
     console.error('Error fetching questions:', error);
     throw error;
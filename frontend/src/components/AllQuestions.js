@@ -16,13 +16,16 @@ const AllQuestions = () => {
   const [deleteError, setDeleteError] = useState(null);
   const [showConfirmModal, setShowConfirmModal] = useState(false);
   const [questionToDeleteId, setQuestionToDeleteId] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const fetchQuestions = async () => {
     setLoading(true);
     setError(null);
     try {
-      const fetchedQuestions = await getQuestions();
-      setQuestions(fetchedQuestions);
+      const page = await getQuestions();
+      setQuestions(page.questions);
+      setNextCursor(page.nextCursor);
     } catch (err) {
       setError(err.message || 'Failed to load questions.');
     } finally {
@@ -30,6 +33,20 @@ const AllQuestions = () => {
     }
   };
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    setError(null);
+    try {
+      const page = await getQuestions({}, nextCursor);
+      setQuestions(prevQuestions => [...prevQuestions, ...page.questions]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setError(err.message || 'Failed to load more questions.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchQuestions();
   }, []);
@@ -135,6 +152,18 @@ const AllQuestions = () => {
         </div>
       )}
 
+      {nextCursor && (
+        <div className="flex justify-center mt-8">
+          <button
+            onClick={handleLoadMore}
+            disabled={loadingMore}
+            className="bg-dark-card hover:bg-dark-bg text-accent-green font-bold py-2 px-6 rounded-full shadow-md hover:shadow-lg transition duration-200 border border-dark-bg disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading...' : 'Load More'}
+          </button>
+        </div>
+      )}
+
       {showEditModal && questionToEdit && (
         <EditQuestionModal
           question={questionToEdit}